@@ -262,6 +262,16 @@ def main(args=None):
                     dest="install_shell_console",
                     help="If True, the shell console will be started")
 
+    parser.add_argument("--trace-startup", action="store_true", default=False,
+                    dest="trace_startup",
+                    help="Record the duration of the startup phases, bundles and "
+                         "components in var/startup-trace.json")
+
+    parser.add_argument("--clean-var", action="store_true", default=False,
+                    dest="clean_var",
+                    help="Remove the var directory (logs of the previous runs, "
+                         "caches) before starting")
+
     parser.add_argument("--env", action="append",
                     dest="env_isolate",
                     help="environment property to propagate to isolates")
@@ -330,7 +340,16 @@ def main(args=None):
     # Change our path
     sys.path = added_paths + sys.path
 
+    # startup tracing (inherited by the isolates)
+    tracer = None
+    if args.trace_startup:
+        os.environ["COHORTE_STARTUP_TRACE"] = os.path.join(COHORTE_BASE, "var", "trace")
+        import debug.startup
+        tracer = debug.startup.get_tracer()
+
     external_config = parse_config_file(config_file)
+    if tracer:
+        tracer.checkpoint("read configuration")
 
     # useing cache
     USE_CACHE = set_configuration_value(
@@ -428,13 +447,22 @@ def main(args=None):
     # of this node
     # common.generate_boot_forker(COHORTE_BASE, HTTP_PORT, SHELL_PORT)
 
-    # Log
-    try:
-        shutil.rmtree(os.path.join(COHORTE_BASE, 'var'))
-    except OSError:
-        pass
+    # Log: var/ keeps the (rotated) logs of the previous runs
+    if args.clean_var:
+        try:
+            shutil.rmtree(os.path.join(COHORTE_BASE, 'var'))
+        except OSError:
+            pass
+    elif args.trace_startup:
+        # don't merge the startup traces of the previous runs
+        try:
+            shutil.rmtree(os.path.join(COHORTE_BASE, 'var', 'trace'))
+        except OSError:
+            pass
     if not os.path.exists(os.path.join(COHORTE_BASE, 'var')):
         os.makedirs(os.path.join(COHORTE_BASE, 'var'))
+    if tracer:
+        tracer.checkpoint("prepare var")
 
     # Top Composer
     if args.is_top_composer:
@@ -578,6 +606,8 @@ def main(args=None):
         
    # set configuration run as environment vairable 
     os.environ["run"] = json.dumps(configuration)   
+    if tracer:
+        tracer.checkpoint("update configuration")
     
     # get python interpreter version (to be used by cohorte)
     PYTHON_VERSION = "{0}.{1}.{2}".format(sys.version_info[0], sys.version_info[1], sys.version_info[2])
@@ -644,8 +674,9 @@ def main(args=None):
     print(msg1)
 
 	# MOD_OG_20170404 - move this writing in log file
-    # write msg1 to log file
-    out_logfile = open(str(os.environ.get('COHORTE_LOGFILE')), "w")
+    # write msg1 to log file (appended: var/forker.log keeps the end of the
+    # previous run, which is not rotated yet)
+    out_logfile = open(str(os.environ.get('COHORTE_LOGFILE')), "a")
     out_logfile.write(msg1)
 
     msg2 = ""
@@ -661,6 +692,8 @@ def main(args=None):
 
         # change jpype implementation depending on platform system
         common.setup_jpype(COHORTE_HOME)        
+        if tracer:
+            tracer.checkpoint("setup jpype")
 
     # starting cohorte isolate
     result_code = 0
@@ -678,13 +711,16 @@ def main(args=None):
     print(msg3)
 
     # write to log file
-    with open(str(os.environ.get('COHORTE_LOGFILE')), "w") as log_file:
-        log_file.write(msg1 + msg2 + msg3)
+    out_logfile.write(msg2 + msg3)
 
     # MOD_OG_20170404 - close log
     out_logfile.close()
 
+    if tracer:
+        tracer.checkpoint("prepare boot")
     import cohorte.boot.boot as boot
+    if tracer:
+        tracer.checkpoint("import boot")
     # change executable to run the correct script in isolate starter
     return boot.main(boot_args)
 
@@ -19,22 +19,16 @@ Update cohorte distribution from Internet.
 
 # Standard library
 import argparse
-import json
 import os
 import shutil
 import sys
 import tarfile
 
-# urllib changed its name in Python 3
-try:
-    # Python 3
-    from urllib.request import urlopen, HTTPError
-except ImportError:
-    # Python 2
-    from urllib import urlopen, HTTPError
-
 # cohorte scripts
 import common
+import delta
+import downloader
+import versions
 
 # Documentation strings format
 __docformat__ = "restructuredtext en"
@@ -67,29 +61,52 @@ UPDATE_DEV_URL = \
 
 COHORTE_HOME = ""
 
+# local mirror (directory or URL) of the distributions (--from option)
+MIRROR = None
 
-def get_latest_dist_info(dist):
-    print("[INFO] getting latest " + dist + " info (from internet)...")
-    url = UPDATE_DEV_URL
-    response = urlopen(url)
-    data = json.loads(response.read())
-    latest_dev = {"distribution": dist,
-                  "version": data[dist]["version"],
-                  "stage": data[dist]["stage"],
-                  "timestamp": data[dist]["timestamp"],
-                  "changelog": data[dist]["changelog"],
-                  "file": data[dist]["files"]["tar.gz"]}
-
-    url = UPDATE_RELEASE_URL
-    response = urlopen(url)
-    data = json.loads(response.read())
-    latest_release = {"distribution": dist,
-                      "version": data[dist]["version"],
-                      "stage": data[dist]["stage"],
-                      "timestamp": data[dist]["timestamp"],
-                      "changelog": data[dist]["changelog"],
-                      "file": data[dist]["files"]["tar.gz"]}
+# number of parallel download segments (--segments option)
+SEGMENTS = downloader.DEFAULT_SEGMENTS
+
+# replace the whole distribution even if it has a manifest (--full option)
+FULL_UPDATE = False
+
+# backup of the files replaced by a delta update, in ARCHIVE_FOLDER
+DELTA_BACKUP = "delta"
+
+
+def get_dist_url(url):
+    """
+    Returns the URL of a distribution file, in the mirror if one is given
+    """
+    if MIRROR:
+        name = url.split('/')[-1].split('#')[0].split('?')[0]
+        return downloader.join_url(MIRROR, name)
+    return url
+
+
+def read_dist_info(url, dist):
+    """
+    Reads the description of the latest distribution in the given
+    distributions file
+    """
+    data = downloader.read_json(get_dist_url(url))
+    return {"distribution": dist,
+            "version": data[dist]["version"],
+            "stage": data[dist]["stage"],
+            "timestamp": data[dist]["timestamp"],
+            "changelog": data[dist]["changelog"],
+            "file": get_dist_url(data[dist]["files"]["tar.gz"]),
+            # optional "algorithm:digest" of the archive
+            "checksum": data[dist].get("checksums", {}).get("tar.gz"),
+            # optional per-file manifest (URL or content), for delta updates
+            "manifest": data[dist].get("manifest")}
 
+
+def get_latest_dist_info(dist):
+    print("[INFO] getting latest " + dist + " info (from " +
+          (MIRROR or "internet") + ")...")
+    latest_dev = read_dist_info(UPDATE_DEV_URL, dist)
+    latest_release = read_dist_info(UPDATE_RELEASE_URL, dist)
     return latest_dev, latest_release
 
 
@@ -184,10 +201,27 @@ def update(dist):
     while attemps < 3:
         choice = user_choise()
         if choice.lower() == "yes":
+            if dist.get("manifest") and not FULL_UPDATE:
+                result = delta_update(dist)
+                if result is False:
+                    return 1
+                elif result:
+                    break
             new_dist_file = download_distribution(dist)
+            if not new_dist_file:
+                return 1
+            if versions.is_supported():
+                install_version(dist, get_manifest(dist),
+                                tree=get_new_dist_tree(new_dist_file))
+                shutil.rmtree(os.path.join(COHORTE_HOME, DOWNLOAD_FOLDER))
+                break
+            remove_delta_backup()
             archive_actual_dist()
             remove_actual_dist()
             install_new_dist(new_dist_file, dist)
+            manifest = get_manifest(dist)
+            if manifest is not None:
+                delta.save_installed_manifest(COHORTE_HOME, manifest)
             break
         elif choice.lower() == "no":
             break
@@ -204,15 +238,164 @@ def update(dist):
     return 0
 
 
+def get_manifest(dist):
+    """
+    Loads the per-file manifest of a distribution, from the mirror if one
+    is given
+
+    :return: The manifest, or None
+    """
+    manifest = dist.get("manifest")
+    if not manifest:
+        return None
+    if not isinstance(manifest, dict):
+        manifest = get_dist_url(manifest)
+    return delta.load_manifest(manifest)
+
+
+def get_manifest_base(manifest):
+    """
+    Returns the URL of the files tree described by a manifest
+    """
+    if MIRROR:
+        return downloader.join_url(
+            MIRROR, manifest["base"].rstrip('/').split('/')[-1])
+    return manifest["base"]
+
+
+def remove_delta_backup():
+    """
+    Removes the backup of the last delta update
+    """
+    backup_dir = os.path.join(COHORTE_HOME, ARCHIVE_FOLDER, DELTA_BACKUP)
+    if os.path.exists(backup_dir):
+        shutil.rmtree(backup_dir)
+
+
+def delta_update(dist):
+    """
+    Downloads and replaces only the files which changed since the installed
+    distribution
+
+    :return: True if updated, False on error, None if the distribution must
+             be replaced completely (no valid manifest)
+    """
+    print("")
+    print("[INFO] computing the changes with " + dist["distribution"] + "-" +
+          dist["version"] + "-" + dist["timestamp"] +
+          " (" + dist["stage"] + ") ...")
+    manifest = get_manifest(dist)
+    if manifest is None:
+        print("     | invalid manifest, the whole distribution will be "
+              "downloaded.")
+        return None
+
+    changed, removed = delta.compute_delta(
+        COHORTE_HOME, manifest, delta.load_installed_manifest(COHORTE_HOME))
+    print("     | {0} changed files (~{1}Kb to download), {2} removed files"
+          .format(len(changed), delta.get_delta_size(manifest, changed) // 1000,
+                  len(removed)))
+
+    download_dir = os.path.join(COHORTE_HOME, DOWNLOAD_FOLDER)
+    try:
+        delta.fetch_files(manifest, changed,
+                          os.path.join(download_dir, DELTA_BACKUP),
+                          get_manifest_base(manifest))
+    except downloader.DownloadError as ex:
+        print("[ERROR] " + str(ex))
+        print("        run cohorte-update again to resume the download.")
+        return False
+
+    if versions.is_supported():
+        install_version(dist, manifest,
+                        staging=os.path.join(download_dir, DELTA_BACKUP),
+                        changed=changed, removed=removed)
+        if os.path.exists(download_dir):
+            # not created if no file changed
+            shutil.rmtree(download_dir)
+        return True
+
+    print("")
+    print("[INFO] replacing the changed files ...")
+    delta.apply_delta(COHORTE_HOME, manifest, changed, removed,
+                      os.path.join(download_dir, DELTA_BACKUP),
+                      os.path.join(COHORTE_HOME, ARCHIVE_FOLDER, DELTA_BACKUP))
+    if os.path.exists(download_dir):
+        shutil.rmtree(download_dir)
+    print("     | Done.")
+    print("     | you can rollback using --roll-back option.")
+    return True
+
+
+def get_version_name(dist):
+    """
+    Returns the name of the installation folder of a distribution
+    """
+    return "{0}-{1}".format(dist["version"], dist["timestamp"])
+
+
+def install_version(dist, manifest=None, tree=None, staging=None,
+                    changed=(), removed=()):
+    """
+    Installs a distribution as a new version, next to the installed one,
+    and makes it the active one
+
+    :param dist: Description of the distribution
+    :param manifest: Manifest of the distribution, if any
+    :param tree: Directory of the full distribution
+    :param staging: Directory of the changed files (delta update)
+    :param changed: Paths of the changed files (delta update)
+    :param removed: Paths of the removed files (delta update)
+    """
+    print("")
+    print("[INFO] installing new distribution " + dist["distribution"] +
+          "-" + dist["version"] + "-" + dist["timestamp"] +
+          " (" + dist["stage"] + ") ...")
+    cohorte_dir = COHORTE_HOME
+    current = versions.get_current(cohorte_dir)
+    if current is None:
+        # first versioned update: the installed files become a version
+        current = get_version_name(
+            common.get_installed_dist_info(cohorte_dir))
+        entries = set([delta.INSTALLED_MANIFEST])
+        if tree is not None:
+            entries.update(os.listdir(tree))
+        for dist_manifest in (manifest,
+                              delta.load_installed_manifest(cohorte_dir)):
+            if dist_manifest is not None:
+                entries.update(path.split("/")[0]
+                               for path in dist_manifest["files"])
+        versions.snapshot_home(cohorte_dir, current, entries)
+
+    name = get_version_name(dist)
+    version = name
+    index = 0
+    while version in (current, versions.get_previous(cohorte_dir)):
+        # re-installation: don't replace a version which can be restored
+        index += 1
+        version = "{0}.{1}".format(name, index)
+
+    version_dir = versions.create_version(cohorte_dir, version, current,
+                                          tree, staging, changed, removed,
+                                          manifest)
+    if manifest is not None:
+        delta.save_installed_manifest(version_dir, manifest)
+    versions.switch(cohorte_dir, version)
+    versions.prune(cohorte_dir)
+    print("     | Done.")
+    print("     | you can rollback using --roll-back option.")
+
+
 def show_log(dist):
     print("----------------------------------------------------------------------------")
     print("")
     changelog_file_url = dist["changelog"]
     if changelog_file_url is not None:
-        log = ""
-        for line in urllib2.urlopen(changelog_file_url):
-            log += line
-        print(log)
+        stream = downloader.open_url(changelog_file_url)
+        try:
+            print(stream.read().decode("utf-8"))
+        finally:
+            stream.close()
     print("")
     print("----------------------------------------------------------------------------")
 
@@ -248,48 +431,41 @@ def user_choise():
     return "yes"
 
 
-def download_chunks(url):
-    base_file = os.path.basename(url)
-    cohorte_dir = COHORTE_HOME
-    # move the file to a more uniq path
-    # os.umask(0002)
+def get_extract_dir(dist_file):
+    """
+    Returns the directory where the given distribution file is extracted
+    while it is downloaded
+    """
+    return os.path.join(COHORTE_HOME, DOWNLOAD_FOLDER, dist_file + ".d")
+
+
+def download_chunks(url, checksum=None):
+    """
+    Downloads the distribution archive in the download folder, resuming a
+    previous interrupted download, and extracts it at the same time
 
-    temp_path = os.path.join(cohorte_dir, DOWNLOAD_FOLDER)
-    if os.path.exists(temp_path):
-        shutil.rmtree(temp_path)
+    :return: True if the archive was downloaded and verified
+    """
+    base_file = url.split('/')[-1].split('#')[0].split('?')[0]
+    temp_path = os.path.join(COHORTE_HOME, DOWNLOAD_FOLDER)
+    # keep the partial downloads of previous attempts
     if not os.path.exists(temp_path):
         os.makedirs(temp_path)
+
     try:
-        dfile = os.path.join(temp_path, base_file)
-        req = urlopen(url)
-        total_size = int(req.info().getheader('Content-Length').strip())
-        print("     | total file size to download ~ " +
-              str(total_size/1000000) + "Mb")
-        downloaded = 0
-        CHUNK = 256 * 10240
-        with open(dfile, 'wb') as fp:
-
-            while True:
-                percent = float((downloaded * 100) / total_size) / 100
-                bar_length = 15
-                hashes = '#' * int(round(percent * bar_length))
-                spaces = ' ' * (bar_length - len(hashes))
-                sys.stdout.write(
-                    "\r     | Progress: [{0}] {1}%"
-                    .format(hashes + spaces, int(round(percent * 100))))
-                sys.stdout.flush()
-                # download chunk
-                chunk = req.read(CHUNK)
-                downloaded += len(chunk)
-                if not chunk:
-                    break
-                fp.write(chunk)
-    except HTTPError as e:
-        print("HTTP Error:", e.code, url)
+        downloader.Downloader(
+            url, os.path.join(temp_path, base_file), checksum,
+            SEGMENTS).download(get_extract_dir(base_file))
+    except downloader.DownloadError as ex:
+        print("")
+        print("[ERROR] " + str(ex))
+        print("        run cohorte-update again to resume the download.")
         return False
-    sys.stdout.flush()
-    print("")
+
+    if checksum:
+        print("     | checksum verified.")
     print("     | Done.")
+    return True
 
 
 def download_distribution(dist):
@@ -297,7 +473,8 @@ def download_distribution(dist):
     print("[INFO] downloading " + dist["distribution"] + "-" +
           dist["version"] + "-" + dist["timestamp"] +
           " (" + dist["stage"] + ") ...")
-    download_chunks(dist["file"])
+    if not download_chunks(dist["file"], dist.get("checksum")):
+        return None
     filename = dist["file"].split('/')[-1].split('#')[0].split('?')[0]
     return filename
 
@@ -323,7 +500,9 @@ def archive_actual_dist():
         os.makedirs(archive_dir)
     output_filename = os.path.join(archive_dir, "archived_distribution.tar.gz")
     with tarfile.open(output_filename, "w:gz") as tar:
-        tar.add(cohorte_dir, arcname="cohorte", exclude=exclude_archive_function)
+        tar.add(cohorte_dir, arcname="cohorte",
+                filter=lambda info: None
+                if exclude_archive_function(info.name) else info)
     print("     | Done.")
     print("     | you can rollback using --roll-back option.")
 
@@ -346,6 +525,24 @@ def remove_actual_dist():
     print("     | Done.")
 
 
+def get_new_dist_tree(new_dist_file):
+    """
+    Returns the root directory of the new distribution, extracting it if it
+    wasn't while downloading
+    """
+    tmp_dir = os.path.join(COHORTE_HOME, DOWNLOAD_FOLDER)
+    extract_dir = get_extract_dir(new_dist_file)
+    if not os.path.isdir(extract_dir):
+        os.makedirs(extract_dir)
+        new_dist = os.path.join(tmp_dir, new_dist_file)
+        with tarfile.open(new_dist, "r:gz") as t:
+            t.extractall(extract_dir)
+    for x in os.listdir(extract_dir):
+        if x.startswith('cohorte'):
+            return os.path.join(extract_dir, x)
+    return extract_dir
+
+
 def install_new_dist(new_dist_file, update):
     print("")
     print("[INFO] installing new distribution " + update["distribution"] +
@@ -356,16 +553,10 @@ def install_new_dist(new_dist_file, update):
     if not os.path.exists(tmp_dir):
         print("non existing .download directory!")
     else:
-        new_dist = os.path.join(tmp_dir, new_dist_file)
-        with tarfile.open(new_dist, "r:gz") as t:
-            t.extractall(cohorte_dir)
-        for x in os.listdir(cohorte_dir):
-            if x.startswith('cohorte'):
-                for f in os.listdir(os.path.join(cohorte_dir, x)):
-                    shutil.move(os.path.join(cohorte_dir, x, f),
-                                os.path.join(cohorte_dir, f))
-                os.rmdir(os.path.join(cohorte_dir, x))
-                break
+        tree = get_new_dist_tree(new_dist_file)
+        for f in os.listdir(tree):
+            shutil.move(os.path.join(tree, f), os.path.join(cohorte_dir, f))
+        shutil.rmtree(tmp_dir)
     print("     | Done.")
 
 def install_archived_dist():
@@ -393,6 +584,22 @@ def roll_back():
     print("")
     print("[INFO] Rolling back to previous installed distribution...")
     cohorte_dir = COHORTE_HOME
+    if versions.is_supported() and versions.get_current(cohorte_dir):
+        # versioned installation: switch back to the previous version
+        restored = versions.roll_back(cohorte_dir)
+        if restored is None:
+            print("     | no previous version!")
+            print("")
+            return 1
+        print("     | version " + restored + " restored.")
+        return 0
+
+    backup_dir = os.path.join(cohorte_dir, ARCHIVE_FOLDER, DELTA_BACKUP)
+    if delta.has_backup(backup_dir):
+        # last update was a delta update
+        delta.restore_backup(cohorte_dir, backup_dir)
+        print("     | Done.")
+        return 0
     tmp_dir = os.path.join(cohorte_dir, ARCHIVE_FOLDER,
                            "archived_distribution.tar.gz")
     if not os.path.exists(tmp_dir):
@@ -430,11 +637,31 @@ def main(args=None):
                        dest="roll_back",
                        help="Rollback the last update/upgrade")
 
+    group = parser.add_argument_group("Download options")
+
+    group.add_argument("--from", action="store", dest="mirror",
+                       metavar="DIR_OR_URL",
+                       help="Get the distributions from a local mirror "
+                            "(directory or file:// URL) instead of Internet")
+
+    group.add_argument("--segments", action="store", type=int,
+                       dest="segments", default=downloader.DEFAULT_SEGMENTS,
+                       help="Number of parallel download segments")
+
+    group.add_argument("--full", action="store_true", dest="full",
+                       help="Replace the whole distribution, even if only "
+                            "some files changed")
+
     # Parse arguments
     args = parser.parse_args(args)
     if args.roll_back:
         return roll_back()
 
+    global MIRROR, SEGMENTS, FULL_UPDATE
+    MIRROR = args.mirror
+    SEGMENTS = args.segments
+    FULL_UPDATE = args.full
+
     # get installed version
     installed = {}
     installed = common.get_installed_dist_info(COHORTE_HOME)
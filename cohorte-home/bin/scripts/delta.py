@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+# -- Content-Encoding: UTF-8 --
+"""
+Delta updates of COHORTE distributions.
+
+A distribution can be described by a manifest giving the hash of each of
+its files::
+
+    {
+        "format": 1,
+        "version": "1.2.0",
+        "base": "http://.../cohorte-1.2.0/files",
+        "files": {
+            "repo/felix/org.apache.felix.ipojo-1.12.1.jar": {
+                "sha256": "...", "size": 123456
+            },
+            "bin/cohorte-start-node": {
+                "sha256": "...", "size": 1234, "mode": 493
+            }
+        }
+    }
+
+The updater compares it to the installed files and downloads only the
+changed ones, from ``<base>/<path>``. Files of the previous distribution
+(known by the manifest of the installed version, ``.manifest.json``) which
+are not in the new one are removed; other files (nodes, logs...) are never
+touched. The replaced and removed files are kept in a backup directory to
+roll the update back.
+
+:author: Bassem Debbabi
+:license: Apache Software License 2.0
+
+..
+
+    Copyright 2015 isandlaTech
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Standard Library
+import json
+import os
+import shutil
+import threading
+
+# cohorte scripts
+import downloader
+
+# Documentation strings format
+__docformat__ = "restructuredtext en"
+
+# Boot module version
+__version__ = "1.0.0"
+
+MANIFEST_FORMAT = 1
+""" Supported manifest format """
+
+INSTALLED_MANIFEST = ".manifest.json"
+""" Manifest of the installed distribution, in COHORTE_HOME """
+
+BACKUP_RECORD = "delta.json"
+""" Description of a delta backup: replaced, added and removed files """
+
+FETCH_THREADS = 4
+""" Number of files downloaded in parallel """
+
+
+def load_manifest(source):
+    """
+    Loads a manifest
+
+    :param source: The manifest (dict), or its URL or path
+    :return: The manifest dictionary, or None if invalid
+    """
+    try:
+        if not isinstance(source, dict):
+            source = downloader.read_json(source)
+        if source.get("format") == MANIFEST_FORMAT \
+                and isinstance(source.get("files"), dict):
+            return source
+    except (IOError, OSError, ValueError, downloader.DownloadError):
+        pass
+    return None
+
+
+def load_installed_manifest(home):
+    """
+    Loads the manifest of the installed distribution, or returns None
+    """
+    path = os.path.join(home, INSTALLED_MANIFEST)
+    if not os.path.exists(path):
+        return None
+    return load_manifest(path)
+
+
+def save_installed_manifest(home, manifest):
+    """
+    Stores the manifest of the installed distribution
+    """
+    path = os.path.join(home, INSTALLED_MANIFEST)
+    with open(path + ".tmp", "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=1, sort_keys=True)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(path + ".tmp", path)
+
+
+def _to_local(relative):
+    """
+    Converts a manifest path ('/' separated) to a local relative path
+    """
+    parts = [part for part in relative.split("/") if part]
+    if not parts or ".." in parts:
+        raise ValueError("Invalid path in manifest: {0}".format(relative))
+    return os.path.join(*parts)
+
+
+def _is_up_to_date(path, entry):
+    """
+    Checks if a local file matches its manifest entry
+    """
+    try:
+        if os.path.getsize(path) != entry["size"]:
+            return False
+    except OSError:
+        return False
+    return downloader.file_checksum(path, "sha256") == entry["sha256"]
+
+
+def compute_delta(home, manifest, installed=None):
+    """
+    Computes the files to download and to remove
+
+    :param home: COHORTE home directory
+    :param manifest: Manifest of the new distribution
+    :param installed: Manifest of the installed distribution (None if
+                      unknown: no file is removed)
+    :return: A (changed files, removed files) tuple of manifest paths
+    """
+    changed = sorted(relative for relative, entry in manifest["files"].items()
+                     if not _is_up_to_date(
+                         os.path.join(home, _to_local(relative)), entry))
+    removed = []
+    if installed is not None:
+        removed = sorted(relative for relative in installed["files"]
+                         if relative not in manifest["files"]
+                         and os.path.exists(
+                             os.path.join(home, _to_local(relative))))
+    return changed, removed
+
+
+def get_delta_size(manifest, changed):
+    """
+    Returns the number of bytes to download
+    """
+    return sum(manifest["files"][relative]["size"] for relative in changed)
+
+
+def fetch_files(manifest, changed, staging_dir, base_url=None):
+    """
+    Downloads the changed files in the staging directory, verifying their
+    checksum
+
+    :param manifest: Manifest of the new distribution
+    :param changed: Paths of the files to download
+    :param staging_dir: Directory where files are downloaded
+    :param base_url: URL of the files tree (default: manifest base)
+    :raise DownloadError: A file couldn't be downloaded
+    """
+    base_url = base_url or manifest["base"]
+    pending = list(changed)
+    errors = []
+    lock = threading.Lock()
+
+    def fetch():
+        """
+        Downloads files until there is none left
+        """
+        while True:
+            with lock:
+                if not pending or errors:
+                    return
+                relative = pending.pop()
+
+            target = os.path.join(staging_dir, _to_local(relative))
+            if os.path.exists(target) and _is_up_to_date(
+                    target, manifest["files"][relative]):
+                # downloaded by a previous attempt
+                continue
+
+            parent = os.path.dirname(target)
+            with lock:
+                if not os.path.isdir(parent):
+                    os.makedirs(parent)
+            try:
+                downloader.Downloader(
+                    downloader.join_url(base_url, relative), target,
+                    "sha256:" + manifest["files"][relative]["sha256"],
+                    1).download(show_progress=False)
+            except downloader.DownloadError as ex:
+                with lock:
+                    errors.append(ex)
+
+    threads = [threading.Thread(target=fetch)
+               for _ in range(min(FETCH_THREADS, len(changed)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if errors:
+        raise errors[0]
+
+
+def apply_delta(home, manifest, changed, removed, staging_dir, backup_dir):
+    """
+    Replaces the changed files by the downloaded ones and removes the files
+    which are not part of the distribution anymore. The previous files are
+    moved to the backup directory.
+
+    :param home: COHORTE home directory
+    :param manifest: Manifest of the new distribution
+    :param changed: Paths of the changed files, downloaded in staging_dir
+    :param removed: Paths of the files to remove
+    :param staging_dir: Directory containing the downloaded files
+    :param backup_dir: Directory where previous files are kept
+    """
+    if os.path.exists(backup_dir):
+        shutil.rmtree(backup_dir)
+    os.makedirs(backup_dir)
+    record = {"replaced": [], "added": [], "removed": []}
+
+    def backup(relative):
+        """
+        Moves a file of the distribution to the backup directory
+        """
+        local = _to_local(relative)
+        target = os.path.join(backup_dir, "files", local)
+        if not os.path.isdir(os.path.dirname(target)):
+            os.makedirs(os.path.dirname(target))
+        shutil.move(os.path.join(home, local), target)
+
+    for relative in changed:
+        local = _to_local(relative)
+        path = os.path.join(home, local)
+        if os.path.exists(path):
+            backup(relative)
+            record["replaced"].append(relative)
+        else:
+            record["added"].append(relative)
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+        shutil.move(os.path.join(staging_dir, local), path)
+        mode = manifest["files"][relative].get("mode")
+        if mode is not None:
+            os.chmod(path, mode)
+
+    for relative in removed:
+        backup(relative)
+        record["removed"].append(relative)
+
+    installed = os.path.join(home, INSTALLED_MANIFEST)
+    if os.path.exists(installed):
+        shutil.copy2(installed, os.path.join(backup_dir, INSTALLED_MANIFEST))
+    with open(os.path.join(backup_dir, BACKUP_RECORD), "w") as record_file:
+        json.dump(record, record_file, indent=1)
+    save_installed_manifest(home, manifest)
+
+
+def has_backup(backup_dir):
+    """
+    Checks if the given directory contains a delta backup
+    """
+    return os.path.exists(os.path.join(backup_dir, BACKUP_RECORD))
+
+
+def restore_backup(home, backup_dir):
+    """
+    Rolls a delta update back: restores the replaced and removed files and
+    removes the added ones
+    """
+    with open(os.path.join(backup_dir, BACKUP_RECORD)) as record_file:
+        record = json.load(record_file)
+
+    for relative in record["added"]:
+        path = os.path.join(home, _to_local(relative))
+        if os.path.exists(path):
+            os.remove(path)
+
+    for relative in record["replaced"] + record["removed"]:
+        local = _to_local(relative)
+        path = os.path.join(home, local)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        if os.path.exists(path):
+            os.remove(path)
+        shutil.move(os.path.join(backup_dir, "files", local), path)
+
+    installed = os.path.join(backup_dir, INSTALLED_MANIFEST)
+    if os.path.exists(installed):
+        shutil.copy2(installed, os.path.join(home, INSTALLED_MANIFEST))
+    elif os.path.exists(os.path.join(home, INSTALLED_MANIFEST)):
+        os.remove(os.path.join(home, INSTALLED_MANIFEST))
+    shutil.rmtree(backup_dir)
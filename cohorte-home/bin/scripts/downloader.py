@@ -0,0 +1,593 @@
+#!/usr/bin/env python
+# -- Content-Encoding: UTF-8 --
+"""
+Resumable and verified downloads of COHORTE distributions.
+
+The file is downloaded in a ``.part`` file, by one or more HTTP range
+requests (segments) running in parallel. The progress of each segment is
+stored beside it, in a ``.state`` file, so that an interrupted download
+continues where it stopped. Servers which don't support ranges are read in
+a single stream, from the start.
+
+The downloaded bytes are hashed and, optionally, extracted (tar.gz stream)
+as soon as they are contiguous, while the download goes on. The file is
+renamed to its final name only if its checksum matches the expected one.
+
+URLs can be HTTP(S) URLs, file:// URLs or local paths (mirrors).
+
+:author: Bassem Debbabi
+:license: Apache Software License 2.0
+
+..
+
+    Copyright 2015 isandlaTech
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Standard Library
+import hashlib
+import json
+import os
+import re
+import shutil
+import socket
+import sys
+import tarfile
+import threading
+import time
+
+try:
+    # Python 3
+    from urllib.request import urlopen, url2pathname, Request
+    from urllib.error import HTTPError, URLError
+    from urllib.parse import urlparse
+except ImportError:
+    # Python 2
+    from urllib2 import urlopen, Request, HTTPError, URLError
+    from urllib import url2pathname
+    from urlparse import urlparse
+
+# Documentation strings format
+__docformat__ = "restructuredtext en"
+
+# Boot module version
+__version__ = "1.0.0"
+
+CHUNK_SIZE = 256 * 1024
+""" Size of the blocks read and written """
+
+DEFAULT_SEGMENTS = 4
+""" Default number of parallel segments """
+
+MIN_SEGMENT_SIZE = 4 * 1024 * 1024
+""" Files are not split in segments smaller than this """
+
+RETRIES = 5
+""" Number of successive failures of a segment before giving up """
+
+RETRY_DELAY = 2
+""" Time to wait before retrying a failed segment (seconds) """
+
+TIMEOUT = 60
+""" Socket timeout of the requests (seconds) """
+
+PART_SUFFIX = ".part"
+STATE_SUFFIX = ".state"
+
+DEFAULT_ALGORITHM = "sha256"
+""" Algorithm of checksums given without prefix """
+
+_CONTENT_RANGE = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+
+class DownloadError(Exception):
+    """
+    Download failed, or downloaded file invalid
+    """
+    pass
+
+
+def local_path(url):
+    """
+    Returns the local path of a file:// URL or of a path, or None for other
+    URLs
+    """
+    parsed = urlparse(url)
+    if parsed.scheme == "file":
+        return url2pathname(parsed.path)
+    elif not parsed.scheme or len(parsed.scheme) == 1:
+        # path (or Windows drive letter)
+        return url
+    return None
+
+
+def join_url(base, name):
+    """
+    Returns the URL of a file in the given directory URL or path
+    """
+    scheme = urlparse(base).scheme
+    if not scheme or len(scheme) == 1:
+        return os.path.join(base, name)
+    return base.rstrip("/") + "/" + name
+
+
+def open_url(url):
+    """
+    Opens a URL or a local file for reading
+    """
+    path = local_path(url)
+    if path is not None:
+        return open(path, "rb")
+    return urlopen(url, timeout=TIMEOUT)
+
+
+def read_json(url):
+    """
+    Reads a JSON document from a URL or a local file
+    """
+    stream = open_url(url)
+    try:
+        return json.loads(stream.read().decode("utf-8"))
+    finally:
+        stream.close()
+
+
+def parse_checksum(checksum):
+    """
+    Parses a checksum: "algorithm:hexdigest", or a SHA-256 hex digest
+
+    :return: An (algorithm, hex digest) tuple
+    """
+    if ":" in checksum:
+        algorithm, digest = checksum.split(":", 1)
+    else:
+        algorithm, digest = DEFAULT_ALGORITHM, checksum
+    algorithm = algorithm.strip().lower().replace("-", "")
+    try:
+        hashlib.new(algorithm)
+    except ValueError:
+        raise DownloadError("Unknown checksum algorithm: {0}"
+                            .format(algorithm))
+    return algorithm, digest.strip().lower()
+
+
+def file_checksum(path, algorithm=DEFAULT_ALGORITHM):
+    """
+    Computes the hex digest of a file
+    """
+    digest = hashlib.new(algorithm)
+    with open(path, "rb") as source:
+        while True:
+            data = source.read(CHUNK_SIZE)
+            if not data:
+                break
+            digest.update(data)
+    return digest.hexdigest()
+
+
+class _Progress(object):
+    """
+    Progress of the segments of a download
+    """
+    def __init__(self, segments, total, state_path):
+        """
+        Sets up members
+
+        :param segments: List of [start, end, position] (end is inclusive,
+                         or None if the size is unknown)
+        :param total: Size of the file (None if unknown)
+        :param state_path: Path to the state file (None: no resume)
+        """
+        self.segments = segments
+        self.total = total
+        self.error = None
+        self.finished = False
+        self._state_path = state_path
+        self._state_url = None
+        self._condition = threading.Condition()
+
+    def set_state_url(self, url):
+        """
+        Sets the URL stored in the state file
+        """
+        self._state_url = url
+
+    def _save(self):
+        """
+        Writes the state file
+        """
+        if self._state_path:
+            with open(self._state_path, "w") as state_file:
+                json.dump({"url": self._state_url, "size": self.total,
+                           "segments": self.segments}, state_file)
+
+    def advance(self, segment, length):
+        """
+        Notifies that bytes have been written at the position of a segment
+        """
+        with self._condition:
+            segment[2] += length
+            self._save()
+            self._condition.notify_all()
+
+    def end_segment(self, segment):
+        """
+        Notifies the end of a segment of unknown size
+        """
+        with self._condition:
+            segment[1] = segment[2] - 1
+            self.total = segment[2]
+            self._condition.notify_all()
+
+    def fail(self, error):
+        """
+        Notifies an error
+        """
+        with self._condition:
+            if self.error is None:
+                self.error = error
+            self._condition.notify_all()
+
+    def finish(self):
+        """
+        Notifies the end of all the segments
+        """
+        with self._condition:
+            self.finished = True
+            self._condition.notify_all()
+
+    def downloaded(self):
+        """
+        Returns the number of downloaded bytes
+        """
+        with self._condition:
+            return sum(segment[2] - segment[0] for segment in self.segments)
+
+    def _available(self):
+        """
+        Returns the size of the contiguous downloaded prefix of the file
+        """
+        for start, end, position in self.segments:
+            if end is None or position <= end:
+                return position
+        return self.total
+
+    def wait_for(self, position):
+        """
+        Waits for the byte at the given position to be downloaded
+
+        :return: The size of the contiguous downloaded prefix
+        :raise DownloadError: The download failed
+        """
+        with self._condition:
+            while True:
+                if self.error is not None:
+                    raise DownloadError(str(self.error))
+                available = self._available()
+                if available > position or self.finished:
+                    return available
+                self._condition.wait(1)
+
+
+class _StreamReader(object):
+    """
+    Reads the downloaded file sequentially, waiting for the bytes being
+    downloaded, and hashes its content
+    """
+    def __init__(self, path, progress, algorithm):
+        """
+        Sets up members
+        """
+        self._file = open(path, "rb")
+        self._progress = progress
+        self._position = 0
+        self.digest = hashlib.new(algorithm)
+
+    def read(self, size=-1):
+        """
+        Reads at most size bytes (file-like object for tarfile)
+        """
+        if size is None or size < 0:
+            size = CHUNK_SIZE
+        available = self._progress.wait_for(self._position)
+        size = min(size, available - self._position)
+        if size <= 0:
+            return b""
+
+        self._file.seek(self._position)
+        data = self._file.read(size)
+        self._position += len(data)
+        self.digest.update(data)
+        return data
+
+    def drain(self):
+        """
+        Reads the file until its end
+        """
+        while self.read(CHUNK_SIZE):
+            pass
+
+    def close(self):
+        """
+        Closes the file
+        """
+        self._file.close()
+
+
+class Downloader(object):
+    """
+    Downloads a file, in parallel segments when possible
+    """
+    def __init__(self, url, path, checksum=None, segments=DEFAULT_SEGMENTS):
+        """
+        Sets up members
+
+        :param url: URL of the file (HTTP, file:// or local path)
+        :param path: Path to the downloaded file
+        :param checksum: Expected checksum ("algorithm:digest" or SHA-256
+                         digest), None to skip the verification
+        :param segments: Maximum number of parallel segments
+        """
+        self.url = url
+        self.path = path
+        self.checksum = checksum
+        self.max_segments = max(1, segments)
+        self._part = path + PART_SUFFIX
+        self._state = path + STATE_SUFFIX
+        self._ranges = False
+
+    def _probe(self):
+        """
+        Gets the size of the file and checks if ranges are supported
+
+        :return: A (size or None, ranges supported) tuple
+        """
+        path = local_path(self.url)
+        if path is not None:
+            return os.path.getsize(path), True
+
+        request = Request(self.url, headers={"Range": "bytes=0-0"})
+        response = urlopen(request, timeout=TIMEOUT)
+        try:
+            if response.getcode() == 206:
+                match = _CONTENT_RANGE.match(
+                    response.info().get("Content-Range") or "")
+                if match and match.group(3) != "*":
+                    return int(match.group(3)), True
+            length = response.info().get("Content-Length")
+            return (int(length.strip()) if length else None), False
+        finally:
+            response.close()
+
+    def _load_state(self, size):
+        """
+        Loads the segments of an interrupted download of the same file
+
+        :return: The list of segments, or None
+        """
+        try:
+            with open(self._state) as state_file:
+                state = json.load(state_file)
+            if state["url"] == self.url and state["size"] == size \
+                    and os.path.getsize(self._part) == size:
+                return state["segments"]
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+        return None
+
+    def _split(self, size):
+        """
+        Splits the file in segments
+        """
+        count = max(1, min(self.max_segments, size // MIN_SEGMENT_SIZE))
+        length = size // count
+        segments = []
+        for idx in range(count):
+            start = idx * length
+            end = size - 1 if idx == count - 1 else start + length - 1
+            segments.append([start, end, start])
+        return segments
+
+    def _open_range(self, start, end):
+        """
+        Opens the given range of the file
+
+        :return: A stream positioned at start
+        """
+        path = local_path(self.url)
+        if path is not None:
+            stream = open(path, "rb")
+            stream.seek(start)
+            return stream
+
+        if not self._ranges:
+            return urlopen(self.url, timeout=TIMEOUT)
+
+        request = Request(self.url, headers={
+            "Range": "bytes={0}-{1}".format(start, "" if end is None
+                                              else end)})
+        response = urlopen(request, timeout=TIMEOUT)
+        if response.getcode() != 206:
+            response.close()
+            raise DownloadError("Range requests not supported anymore")
+        return response
+
+    def _download_segment(self, segment, progress):
+        """
+        Downloads a segment, retrying after errors if the server supports
+        ranges
+        """
+        failures = 0
+        while segment[1] is None or segment[2] <= segment[1]:
+            if progress.error is not None:
+                return
+            try:
+                stream = self._open_range(segment[2], segment[1])
+                try:
+                    with open(self._part, "r+b") as output:
+                        output.seek(segment[2])
+                        while segment[1] is None or segment[2] <= segment[1]:
+                            size = CHUNK_SIZE if segment[1] is None else \
+                                min(CHUNK_SIZE, segment[1] - segment[2] + 1)
+                            data = stream.read(size)
+                            if not data:
+                                if segment[1] is None:
+                                    progress.end_segment(segment)
+                                    return
+                                raise DownloadError("Connection closed")
+                            output.write(data)
+                            output.flush()
+                            progress.advance(segment, len(data))
+                            failures = 0
+                finally:
+                    stream.close()
+            except (IOError, OSError, socket.error, DownloadError,
+                    HTTPError, URLError) as ex:
+                failures += 1
+                if failures >= RETRIES or not self._ranges:
+                    # without ranges, the stream would restart from the
+                    # beginning of the file, not at the end of the segment
+                    progress.fail(ex)
+                    return
+                time.sleep(RETRY_DELAY)
+
+    @staticmethod
+    def _extract(reader, extract_dir, errors):
+        """
+        Extracts the tar.gz stream read by the reader
+        """
+        try:
+            with tarfile.open(fileobj=reader, mode="r|gz") as archive:
+                archive.extractall(extract_dir)
+        except Exception as ex:
+            errors.append(ex)
+
+    @staticmethod
+    def _show_progress(downloaded, total):
+        """
+        Prints the progress bar
+        """
+        if not total:
+            sys.stdout.write("\r     | Downloaded: {0}Mb"
+                             .format(downloaded // 1000000))
+        else:
+            percent = float(downloaded) / total
+            bar_length = 15
+            hashes = '#' * int(round(percent * bar_length))
+            spaces = ' ' * (bar_length - len(hashes))
+            sys.stdout.write("\r     | Progress: [{0}] {1}%"
+                             .format(hashes + spaces,
+                                     int(round(percent * 100))))
+        sys.stdout.flush()
+
+    def download(self, extract_dir=None, show_progress=True):
+        """
+        Downloads the file
+
+        :param extract_dir: If given, the tar.gz file is extracted in this
+                            directory while it is downloaded
+        :param show_progress: Print a progress bar
+        :return: The path to the downloaded file
+        :raise DownloadError: The download failed or the checksum is invalid
+        """
+        try:
+            size, ranges = self._probe()
+        except (IOError, OSError, HTTPError, URLError) as ex:
+            raise DownloadError("Can't access {0}: {1}".format(self.url, ex))
+        self._ranges = ranges
+
+        segments = None
+        if ranges and size is not None:
+            segments = self._load_state(size)
+            if segments is not None and show_progress:
+                print("     | resuming the interrupted download")
+        if segments is None:
+            if ranges and size:
+                segments = self._split(size)
+            else:
+                segments = [[0, None if size is None else size - 1, 0]]
+            with open(self._part, "wb") as part_file:
+                if ranges and size:
+                    part_file.truncate(size)
+
+        progress = _Progress(segments, size,
+                             self._state if ranges and size else None)
+        progress.set_state_url(self.url)
+        if show_progress and size:
+            print("     | total file size to download ~ " +
+                  str(size // 1000000) + "Mb")
+
+        if self.checksum:
+            algorithm, expected = parse_checksum(self.checksum)
+        else:
+            algorithm, expected = DEFAULT_ALGORITHM, None
+
+        threads = [threading.Thread(target=self._download_segment,
+                                    args=(segment, progress))
+                   for segment in segments]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+
+        reader = _StreamReader(self._part, progress, algorithm)
+        errors = []
+        extractor = None
+        if extract_dir:
+            if os.path.exists(extract_dir):
+                shutil.rmtree(extract_dir)
+            os.makedirs(extract_dir)
+            extractor = threading.Thread(target=self._extract,
+                                         args=(reader, extract_dir, errors))
+            extractor.daemon = True
+            extractor.start()
+
+        try:
+            while any(thread.is_alive() for thread in threads):
+                if show_progress:
+                    self._show_progress(progress.downloaded(), progress.total)
+                for thread in threads:
+                    thread.join(0.5)
+            progress.finish()
+            if show_progress:
+                self._show_progress(progress.downloaded(), progress.total)
+                print("")
+
+            if extractor is not None:
+                extractor.join()
+            reader.drain()
+        except DownloadError:
+            # reported below
+            pass
+        finally:
+            reader.close()
+
+        if progress.error is not None:
+            raise DownloadError("Download of {0} failed: {1}"
+                                .format(self.url, progress.error))
+        if errors:
+            raise DownloadError("Can't extract {0}: {1}"
+                                .format(self.url, errors[0]))
+
+        if expected and reader.digest.hexdigest() != expected:
+            for path in (self._part, self._state):
+                if os.path.exists(path):
+                    os.remove(path)
+            raise DownloadError("Invalid checksum for {0}".format(self.url))
+
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        os.rename(self._part, self.path)
+        if os.path.exists(self._state):
+            os.remove(self._state)
+        return self.path
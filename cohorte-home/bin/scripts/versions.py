@@ -0,0 +1,347 @@
+#!/usr/bin/env python
+# -- Content-Encoding: UTF-8 --
+"""
+Side-by-side installations of COHORTE distributions.
+
+Each installed distribution is a directory of ``COHORTE_HOME/.versions``.
+Files which didn't change between two versions are hard links to the same
+data, so that a version only costs the disk space of its changed files.
+``.versions/current`` is a symbolic link to the active version and the
+distribution entries of the home directory (``bin``, ``conf``, ``repo``...)
+are symbolic links to ``.versions/current/<entry>``::
+
+    COHORTE_HOME/
+        bin -> .versions/current/bin
+        conf -> .versions/current/conf
+        ...
+        .versions/
+            current -> 1.2.0-20160101-000000
+            previous -> 1.1.0-20150101-000000
+            1.1.0-20150101-000000/
+            1.2.0-20160101-000000/
+
+Switching from a version to another (update or roll back) is a single
+atomic rename of the ``current`` link.
+
+Symbolic links are required: on platforms without them, cohorte-update
+keeps replacing the files of the home directory.
+
+The files of the entries edited in place by users (``conf``) are copied
+instead: an edit in the active version must not change the previous one.
+
+:author: Bassem Debbabi
+:license: Apache Software License 2.0
+
+..
+
+    Copyright 2015 isandlaTech
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Standard Library
+import filecmp
+import os
+import shutil
+
+# Documentation strings format
+__docformat__ = "restructuredtext en"
+
+# Boot module version
+__version__ = "1.0.0"
+
+VERSIONS_FOLDER = ".versions"
+""" Folder of the installed versions, in COHORTE_HOME """
+
+CURRENT = "current"
+""" Link to the active version """
+
+PREVIOUS = "previous"
+""" Link to the version active before the last switch """
+
+KEEP_VERSIONS = 3
+""" Number of versions kept (besides the current and previous ones) """
+
+EXCLUDED = (".archive", ".download", VERSIONS_FOLDER, ".git", ".project")
+""" Entries of the home directory which are never part of a version """
+
+MUTABLE = ("conf",)
+""" Entries edited in place by users: their files are never shared """
+
+
+def is_supported():
+    """
+    Checks if the platform supports versioned installations
+    """
+    return os.name == "posix" and hasattr(os, "symlink") \
+        and hasattr(os, "link")
+
+
+def get_versions_dir(home):
+    """
+    Returns the versions folder of the given home
+    """
+    return os.path.join(home, VERSIONS_FOLDER)
+
+
+def _read_link(home, name):
+    """
+    Returns the version targeted by a link of the versions folder, or None
+    """
+    path = os.path.join(get_versions_dir(home), name)
+    if os.path.islink(path):
+        return os.readlink(path)
+    return None
+
+
+def get_current(home):
+    """
+    Returns the name of the active version, or None if the home is not
+    versioned
+    """
+    return _read_link(home, CURRENT)
+
+
+def get_previous(home):
+    """
+    Returns the name of the version active before the last switch, or None
+    """
+    previous = _read_link(home, PREVIOUS)
+    if previous and os.path.isdir(os.path.join(get_versions_dir(home),
+                                               previous)):
+        return previous
+    return None
+
+
+def get_version_dir(home, version):
+    """
+    Returns the directory of a version
+    """
+    return os.path.join(get_versions_dir(home), version)
+
+
+def _set_link(home, name, version):
+    """
+    Atomically points a link of the versions folder to a version
+    """
+    path = os.path.join(get_versions_dir(home), name)
+    tmp_path = path + ".tmp"
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    os.symlink(version, tmp_path)
+    os.rename(tmp_path, path)
+
+
+def _is_mutable(relative):
+    """
+    Checks if a path, relative to a version directory, is part of an entry
+    edited in place
+    """
+    return os.path.normpath(relative).split(os.sep)[0] in MUTABLE
+
+
+def _link_tree(source, target):
+    """
+    Copies a tree, hard linking its files, except those of the entries
+    edited in place
+    """
+    os.makedirs(target)
+    for root, dirs, files in os.walk(source):
+        relative = os.path.relpath(root, source)
+        target_root = os.path.normpath(os.path.join(target, relative))
+        for name in dirs:
+            path = os.path.join(root, name)
+            if os.path.islink(path):
+                os.symlink(os.readlink(path), os.path.join(target_root, name))
+            else:
+                os.mkdir(os.path.join(target_root, name))
+        for name in files:
+            path = os.path.join(root, name)
+            if os.path.islink(path):
+                os.symlink(os.readlink(path), os.path.join(target_root, name))
+            elif _is_mutable(os.path.join(relative, name)):
+                shutil.copy2(path, os.path.join(target_root, name))
+            else:
+                os.link(path, os.path.join(target_root, name))
+
+
+def _share_unchanged(version_dir, base_dir):
+    """
+    Replaces the files of a version which are identical in the base version
+    by hard links to the base files
+
+    :return: The number of shared files
+    """
+    shared = 0
+    for root, _, files in os.walk(version_dir):
+        relative = os.path.relpath(root, version_dir)
+        for name in files:
+            path = os.path.join(root, name)
+            base = os.path.normpath(os.path.join(base_dir, relative, name))
+            if os.path.islink(path) or os.path.islink(base) \
+                    or not os.path.isfile(base) \
+                    or _is_mutable(os.path.join(relative, name)):
+                continue
+            if os.path.samefile(path, base) \
+                    or not filecmp.cmp(path, base, shallow=False):
+                continue
+            os.link(base, path + ".tmp")
+            os.rename(path + ".tmp", path)
+            shared += 1
+    return shared
+
+
+def _link_entries(home, version):
+    """
+    Links the home entries to the current version: creates the links of
+    the entries of the version and removes those of the entries it doesn't
+    have anymore
+    """
+    version_dir = get_version_dir(home, version)
+    prefix = os.path.join(VERSIONS_FOLDER, CURRENT)
+    for name in os.listdir(version_dir):
+        path = os.path.join(home, name)
+        if not os.path.lexists(path):
+            os.symlink(os.path.join(prefix, name), path)
+
+    for name in os.listdir(home):
+        path = os.path.join(home, name)
+        if os.path.islink(path) \
+                and os.readlink(path).startswith(prefix + os.sep) \
+                and not os.path.lexists(os.path.join(version_dir, name)):
+            os.remove(path)
+
+
+def snapshot_home(home, version, entries):
+    """
+    Converts an installation in place to a versioned one: moves the given
+    entries of the home in a version and replaces them by links
+
+    :param home: COHORTE home directory
+    :param version: Name of the installed version
+    :param entries: Names of the distribution entries of the home
+    """
+    version_dir = get_version_dir(home, version)
+    if os.path.exists(version_dir):
+        shutil.rmtree(version_dir)
+    os.makedirs(version_dir)
+
+    for name in entries:
+        path = os.path.join(home, name)
+        if name in EXCLUDED or os.path.islink(path) \
+                or not os.path.lexists(path):
+            continue
+        os.rename(path, os.path.join(version_dir, name))
+
+    _set_link(home, CURRENT, version)
+    _link_entries(home, version)
+
+
+def create_version(home, version, base_version, tree=None, staging=None,
+                   changed=(), removed=(), manifest=None):
+    """
+    Creates a version from a base one
+
+    Either a whole tree is given (full distribution), whose files identical
+    in the base version are shared, or the base version is cloned and the
+    changed and removed files are applied (delta update).
+
+    :param home: COHORTE home directory
+    :param version: Name of the new version
+    :param base_version: Name of the base version
+    :param tree: Directory of the full distribution (moved)
+    :param staging: Directory of the changed files (moved)
+    :param changed: Paths ('/' separated) of the changed files, in staging
+    :param removed: Paths ('/' separated) of the removed files
+    :param manifest: Manifest of the distribution, giving the mode of the
+                     changed files
+    :return: The directory of the new version
+    """
+    version_dir = get_version_dir(home, version)
+    if os.path.exists(version_dir):
+        # re-installation of an inactive version
+        shutil.rmtree(version_dir)
+    base_dir = get_version_dir(home, base_version)
+
+    if tree is not None:
+        shutil.move(tree, version_dir)
+        _share_unchanged(version_dir, base_dir)
+        return version_dir
+
+    _link_tree(base_dir, version_dir)
+    for relative in changed:
+        local = os.path.join(*relative.split("/"))
+        path = os.path.join(version_dir, local)
+        if os.path.lexists(path):
+            # never write in a file shared with the base version
+            os.remove(path)
+        elif not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        shutil.move(os.path.join(staging, local), path)
+        mode = (manifest or {}).get("files", {}).get(relative, {}).get("mode")
+        if mode is not None:
+            os.chmod(path, mode)
+
+    for relative in removed:
+        path = os.path.join(version_dir, *relative.split("/"))
+        if os.path.lexists(path):
+            os.remove(path)
+    return version_dir
+
+
+def switch(home, version):
+    """
+    Makes the given version the active one
+
+    :return: The previously active version
+    """
+    current = get_current(home)
+    if current and current != version:
+        _set_link(home, PREVIOUS, current)
+    _set_link(home, CURRENT, version)
+    _link_entries(home, version)
+    return current
+
+
+def roll_back(home):
+    """
+    Makes the previous version the active one again
+
+    :return: The name of the restored version, or None
+    """
+    previous = get_previous(home)
+    if previous is None:
+        return None
+    switch(home, previous)
+    return previous
+
+
+def prune(home, keep=KEEP_VERSIONS):
+    """
+    Removes the oldest versions, keeping the current and previous ones
+
+    :return: The names of the removed versions
+    """
+    versions_dir = get_versions_dir(home)
+    active = (get_current(home), get_previous(home))
+    versions = sorted(
+        (name for name in os.listdir(versions_dir)
+         if name not in active and not os.path.islink(
+             os.path.join(versions_dir, name))
+         and os.path.isdir(os.path.join(versions_dir, name))),
+        key=lambda name: os.path.getmtime(os.path.join(versions_dir, name)))
+
+    removed = versions[:max(0, len(versions) - keep)]
+    for name in removed:
+        shutil.rmtree(os.path.join(versions_dir, name))
+    return removed
@@ -6,6 +6,14 @@
 	 * List of bundles
 	 */
 	"bundles" : [
+	// Startup tracer (only active with cohorte-start-node --trace-startup)
+	{
+		"name" : "debug.startup"
+	},
+	// Rotation and indexing of the isolate log
+	{
+		"name" : "debug.logs"
+	},
 	// The remote shell is common to all isolates
 	{
 		"name" : "pelix.shell.core"
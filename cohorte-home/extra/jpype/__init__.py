@@ -23,6 +23,7 @@ from ._jproxy import *
 from ._jexception import *
 from ._core import *
 from ._gui import *
+from ._jcollection import toJava, toPython
 
 # Module version (same as in the setup file)
 __version_info__ = (0, 5, 5, 2)
@@ -0,0 +1,93 @@
+#*****************************************************************************
+#   Copyright 2015 isandlaTech
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+#*****************************************************************************
+
+import json
+import os
+
+# ------------------------------------------------------------------------------
+
+CACHE_DIR_ENV = "JPYPE_CACHE_DIR"
+""" Environment variable giving the cache directory """
+
+# ------------------------------------------------------------------------------
+
+def get_cache_dir():
+    """
+    Retrieves the directory where JPype keeps the data it computes once: the
+    JPYPE_CACHE_DIR environment variable, else the var/cache/jvm folder of
+    the COHORTE node
+
+    :return: The path to the cache directory, or None (no cache)
+    """
+    cache_dir = os.getenv(CACHE_DIR_ENV)
+    if not cache_dir:
+        base = os.getenv("COHORTE_BASE")
+        if not base:
+            return None
+        cache_dir = os.path.join(base, "var", "cache", "jvm")
+
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir)
+        except OSError:
+            # Created by another process or not writable
+            if not os.path.isdir(cache_dir):
+                return None
+    return cache_dir
+
+
+def read_json(name):
+    """
+    Reads a JSON file of the cache directory
+
+    :param name: Name of the file
+    :return: The file content, or None
+    """
+    cache_dir = get_cache_dir()
+    if cache_dir is None:
+        return None
+
+    try:
+        with open(os.path.join(cache_dir, name)) as cache_file:
+            return json.load(cache_file)
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def write_json(name, content):
+    """
+    Writes a JSON file of the cache directory. Errors are ignored: the cache
+    is only an optimization.
+
+    :param name: Name of the file
+    :param content: Content of the file
+    """
+    cache_dir = get_cache_dir()
+    if cache_dir is None:
+        return
+
+    path = os.path.join(cache_dir, name)
+    tmp_path = "{0}.{1}.tmp".format(path, os.getpid())
+    try:
+        with open(tmp_path, "w") as cache_file:
+            json.dump(content, cache_file, indent=1, sort_keys=True)
+        if os.name == "nt" and os.path.exists(path):
+            os.remove(path)
+        os.rename(tmp_path, path)
+    except (IOError, OSError):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
@@ -0,0 +1,289 @@
+#*****************************************************************************
+#   Copyright 2015 isandlaTech
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+#*****************************************************************************
+"""
+Application Class-Data Sharing (AppCDS) archives
+
+The classes of the JVM class path (Felix framework, Cohorte bootstrap...) are
+parsed and verified on each JVM start. With an AppCDS archive, they are
+mapped from a file shared by all the JVMs using the same class path.
+
+On the first start with a given JVM, class path and distribution version, the
+archive is dumped by a background ``java -Xshare:dump`` process, from the
+list of the classes of the class path; the next starts use it. AppCDS
+requires Java 11 or newer: older JVMs are started without archive.
+"""
+
+from . import _cache
+import hashlib
+import os
+import re
+import subprocess
+import threading
+import time
+import zipfile
+
+# ------------------------------------------------------------------------------
+
+CDS_ENV = "JPYPE_CDS"
+""" Environment variable disabling class-data sharing when set to 0 """
+
+VERSION_FILE = os.path.join("conf", "version.js")
+""" Distribution version file, in COHORTE_HOME """
+
+MIN_JAVA_VERSION = 11
+""" First Java version supporting AppCDS without commercial flags """
+
+KEEP_ARCHIVES = 4
+""" Number of archives kept in the cache directory """
+
+DUMP_TIMEOUT = 300
+""" Age of a dump lock file after which the dump is considered dead (s) """
+
+CLASS_PATH_PREFIX = "-Djava.class.path="
+
+_CDS_OPTIONS = ("-Xshare:", "-XX:SharedArchiveFile=",
+                "-XX:SharedClassListFile=", "-XX:ArchiveClassesAtExit=")
+
+# ------------------------------------------------------------------------------
+
+def get_java_home(jvm):
+    """
+    Finds the Java installation folder of a JVM library, i.e. its first
+    parent containing the 'release' file
+
+    :param jvm: Path to the JVM library
+    :return: The Java home folder, or None
+    """
+    path = os.path.dirname(os.path.realpath(jvm))
+    for _ in range(4):
+        if os.path.isfile(os.path.join(path, "release")):
+            return path
+        path = os.path.dirname(path)
+
+
+def get_java_version(java_home):
+    """
+    Reads the major version of a Java installation from its 'release' file
+
+    :param java_home: A Java home folder
+    :return: The major version (8, 11, ...), or None
+    """
+    try:
+        with open(os.path.join(java_home, "release")) as release:
+            content = release.read()
+    except (IOError, OSError):
+        return None
+
+    match = re.search(r'^JAVA_VERSION="(\d+)(?:\.(\d+))?', content, re.M)
+    if match is None:
+        return None
+
+    major = int(match.group(1))
+    if major == 1 and match.group(2):
+        # 1.8.0_xxx
+        major = int(match.group(2))
+    return major
+
+
+def _get_class_path(args):
+    """
+    Retrieves the class path entries given in the JVM arguments
+    """
+    for arg in args:
+        if arg.startswith(CLASS_PATH_PREFIX):
+            return [entry for entry in
+                    arg[len(CLASS_PATH_PREFIX):].split(os.pathsep) if entry]
+    return []
+
+
+def _get_archive_key(jvm, class_path):
+    """
+    Computes the archive key: an archive is only valid for the JVM, the
+    class path files and the distribution version it has been dumped with
+    """
+    digest = hashlib.sha1()
+    digest.update(os.path.realpath(jvm).encode("utf-8"))
+    for entry in class_path:
+        digest.update(b"\0")
+        digest.update(entry.encode("utf-8"))
+        try:
+            digest.update(str(os.path.getmtime(entry)).encode("utf-8"))
+        except OSError:
+            pass
+
+    home = os.getenv("COHORTE_HOME")
+    if home:
+        try:
+            with open(os.path.join(home, VERSION_FILE), "rb") as version:
+                digest.update(version.read())
+        except (IOError, OSError):
+            pass
+    return digest.hexdigest()[:16]
+
+
+def get_environment_key(jvm, args):
+    """
+    Computes a key identifying the JVM, its class path and the distribution
+    version, to validate the data cached for the classes they provide
+
+    :param jvm: Path to the JVM library
+    :param args: JVM arguments
+    :return: A hexadecimal key
+    """
+    return _get_archive_key(jvm, _get_class_path(args))
+
+
+def _list_classes(java_home, class_path):
+    """
+    Lists the classes to archive: the default class list of the JVM and the
+    classes of the JAR files of the class path
+
+    :return: A list of class names ('/' separated)
+    """
+    classes = []
+    default_list = os.path.join(java_home, "lib", "classlist")
+    if os.path.isfile(default_list):
+        with open(default_list) as class_list:
+            classes.extend(line.strip() for line in class_list
+                           if line.strip() and not line.startswith("#")
+                           and not line.startswith("@"))
+
+    for entry in class_path:
+        if not os.path.isfile(entry):
+            continue
+        try:
+            with zipfile.ZipFile(entry) as jar:
+                for name in jar.namelist():
+                    if name.endswith(".class") \
+                            and not name.startswith("META-INF/") \
+                            and not name.endswith("module-info.class") \
+                            and not name.endswith("package-info.class"):
+                        classes.append(name[:-len(".class")])
+        except (IOError, OSError, zipfile.BadZipfile):
+            # Not a valid JAR file: ignore it
+            pass
+    return classes
+
+
+def _lock(lock_path):
+    """
+    Creates the dump lock file
+
+    :return: True if the lock has been acquired
+    """
+    try:
+        if time.time() - os.path.getmtime(lock_path) > DUMP_TIMEOUT:
+            # The dumping process died
+            os.remove(lock_path)
+    except OSError:
+        pass
+
+    try:
+        os.close(os.open(lock_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        return True
+    except OSError:
+        # Another JVM is dumping the archive
+        return False
+
+
+def _prune(cache_dir, keep=KEEP_ARCHIVES):
+    """
+    Removes the oldest archives of the cache directory
+    """
+    archives = sorted((os.path.join(cache_dir, name)
+                       for name in os.listdir(cache_dir)
+                       if name.startswith("cds-") and name.endswith(".jsa")),
+                      key=os.path.getmtime)
+    for path in archives[:max(0, len(archives) - keep)]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def _dump(java_home, class_path, archive):
+    """
+    Dumps the archive of the given class path. Blocks until the end of the
+    dump.
+    """
+    lock_path = archive + ".lock"
+    list_path = archive + ".classlist"
+    tmp_path = archive + ".tmp"
+    try:
+        with open(list_path, "w") as class_list:
+            class_list.write("\n".join(_list_classes(java_home, class_path)))
+            class_list.write("\n")
+
+        java = os.path.join(java_home, "bin",
+                            "java.exe" if os.name == "nt" else "java")
+        with open(os.devnull, "wb") as devnull:
+            result = subprocess.call(
+                [java, "-Xshare:dump",
+                 "-XX:SharedClassListFile=" + list_path,
+                 "-XX:SharedArchiveFile=" + tmp_path,
+                 "-cp", os.pathsep.join(class_path)],
+                stdin=None, stdout=devnull, stderr=devnull)
+
+        if result == 0 and os.path.exists(tmp_path):
+            os.rename(tmp_path, archive)
+            _prune(os.path.dirname(archive))
+
+    except (IOError, OSError):
+        # Dump failed: the JVM will simply be started without archive
+        pass
+
+    finally:
+        for path in (tmp_path, list_path, lock_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def get_archive_args(jvm, args):
+    """
+    Computes the JVM arguments to use the AppCDS archive of the class path
+    given in the arguments. If the archive doesn't exist yet, it is dumped in
+    background for the next starts.
+
+    :param jvm: Path to the JVM library
+    :param args: JVM arguments
+    :return: The arguments to add to the JVM ones (can be empty)
+    """
+    if os.getenv(CDS_ENV, "1") == "0" \
+            or any(arg.startswith(_CDS_OPTIONS) for arg in args):
+        # Disabled, or explicitly configured
+        return []
+
+    # The archive is only used with the exact same class path
+    class_path = _get_class_path(args)
+    cache_dir = _cache.get_cache_dir()
+    java_home = get_java_home(jvm)
+    if not class_path or cache_dir is None or java_home is None \
+            or (get_java_version(java_home) or 0) < MIN_JAVA_VERSION:
+        return []
+
+    archive = os.path.join(cache_dir, "cds-{0}.jsa".format(
+        _get_archive_key(jvm, class_path)))
+    if os.path.exists(archive):
+        # Sharing is optional: the JVM ignores an invalid archive
+        return ["-Xshare:auto", "-XX:SharedArchiveFile=" + archive]
+
+    if _lock(archive + ".lock"):
+        thread = threading.Thread(target=_dump, name="jpype-cds-dump",
+                                  args=(java_home, class_path, archive))
+        thread.daemon = True
+        thread.start()
+    return []
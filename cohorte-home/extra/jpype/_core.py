@@ -29,6 +29,8 @@ from . import _properties
 from . import nio
 from . import reflect
 from . import _refdaemon
+from . import _cds
+from . import _jthread
 
 _usePythonThreadForDaemon = False
 
@@ -41,7 +43,10 @@ def isJVMStarted() :
     return _jpype.isStarted()
 
 def startJVM(jvm, *args) :
-    _jpype.startup(jvm, tuple(args), True)
+    # Use the class-data sharing archive of the class path, if any
+    args = tuple(args) + tuple(_cds.get_archive_args(jvm, args))
+    _jpype.startup(jvm, args, True)
+    _jclass._setClassCacheVersion(_cds.get_environment_key(jvm, args))
     _jclass._initialize()
     _jarray._initialize()
     _jwrapper._initialize()
@@ -79,10 +84,20 @@ def isThreadAttachedToJVM() :
     return _jpype.isThreadAttachedToJVM()
 
 def attachThreadToJVM() :
-    _jpype.attachThreadToJVM()
+    # Detached automatically when the thread ends
+    _jthread.attach()
 
 def detachThreadFromJVM() :
-    _jpype.detachThreadFromJVM()
+    _jthread.detach()
+
+def getJVMStatistics() :
+    """
+    Returns the counters of the bridge: attachments of the Python threads and
+    calls of the proxies callbacks
+    """
+    return {"started": isJVMStarted(),
+            "threads": _jthread.getStatistics(),
+            "proxies": _jproxy.getStatistics()}
 
 
 def get_default_jvm_path():
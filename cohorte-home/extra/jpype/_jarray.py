@@ -18,17 +18,50 @@
 import _jpype
 from . import _jclass
 from . import _jwrapper
-import collections
+from . import nio
+import array
+import struct
+import sys
+
+try :
+    from collections.abc import Sequence
+except ImportError :
+    # Python 2
+    from collections import Sequence
 
 _CLASSES = {}
 _CUSTOMIZERS = []
 
+
+def _longTypeCode():
+    # 'q' is not available before Python 3.3
+    for code in ('q', 'l'):
+        try:
+            if array.array(code).itemsize == 8:
+                return code
+        except ValueError:
+            pass
+
+# Primitive type -> (array.array type code, java.nio.ByteBuffer view method,
+# NumPy type)
+_PRIMITIVES = {
+    'byte': ('b', None, 'int8'),
+    'short': ('h', 'asShortBuffer', 'int16'),
+    'int': ('i', 'asIntBuffer', 'int32'),
+    'long': (_longTypeCode(), 'asLongBuffer', 'int64'),
+    'float': ('f', 'asFloatBuffer', 'float32'),
+    'double': ('d', 'asDoubleBuffer', 'float64'),
+    'char': ('H', 'asCharBuffer', 'uint16'),
+    'boolean': ('B', None, 'bool'),
+}
+
 def _initialize() :
     _jpype.setJavaArrayClass(_JavaArrayClass)
     _jpype.setGetJavaArrayClassMethod(_getClassFor)
 
     registerArrayCustomizer(CharArrayCustomizer())
     registerArrayCustomizer(ByteArrayCustomizer())
+    registerArrayCustomizer(PrimitiveArrayCustomizer())
 
 def registerArrayCustomizer(c) :
     _CUSTOMIZERS.append(c)
@@ -44,7 +77,20 @@ class _JavaArrayClass(object) :
         return _jpype.getArrayLength(self.__javaobject__)
 
     def __iter__(self) :
-        return _JavaArrayIter(self)
+        # One bulk read instead of a JNI call per item
+        return iter(self.tolist())
+
+    def tolist(self) :
+        """
+        Returns the items of the array, read in one call
+        """
+        return self._getRange(0, len(self))
+
+    def _getRange(self, start, stop) :
+        return _jpype.getArraySlice(self.__javaobject__, start, stop)
+
+    def _setRange(self, start, stop, values) :
+        _jpype.setArraySlice(self.__javaobject__, start, stop, values)
 
     def __getitem__(self, ndx):
         if type(ndx) is not slice:
@@ -52,18 +98,20 @@ class _JavaArrayClass(object) :
             return _jpype.getArrayItem(self.__javaobject__, ndx)
 
         # Slice
-        start = ndx.start if ndx.start is not None else 0
-        stop = ndx.stop if ndx.stop is not None else 0
-
-        if stop >= start and ndx.step in (None, 1):
+        start, stop, step = ndx.indices(self.__len__())
+        if step == 1:
             # Normal slice
-            return _jpype.getArraySlice(self.__javaobject__, start, stop)
+            return self._getRange(start, max(start, stop))
 
         else:
-            # Complex slice
-            start, stop, step = ndx.indices(self.__len__())
-            return [_jpype.getArrayItem(self.__javaobject__, index)
-                    for index in range(start, stop, step)]
+            # Complex slice: read the covered range at once
+            indices = range(start, stop, step)
+            if len(indices) == 0:
+                return []
+
+            low = min(indices[0], indices[-1])
+            values = self._getRange(low, max(indices[0], indices[-1]) + 1)
+            return list(values[indices[0] - low::step])
 
 
     def __setitem__(self, ndx, val):
@@ -73,19 +121,28 @@ class _JavaArrayClass(object) :
             return
 
         # Slice
-        start = ndx.start if ndx.start is not None else 0
-        stop = ndx.stop if ndx.stop is not None else 0
-
-        if stop >= start and ndx.step in (None, 1):
+        start, stop, step = ndx.indices(self.__len__())
+        if step == 1:
             # Normal slice
-            _jpype.setArraySlice(self.__javaobject__, start, stop, val)
+            self._setRange(start, max(start, stop), val)
 
         else:
-            # Complex slice
-            start, stop, step = ndx.indices(self.__len__())
+            # Complex slice: update the covered range at once
             indices = range(start, stop, step)
-            for value in val:
-                _jpype.setArrayItem(self.__javaobject__, next(indices), value)
+            val = list(val)
+            if len(val) != len(indices):
+                raise ValueError("attempt to assign sequence of size {0} "
+                                 "to extended slice of size {1}"
+                                 .format(len(val), len(indices)))
+            if not val:
+                return
+
+            low = min(indices[0], indices[-1])
+            high = max(indices[0], indices[-1]) + 1
+            values = list(_jpype.getArraySlice(self.__javaobject__, low, high))
+            for index, value in zip(indices, val):
+                values[index - low] = value
+            _jpype.setArraySlice(self.__javaobject__, low, high, values)
 
 
 def _jarrayInit(self, *args) :
@@ -95,7 +152,7 @@ def _jarrayInit(self, *args) :
         raise TypeError("Array classes only take 2 parameters, {0} given".format(len(args) + 1))
     else:
         values = None
-        if isinstance(args[0], collections.Sequence):
+        if isinstance(args[0], Sequence):
             sz = len(args[0])
             values = args[0]
         else :
@@ -194,3 +251,199 @@ class ByteArrayCustomizer(object) :
 
     def customize(self, name, jc, bases, members) :
         members['__str__'] = _byteArrayStr
+
+
+def _nioView(self, values) :
+    """
+    Returns a NIO buffer of the array item type on the memory of values
+    """
+    buffer = nio.convertToNativeDirectBuffer(values)
+    if self._bufferView is not None :
+        return getattr(buffer, self._bufferView)()
+    return buffer
+
+def _primitiveGetRange(self, start, stop) :
+    if self._typeCode == 'b' :
+        # Bytes are always read as integers
+        return self.toarray(start, stop).tolist()
+    return _jpype.getArraySlice(self.__javaobject__, start, stop)
+
+def _primitiveSetRange(self, start, stop, values) :
+    if stop > start and not isinstance(values, (list, tuple)) :
+        native = _asNativeArray(self._typeCode, values)
+        if native is None :
+            # Items of another type: converted one by one
+            values = _asList(values)
+        else :
+            if self._typeCode == 'B' :
+                # No NIO view of booleans
+                values = [bool(value) for value in native]
+            elif len(native) == stop - start :
+                # Bulk copy from the buffer
+                _nioView(self, native).get(self, start, stop - start)
+                return
+    _jpype.setArraySlice(self.__javaobject__, start, stop, values)
+
+_NATIVE_ORDER = '<' if sys.byteorder == 'little' else '>'
+
+# Buffer item codes with the same kind of values: signed, unsigned, floats
+_KINDS = ('bhilq', 'BHILQ', 'fd')
+
+def _isSameType(fmt, typeCode) :
+    """
+    Checks if the items of a buffer format are stored like the items of the
+    given array type code, i.e. if they can be copied without conversion
+    """
+    order, code = ('@', fmt) if len(fmt) == 1 else (fmt[0], fmt[1:])
+    if order == '!' :
+        order = '>'
+    if len(code) != 1 or order not in ('@', '=', _NATIVE_ORDER) :
+        return False
+
+    if typeCode == 'b' :
+        # Bytes are copied as is: b'\xff' is the Java byte -1
+        return code in 'bBc'
+
+    for kind in _KINDS :
+        if code in kind and typeCode in kind :
+            try :
+                return struct.calcsize(order + code) \
+                    == struct.calcsize(typeCode)
+            except struct.error :
+                return False
+    return False
+
+def _asList(values) :
+    """
+    Converts the items of a sequence or of a buffer to a flat list of Python
+    values
+    """
+    try :
+        data = memoryview(values)
+        items = data.tolist()
+    except (TypeError, NotImplementedError) :
+        return list(values)
+
+    for _ in range(data.ndim - 1) :
+        items = [item for sub in items for item in sub]
+    return items
+
+def _asNativeArray(typeCode, values) :
+    """
+    Converts an object supporting the buffer protocol (bytes, array.array,
+    NumPy array...) to a writable buffer of items of the given type, copying
+    it only if needed
+
+    :return: A buffer object with a length in items, or None if values is
+             not a buffer of items of the given type (its values must be
+             converted)
+    """
+    if isinstance(values, array.array) and values.typecode == typeCode :
+        return values
+
+    try :
+        data = memoryview(values)
+    except TypeError :
+        return None
+
+    if not _isSameType(data.format, typeCode) :
+        return None
+
+    if data.format == typeCode and data.ndim == 1 and not data.readonly \
+            and getattr(data, 'c_contiguous', False) :
+        # Compatible buffer (e.g. NumPy array): use it directly
+        return values
+
+    result = array.array(typeCode)
+    raw = data.tobytes()
+    if len(raw) % result.itemsize :
+        raise ValueError("Buffer size is not a multiple of the item size ({0})"
+                         .format(result.itemsize))
+    if hasattr(result, 'frombytes') :
+        result.frombytes(raw)
+    else :
+        # Python 2
+        result.fromstring(raw)
+    return result
+
+def _primitiveToArray(self, start=0, stop=None) :
+    """
+    Copies the items of the array in an array.array, in one bulk copy
+    """
+    if stop is None :
+        stop = len(self)
+    if self._typeCode == 'B' :
+        # No NIO view of booleans
+        return array.array('B', _jpype.getArraySlice(self.__javaobject__,
+                                                     start, stop))
+
+    result = array.array(self._typeCode, [0]) * max(0, stop - start)
+    if len(result) :
+        _nioView(self, result).put(self, start, stop - start)
+    return result
+
+def _primitiveToBytes(self) :
+    """
+    Returns the content of the array as bytes, in native byte order
+    """
+    result = self.toarray()
+    if hasattr(result, 'tobytes') :
+        return result.tobytes()
+    # Python 2
+    return result.tostring()
+
+def _primitiveBuffer(self, flags) :
+    # Python 3.12+ buffer protocol: a read-only copy of the array
+    import inspect
+    if flags & inspect.BufferFlags.WRITABLE :
+        raise BufferError("Java arrays only provide read-only copies: "
+                          "assign a slice to update them")
+    return memoryview(self.toarray()).toreadonly()
+
+def _primitiveNumPyArray(self, dtype=None, copy=None) :
+    # NumPy interface: copy the array directly in a new NumPy array
+    import numpy
+    result = numpy.empty(len(self), dtype=self._numpyType)
+    if len(result) :
+        if self._typeCode == 'B' :
+            result[:] = _jpype.getArraySlice(self.__javaobject__, 0, len(self))
+        else :
+            _nioView(self, result).put(self, 0, len(self))
+    if dtype is not None :
+        result = result.astype(dtype, copy=False)
+    return result
+
+def _primitiveFromBuffer(cls, values) :
+    """
+    Creates a Java array with the content of an object supporting the buffer
+    protocol (bytes, array.array, NumPy array...), copied in bulk
+    """
+    if not isinstance(values, (list, tuple)) :
+        native = _asNativeArray(cls._typeCode, values)
+        if native is None :
+            # Items of another type: converted one by one
+            values = _asList(values)
+        else :
+            values = native
+
+    result = cls(len(values))
+    result[0:len(values)] = values
+    return result
+
+class PrimitiveArrayCustomizer(object) :
+    def canCustomize(self, name, jc) :
+        return name[-2:] == '[]' and name[:-2] in _PRIMITIVES \
+            and _PRIMITIVES[name[:-2]][0] is not None
+
+    def customize(self, name, jc, bases, members) :
+        typeCode, view, numpyType = _PRIMITIVES[name[:-2]]
+        members['_typeCode'] = typeCode
+        members['_bufferView'] = view
+        members['_numpyType'] = numpyType
+        members['_getRange'] = _primitiveGetRange
+        members['_setRange'] = _primitiveSetRange
+        members['toarray'] = _primitiveToArray
+        members['tobytes'] = _primitiveToBytes
+        members['from_buffer'] = classmethod(_primitiveFromBuffer)
+        members['__buffer__'] = _primitiveBuffer
+        members['__array__'] = _primitiveNumPyArray
@@ -14,7 +14,13 @@
 #   limitations under the License.
 #
 #*****************************************************************************
+import atexit
+import os
+import threading
+
 import _jpype
+from . import _cache
+from . import _jthread
 from ._pykeywords import KEYWORDS
 
 
@@ -29,6 +35,27 @@ _RUNTIMEEXCEPTION = None
 
 _CUSTOMIZERS = []
 
+# Thread-local marker of the threads attached to the JVM
+_ATTACHED = _jthread.attached
+
+# Classes whose fields and methods are not yet set up
+_PENDING = set()
+_MATERIALIZE_LOCK = threading.RLock()
+
+# Class -> {attribute name -> (kind, class member)}
+_RESOLVED = {}
+_GENERIC = "generic"
+_METHOD = "method"
+_FIELD = "field"
+_STATIC = "static"
+
+# Optional persistent cache of the member and property tables of classes
+CLASS_CACHE_ENV = "JPYPE_CLASS_CACHE"
+CLASS_CACHE_FILE = "classes.json"
+_CLASS_CACHE = None
+_CLASS_CACHE_VERSION = None
+_CLASS_CACHE_DIRTY = set()
+
 _COMPARABLE_METHODS = {
         "__cmp__": lambda self, o: self.compareTo(o)
         }
@@ -46,10 +73,87 @@ def _initialize():
 
 
 def registerClassCustomizer(c):
+    """
+    Registers a class customizer. The customizers with a true "lazy"
+    attribute are called when the members of the class are first accessed,
+    the others when the class is defined.
+    """
     _CUSTOMIZERS.append(c)
 
 
+def _setClassCacheVersion(version):
+    """
+    Enables the persistent class cache if the JPYPE_CLASS_CACHE environment
+    variable is set: its value is the version of the loaded classes (e.g. the
+    application version), completed with the given version of the JVM
+    environment. Tables cached with another version are ignored.
+    """
+    global _CLASS_CACHE_VERSION
+    token = os.getenv(CLASS_CACHE_ENV)
+    if token and token != "0" and _cache.get_cache_dir() is not None:
+        _CLASS_CACHE_VERSION = "{0}:{1}".format(token, version)
+        atexit.register(_saveClassCache)
+    else:
+        _CLASS_CACHE_VERSION = None
+
+
+def _getCachedTable(name, table):
+    """
+    Returns a table computed for the given class by a previous run, or None
+    """
+    global _CLASS_CACHE
+    if _CLASS_CACHE_VERSION is None:
+        return None
+
+    with _MATERIALIZE_LOCK:
+        if _CLASS_CACHE is None:
+            content = _cache.read_json(CLASS_CACHE_FILE)
+            _CLASS_CACHE = dict((key, entry) for key, entry in
+                                (content or {}).items()
+                                if isinstance(entry, dict) and
+                                entry.get("version") == _CLASS_CACHE_VERSION)
+
+        entry = _CLASS_CACHE.get(name)
+        if entry is not None:
+            return entry.get(table)
+
+
+def _setCachedTable(name, table, value):
+    """
+    Stores a table computed for the given class, for the next runs
+    """
+    if _CLASS_CACHE_VERSION is None:
+        return
+
+    with _MATERIALIZE_LOCK:
+        # Load the cache, if needed
+        _getCachedTable(name, table)
+        entry = _CLASS_CACHE.setdefault(name,
+                                        {"version": _CLASS_CACHE_VERSION})
+        entry[table] = value
+        _CLASS_CACHE_DIRTY.add(name)
+
+
+def _saveClassCache():
+    """
+    Writes the class tables computed during this run in the cache file
+    """
+    with _MATERIALIZE_LOCK:
+        if not _CLASS_CACHE_DIRTY:
+            return
+
+        # Merge with the tables written by other processes
+        content = _cache.read_json(CLASS_CACHE_FILE) or {}
+        for name in _CLASS_CACHE_DIRTY:
+            content[name] = _CLASS_CACHE[name]
+        _cache.write_json(CLASS_CACHE_FILE, content)
+        _CLASS_CACHE_DIRTY.clear()
+
+
 def JClass(name):
+    if not _ATTACHED.__dict__:
+        _jthread.attach()
+
     jc = _jpype.findClass(name)
     if jc is None:
         raise _RUNTIMEEXCEPTION.PYEXC("Class %s not found" % name)
@@ -77,6 +181,8 @@ def _javaExceptionNew(self, *args):
 
 def _javaInit(self, *args):
     object.__init__(self)
+    if not _ATTACHED.__dict__:
+        _jthread.attach()
 
     if len(args) == 1 and isinstance(args[0], tuple) and args[0][0] is _SPECIAL_CONSTRUCTOR_KEY:
         self.__javaobject__ = args[0][1]
@@ -84,7 +190,123 @@ def _javaInit(self, *args):
         self.__javaobject__ = self.__class__.__javaclass__.newClassInstance(*args)
 
 
-def _javaGetAttr(self, name):
+def _isSpecial(name):
+    return name[:2] == "__" and name[-2:] == "__"
+
+
+def _getMembers(jc, members, static_fields):
+    """
+    Converts the fields and methods of a Java class into class members
+    """
+    # add the fields
+    fields = jc.getClassFields()
+    for i in fields:
+        fname = i.getName()
+        if fname in KEYWORDS:
+            fname = fname + "_"
+
+        if i.isStatic():
+            g = lambda self, fld = i: fld.getStaticAttribute()
+            s = None
+            if not i.isFinal():
+                s = lambda self, v, fld = i: fld.setStaticAttribute(v)
+            static_fields[fname] = property(g, s)
+        else:
+            g = lambda self, fld = i: fld.getInstanceAttribute(self.__javaobject__)
+            s = None
+            if not i.isFinal():
+                s = lambda self, v, fld = i: fld.setInstanceAttribute(self.__javaobject__, v)
+            members[fname] = property(g, s)
+
+    # methods
+    methods = jc.getClassMethods()  # Return tuple of tuple (name, method).
+    for jm in methods:
+        mname = jm.getName()
+        if mname in KEYWORDS:
+            mname = mname + "_"
+
+        members[mname] = jm
+
+
+def _materialize(cls, name=None):
+    """
+    Sets up the fields and methods of the given class and of its parents,
+    if it has not been done yet
+
+    :param cls: A Java class wrapper
+    :param name: Name of the attribute looked for
+    :return: True if members have been added
+    """
+    if name is not None and _isSpecial(name):
+        # Special members are defined with the class
+        return False
+
+    with _MATERIALIZE_LOCK:
+        pending = [c for c in reversed(cls.__mro__) if c in _PENDING]
+        if not pending:
+            return False
+
+        if name is not None:
+            tables = [_getCachedTable(c.__name__, "members") for c in pending]
+            if None not in tables \
+                    and not any(name in table for table in tables):
+                # Known to be missing: no need to load the members
+                return False
+
+        for c in pending:
+            jc = c.__dict__["__javaclass__"]
+            members = {}
+            static_fields = {}
+            _getMembers(jc, members, static_fields)
+            for i in _CUSTOMIZERS:
+                if getattr(i, "lazy", False) and i.canCustomize(c.__name__, jc):
+                    i.customize(c.__name__, jc, list(c.__bases__), members)
+
+            for key, value in static_fields.items():
+                type.__setattr__(type(c), key, value)
+            for key, value in members.items():
+                type.__setattr__(c, key, value)
+
+            _PENDING.discard(c)
+            _setCachedTable(c.__name__, "members",
+                            sorted(set(members).union(static_fields)))
+        return True
+
+
+def _dirOf(cls):
+    """
+    Lists the attributes of a class, as dir() does
+    """
+    _materialize(cls)
+    names = set()
+    for c in cls.__mro__:
+        names.update(c.__dict__)
+
+    # Static fields
+    for c in type(cls).__mro__:
+        if issubclass(c, _JavaClass) and c is not _JavaClass:
+            names.update(c.__dict__)
+    return sorted(names)
+
+
+def _javaDir(self):
+    return sorted(set(_dirOf(self.__class__)).union(self.__dict__))
+
+
+def _javaSetAttr(self, name, value):
+    # A Java field must not be hidden by an instance attribute
+    _materialize(self.__class__, name)
+    object.__setattr__(self, name, value)
+
+    if not _isSpecial(name) and name in object.__getattribute__(self, "__dict__"):
+        # Instance attribute: can't be resolved per class anymore
+        _RESOLVED.setdefault(type(self), {})[name] = (_GENERIC, None)
+
+
+def _getAttr(self, name):
+    """
+    Looks for an attribute: instance members, then static members
+    """
     try:
         r = object.__getattribute__(self, name)
     except AttributeError as ex:
@@ -98,6 +320,57 @@ def _javaGetAttr(self, name):
     return r
 
 
+def _resolve(self, name):
+    """
+    Looks for an attribute the first time it is accessed in a class, and
+    stores how it has been resolved
+    """
+    cls = type(self)
+    _materialize(cls, name)
+
+    # Raises an AttributeError if the attribute doesn't exist
+    r = _getAttr(self, name)
+
+    kind, value = _GENERIC, None
+    if name not in object.__getattribute__(self, "__dict__"):
+        for c in cls.__mro__:
+            if name in c.__dict__:
+                value = c.__dict__[name]
+                if isinstance(value, _jpype._JavaMethod):
+                    kind = _METHOD
+                elif isinstance(value, property):
+                    kind = _FIELD
+                break
+        else:
+            for c in type(cls).__mro__:
+                if name in c.__dict__:
+                    value = c.__dict__[name]
+                    if isinstance(value, property):
+                        kind = _STATIC
+                    break
+
+    _RESOLVED.setdefault(cls, {})[name] = (kind, value)
+    return r
+
+
+def _javaGetAttr(self, name):
+    if not _ATTACHED.__dict__:
+        _jthread.attach()
+
+    try:
+        kind, value = _RESOLVED[type(self)][name]
+    except KeyError:
+        return _resolve(self, name)
+
+    if kind is _METHOD:
+        return _jpype._JavaBoundMethod(value, self)
+    elif kind is _FIELD:
+        return value.__get__(self, type(self))
+    elif kind is _STATIC:
+        return value.__get__(type(self), type(type(self)))
+    return _getAttr(self, name)
+
+
 class _JavaClass(type):
     def __new__(cls, jc):
         bases = []
@@ -112,6 +385,8 @@ class _JavaClass(type):
                 "__eq__": lambda self, o: self.equals(o),
                 "__ne__": lambda self, o: not self.equals(o),
                 "__getattribute__": _javaGetAttr,
+                "__setattr__": _javaSetAttr,
+                "__dir__": _javaDir,
                 }
 
         if name == 'java.lang.Object' or jc.isPrimitive():
@@ -131,50 +406,29 @@ class _JavaClass(type):
         if len(bases) == 0:
             bases.append(_JAVAOBJECT)
 
-        # add the fields
-        fields = jc.getClassFields()
-        for i in fields:
-            fname = i.getName()
-            if fname in KEYWORDS:
-                fname = fname + "_"
-
-            if i.isStatic():
-                g = lambda self, fld = i: fld.getStaticAttribute()
-                s = None
-                if not i.isFinal():
-                    s = lambda self, v, fld = i: fld.setStaticAttribute(v)
-                static_fields[fname] = property(g, s)
-            else:
-                g = lambda self, fld = i: fld.getInstanceAttribute(self.__javaobject__)
-                s = None
-                if not i.isFinal():
-                    s = lambda self, v, fld = i: fld.setInstanceAttribute(self.__javaobject__, v)
-                members[fname] = property(g, s)
-
-        # methods
-        methods = jc.getClassMethods()  # Return tuple of tuple (name, method).
-        for jm in methods:
-            mname = jm.getName()
-            if mname in KEYWORDS:
-                mname = mname + "_"
-
-            members[mname] = jm
-
-        for i in _CUSTOMIZERS:
-            if i.canCustomize(name, jc):
-                i.customize(name, jc, bases, members)
-
-        # remove multiple bases that would cause a MRO problem
-        toRemove = set()
+        # Customizers working on the class definition need its members:
+        # others are called when the members are first accessed
+        customizers = [i for i in _CUSTOMIZERS if not getattr(i, "lazy", False)
+                       and i.canCustomize(name, jc)]
+        lazy = not customizers
+        if not lazy:
+            _getMembers(jc, members, static_fields)
+            for i in _CUSTOMIZERS:
+                if i in customizers or (getattr(i, "lazy", False)
+                                        and i.canCustomize(name, jc)):
+                    i.customize(name, jc, bases, members)
+
+        # remove multiple bases that would cause a MRO problem: the parents of
+        # the other bases, and duplicates
+        parents = set()
         for c in bases:
-            for d in bases:
-                if c == d:
-                    continue
-                if issubclass(c, d):
-                    toRemove.add(d)
+            parents.update(c.__mro__[1:])
 
-        for i in toRemove:
-            bases.remove(i)
+        unique = []
+        for c in bases:
+            if c not in parents and c not in unique:
+                unique.append(c)
+        bases = unique
 
         # Prepare the meta-metaclass
         meta_bases = []
@@ -189,4 +443,25 @@ class _JavaClass(type):
         members['__metaclass__'] = metaclass
         result = type.__new__(metaclass, name, tuple(bases), members)
 
+        if lazy:
+            with _MATERIALIZE_LOCK:
+                _PENDING.add(result)
+
         return result
+
+    def __getattribute__(cls, name):
+        if cls in _PENDING:
+            _materialize(cls, name)
+        return type.__getattribute__(cls, name)
+
+    def __setattr__(cls, name, value):
+        # A static field must not be hidden by a class attribute
+        _materialize(cls, name)
+        type.__setattr__(cls, name, value)
+
+        # Attributes of this class and of its children have to be resolved
+        # again
+        _RESOLVED.clear()
+
+    def __dir__(cls):
+        return _dirOf(cls)
@@ -15,7 +15,19 @@
 #
 #*****************************************************************************
 from . import _jclass
-import collections
+from . import _jarray
+try :
+    from collections.abc import Mapping, Sequence
+except ImportError :
+    # Python 2
+    from collections import Mapping, Sequence
+
+# Java classes used by the bulk conversions
+_CLASSES = {}
+
+# Map implementations whose keySet() and values() are in the same order
+_ORDERED_VIEWS = ('java.util.HashMap', 'java.util.LinkedHashMap',
+                  'java.util.TreeMap', 'java.util.Hashtable')
 
 class _WrappedIterator(object):
     """
@@ -42,7 +54,7 @@ def _initialize() :
     _jclass.registerClassCustomizer(EnumerationCustomizer())
 
 def isPythonSequence(v):
-    if isinstance(v, collections.Sequence):
+    if isinstance(v, Sequence):
         if not hasattr(v.__class__, '__metaclass__') or v.__class__.__metaclass__ is _jclass._JavaClass :
             return True
     return False
@@ -51,34 +63,44 @@ def _colLength(self) :
     return self.size()
 
 def _colIter(self) :
-    return _WrappedIterator(self.iterator())
+    # Iterate over a copy, read in one call
+    return iter(self.toArray()[:])
 
 def _colDelItem(self, i) :
     return self.remove(i)
 
+def _getClass(name) :
+    if name not in _CLASSES :
+        _CLASSES[name] = _jclass.JClass(name)
+    return _CLASSES[name]
+
+def _asJavaList(v, deep=False) :
+    """
+    Converts a Python sequence to a fixed-size Java List, with a single
+    conversion of all its items
+    """
+    if deep :
+        v = [toJava(i) for i in v]
+    elif not isinstance(v, (list, tuple)) :
+        v = list(v)
+    values = _jarray.JArray(_getClass("java.lang.Object"))(v)
+    return _getClass("java.util.Arrays").asList(values)
+
 def _colAddAll(self, v):
     if isPythonSequence(v) :
-        r = False
-        for i in v :
-            r = self.add(i) or r
-        return r
+        return self._addAll(_asJavaList(v))
     else:
         return self._addAll(v)
 
 def _colRemoveAll(self, v):
     if isPythonSequence(v) :
-        r = False
-        for i in v :
-            r = self.remove(i) or r
-        return r
+        return self._removeAll(_asJavaList(v))
     else:
         return self._removeAll(v)
 
 def _colRetainAll(self, v):
     if isPythonSequence(v) :
-        r = _jclass.JClass("java.util.ArrayList")(len(v))
-        for i in v :
-            r.add(i)
+        r = _asJavaList(v)
     else:
         r = v
 
@@ -135,7 +157,7 @@ def _listSetItem(self, ndx, v) :
             stop = self.size() + stop
         for i in range(start, stop) :
             self.remove(start)
-        if isinstance(v, collections.Sequence):
+        if isinstance(v, Sequence):
             ndx = start
             for i in v :
                 self.add(ndx, i)
@@ -146,15 +168,12 @@ def _listSetItem(self, ndx, v) :
         self.set(ndx, v)
 
 def _listAddAll(self, v, v2=None):
-    if isPythonSequence(v) :
-        r = False
-        if v2 is not None :  # assume form (int, values)
-            for i in range(len(v2)) :
-                r = r or self.add(v + i, v2[i])
-        else:
-            for i in v :
-                r = self.add(i) or r
-        return r
+    if v2 is not None :  # assume form (int, values)
+        if isPythonSequence(v2) :
+            v2 = _asJavaList(v2)
+        return self._addAll(v, v2)
+    elif isPythonSequence(v) :
+        return self._addAll(_asJavaList(v))
     else:
         return self._addAll(v)
 
@@ -178,7 +197,7 @@ class ListCustomizer(object) :
                 members['addAll'] = _listAddAll
 
 def isPythonMapping(v):
-    if isinstance(v, collections.Mapping):
+    if isinstance(v, Mapping):
         if not hasattr(v.__class__, '__metaclass__') or v.__class__.__metaclass__ is _jclass._JavaClass :
             return True
     return False
@@ -187,7 +206,8 @@ def _mapLength(self) :
     return self.size()
 
 def _mapIter(self) :
-    return _WrappedIterator(self.keySet().iterator())
+    # Iterate over a copy of the keys, read in one call
+    return iter(self.keySet().toArray()[:])
 
 def _mapDelItem(self, i) :
     return self.remove(i)
@@ -200,8 +220,10 @@ def _mapSetItem(self, ndx, v) :
 
 def _mapPutAll(self, v):
     if isPythonMapping(v) :
+        # The JDK has no bulk pairwise insertion: one put() per entry
+        put = self.put
         for i in v :
-            self.put(i, v[i])
+            put(i, v[i])
     else:
         # do the regular method ...
         self._putAll(v)
@@ -286,3 +308,98 @@ class EnumerationCustomizer(object) :
     def customize(self, name, jc, bases, members) :
         members.update(EnumerationCustomizer._METHODS)
 
+
+
+def toJava(v) :
+    """
+    Converts Python collections to Java ones: lists and tuples to
+    ArrayList, sets to HashSet, dictionaries to HashMap. Nested collections
+    are converted too; other values are returned as is.
+
+    The items of a sequence are converted in a single native call.
+    """
+    if isinstance(v, (list, tuple)) :
+        return _getClass("java.util.ArrayList")(_asJavaList(v, True))
+
+    elif isinstance(v, (set, frozenset)) :
+        return _getClass("java.util.HashSet")(_asJavaList(v, True))
+
+    elif isinstance(v, dict) :
+        r = _getClass("java.util.HashMap")(max(16, len(v) * 4 // 3 + 1))
+        put = r.put
+        for key, value in v.items() :
+            put(toJava(key), toJava(value))
+        return r
+
+    return v
+
+def _unbox(v) :
+    """
+    Converts a boxed Java primitive to a Python value
+    """
+    name = v.__class__.__name__
+    if name in ('java.lang.Integer', 'java.lang.Long', 'java.lang.Short',
+                'java.lang.Byte') :
+        return v.longValue()
+    elif name in ('java.lang.Double', 'java.lang.Float') :
+        return v.doubleValue()
+    elif name == 'java.lang.Boolean' :
+        return v.booleanValue()
+    elif name == 'java.lang.Character' :
+        return v.charValue()
+    elif name == 'java.lang.String' :
+        return v.toString()
+    return v
+
+def _hashable(v) :
+    """
+    Converts a value nested in a set to a hashable one
+    """
+    if isinstance(v, list) :
+        return tuple(v)
+    elif isinstance(v, set) :
+        return frozenset(v)
+    return v
+
+def toPython(v, deep=True) :
+    """
+    Converts Java collections to Python ones: Map to dict, Set to set, other
+    Collections and arrays to list. The content of a collection is read in
+    one call.
+
+    :param v: A Java object
+    :param deep: If True, nested collections, boxed primitives and strings
+                 are converted too
+    :return: The Python value, or v if it is not a collection
+    """
+    if isinstance(v, _jarray._JavaArrayClass) :
+        r = v.tolist()
+
+    elif isinstance(v, _getClass("java.util.Map")) :
+        if v.__class__.__name__ in _ORDERED_VIEWS :
+            keys = v.keySet().toArray()[:]
+            values = v.values().toArray()[:]
+        else :
+            entries = v.entrySet().toArray()[:]
+            keys = [i.getKey() for i in entries]
+            values = [i.getValue() for i in entries]
+
+        if deep :
+            keys = [toPython(i) for i in keys]
+            values = [toPython(i) for i in values]
+        return dict(zip(keys, values))
+
+    elif isinstance(v, _getClass("java.util.Collection")) :
+        r = v.toArray()[:]
+        if isinstance(v, _getClass("java.util.Set")) :
+            return set(_hashable(toPython(i)) for i in r) if deep else set(r)
+
+    elif deep and isinstance(v, _getClass("java.lang.Object")) :
+        return _unbox(v)
+
+    else :
+        return v
+
+    if deep :
+        return [toPython(i) for i in r]
+    return list(r)
@@ -15,9 +15,304 @@
 #
 #*****************************************************************************
 
+import os
+import threading
+import zipfile
+
 import _jpype
 from . import _jclass
 
+# ------------------------------------------------------------------------------
+
+INDEX_ENV = "JPYPE_PACKAGE_INDEX"
+""" Environment variable disabling the packages index when set to 0 """
+
+BUNDLES_FOLDER = os.path.join("repo", "felix")
+""" Folder of the Felix bundles, in COHORTE_HOME and COHORTE_BASE """
+
+# Full names of the classes which haven't been found, when the index is used
+_NOT_FOUND = set()
+_NOT_FOUND_MAX = 4096
+
+_INDEX = None
+_INDEX_LOCK = threading.Lock()
+
+# ------------------------------------------------------------------------------
+
+class _PackageIndex(object):
+    """
+    Packages and classes of the class path and of the Felix bundles
+    """
+    def __init__(self):
+        # Package -> names of its classes
+        self.classes = {}
+        # Package -> names of its sub-packages
+        self.children = {}
+        # Packages which can contain classes that are not listed
+        self.partial = set()
+        # All the packages of the JVM runtime are known
+        self.complete = False
+
+    def addPackage(self, name, partial=False):
+        if partial:
+            self.partial.add(name)
+
+        child = None
+        while name:
+            known = name in self.children
+            content = self.children.setdefault(name, set())
+            if child:
+                content.add(child)
+            if known:
+                break
+            name, _, child = name.rpartition(".")
+
+    def addClass(self, path, partial=False):
+        """
+        Adds a class given by the path of its file ('/' separated)
+        """
+        package, _, name = path[:-len(".class")].replace("/", ".") \
+            .rpartition(".")
+        if "$" in name or not package:
+            # Inner or anonymous class, or default package
+            return
+
+        self.addPackage(package, partial)
+        self.classes.setdefault(package, set()).add(name)
+
+    def isPackage(self, name):
+        return name in self.children
+
+    def isClass(self, package, name):
+        return name in self.classes.get(package, ())
+
+    def isComplete(self, package):
+        """
+        Checks if all the classes of the given package are listed
+        """
+        return self.complete and package in self.classes \
+            and package not in self.partial
+
+    def getContent(self, package):
+        return self.classes.get(package, set()) \
+            | self.children.get(package, set())
+
+
+def _listEntry(entry):
+    """
+    Lists the class files of a class path entry (JAR file or folder)
+    """
+    if os.path.isdir(entry):
+        for root, _, files in os.walk(entry):
+            relative = os.path.relpath(root, entry).replace(os.sep, "/")
+            for name in files:
+                if name.endswith(".class"):
+                    if relative == ".":
+                        yield name
+                    else:
+                        yield "{0}/{1}".format(relative, name)
+
+    elif os.path.isfile(entry):
+        try:
+            with zipfile.ZipFile(entry) as jar:
+                names = jar.namelist()
+        except (IOError, OSError, zipfile.BadZipfile):
+            # Not a valid JAR file: ignore it
+            return
+
+        for name in names:
+            if name.endswith(".class") and not name.startswith("META-INF/"):
+                yield name
+
+
+def _parseExportPackage(header):
+    """
+    Returns the names of the packages of an Export-Package manifest header
+    """
+    packages = []
+    clause = []
+    quoted = False
+    for char in header + ",":
+        if char == '"':
+            quoted = not quoted
+        elif char == "," and not quoted:
+            # package1;package2;version="[1,2)"
+            packages.extend(part.strip()
+                            for part in "".join(clause).split(";")
+                            if part.strip() and "=" not in part)
+            clause = []
+            continue
+        clause.append(char)
+    return packages
+
+
+def _readManifest(jar):
+    """
+    Reads the main attributes of the manifest of a JAR file
+    """
+    try:
+        content = jar.read("META-INF/MANIFEST.MF").decode("utf-8", "replace")
+    except KeyError:
+        return {}
+
+    attributes = {}
+    name = None
+    for line in content.splitlines():
+        if line.startswith(" ") and name is not None:
+            # Continuation line
+            attributes[name] += line[1:]
+        elif ":" in line:
+            name, value = line.split(":", 1)
+            attributes[name] = value.strip()
+        elif not line:
+            # End of the main section
+            break
+    return attributes
+
+
+def _indexBundle(index, path):
+    """
+    Adds the exported packages of a Felix bundle. They are loaded by the
+    bundles class loaders: their classes may not be visible to findClass.
+    """
+    try:
+        with zipfile.ZipFile(path) as jar:
+            exported = set(_parseExportPackage(
+                _readManifest(jar).get("Export-Package", "")))
+            names = jar.namelist()
+    except (IOError, OSError, zipfile.BadZipfile):
+        return
+
+    for package in exported:
+        index.addPackage(package, True)
+
+    for name in names:
+        if name.endswith(".class") and name[:name.rfind("/")] \
+                .replace("/", ".") in exported:
+            index.addClass(name, True)
+
+
+def _getClassPath(System):
+    """
+    Lists the class path entries of the JVM. On Java 8, the boot class path
+    and the extension folders are included: they contain the runtime.
+    """
+    entries = []
+    for key in ("sun.boot.class.path", "java.ext.dirs", "java.class.path"):
+        value = System.getProperty(key)
+        for entry in (value or "").split(os.pathsep):
+            folder = None
+            if key == "java.ext.dirs":
+                folder = entry
+            elif entry.endswith("*"):
+                # Wildcard: all the JAR files of a folder
+                folder = entry[:-1] or "."
+
+            if folder is None:
+                if entry:
+                    entries.append(entry)
+            elif os.path.isdir(folder):
+                entries.extend(os.path.join(folder, name)
+                               for name in sorted(os.listdir(folder))
+                               if name.lower().endswith(".jar"))
+    return entries
+
+
+def _getModulesPackages():
+    """
+    Lists the packages of the modules of the JVM (Java 9+), or returns None
+    """
+    try:
+        ModuleLayer = _jclass.JClass("java.lang.ModuleLayer")
+    except Exception:
+        # Java 8
+        return None
+
+    packages = set()
+    for module in ModuleLayer.boot().modules():
+        packages.update(str(package) for package in module.getPackages())
+    return packages
+
+
+def _buildIndex():
+    """
+    Indexes the packages and classes of the class path, of the modules of
+    the JVM and of the Felix bundles
+    """
+    index = _PackageIndex()
+    System = _jclass.JClass("java.lang.System")
+    boot_path = System.getProperty("sun.boot.class.path")
+    for entry in _getClassPath(System):
+        for name in _listEntry(entry):
+            index.addClass(name)
+
+    # Classes of the modules are not listed
+    packages = _getModulesPackages()
+    for package in packages or ():
+        index.addPackage(package, True)
+    index.complete = packages is not None or bool(boot_path)
+
+    for env in ("COHORTE_HOME", "COHORTE_BASE"):
+        folder = os.path.join(os.getenv(env) or "", BUNDLES_FOLDER)
+        if os.getenv(env) and os.path.isdir(folder):
+            for name in sorted(os.listdir(folder)):
+                if name.endswith(".jar"):
+                    _indexBundle(index, os.path.join(folder, name))
+    return index
+
+
+def _getIndex():
+    """
+    Returns the packages index, built on first call, or None if disabled
+    """
+    global _INDEX
+    if os.getenv(INDEX_ENV, "1") == "0":
+        return None
+
+    if _INDEX is None and _jpype.isStarted():
+        with _INDEX_LOCK:
+            if _INDEX is None:
+                _INDEX = _buildIndex()
+    return _INDEX
+
+
+def _findClass(name):
+    """
+    Looks for a class, remembering those which don't exist. The names are
+    forgotten when there are too many of them: a class can be added later.
+    """
+    if name in _NOT_FOUND:
+        return None
+
+    cc = _jpype.findClass(name)
+    if cc is None:
+        if len(_NOT_FOUND) >= _NOT_FOUND_MAX:
+            _NOT_FOUND.clear()
+        _NOT_FOUND.add(name)
+    return cc
+
+
+def _resolve(package, n):
+    """
+    Resolves a member of a package: a class or a sub-package
+    """
+    subname = "{0}.{1}".format(package, n)
+    index = _getIndex()
+    if index is None:
+        cc = _jpype.findClass(subname)
+    elif index.isClass(package, n) or not (index.isPackage(subname)
+                                           or index.isComplete(package)):
+        cc = _findClass(subname)
+    else:
+        # A known package, or a class that can't exist
+        cc = None
+
+    if cc is None:
+        # can only assume it is a sub-package then ...
+        return JPackage(subname)
+    return _jclass._getClassFor(cc)
+
+
 class JPackage(object) :
     def __init__(self, name) :
         self.__name = name
@@ -27,16 +322,7 @@ class JPackage(object) :
             return object.__getattribute__(self, n)
         except :
             # not found ...
-
-            # perhaps it is a class?
-            subname = "{0}.{1}".format(self.__name, n)
-            cc = _jpype.findClass(subname)
-            if cc is None :
-                # can only assume it is a sub-package then ...
-                cc = JPackage(subname)
-            else:
-                cc = _jclass._getClassFor(cc)
-
+            cc = _resolve(self.__name, n)
             self.__setattr__(n, cc, True)
 
             return cc
@@ -46,6 +332,13 @@ class JPackage(object) :
             raise RuntimeError("Cannot set attributes in a package {0}".format(n))
         object.__setattr__(self, n, v)
 
+    def __dir__(self) :
+        # Classes and sub-packages known by the index
+        index = _getIndex()
+        if index is None :
+            return []
+        return sorted(index.getContent(self.__name))
+
     def __str__(self) :
         return "<Java package {0}>".format(self.__name)
 
@@ -18,11 +18,86 @@
 import _jpype
 from . import _jclass
 from . import JClassUtil
-import collections
+import os
+import threading
+import time
+try :
+    from collections.abc import Sequence
+except ImportError :
+    # Python 2
+    from collections import Sequence
+
+# ------------------------------------------------------------------------------
+
+STATS_ENV = "JPYPE_PROXY_STATS"
+""" Environment variable disabling the callbacks statistics when set to 0 """
+
+_STATS_LOCK = threading.Lock()
+
+_STATISTICS = {}
+""" Callback name -> [calls, errors, total time, max time] (seconds) """
+
+if hasattr(time, "perf_counter"):
+    _clock = time.perf_counter
+else:
+    # Python 2
+    _clock = time.time
+
+# ------------------------------------------------------------------------------
 
 def _initialize() :
     _jpype.setProxyClass(JProxy)
 
+
+def _getMethodNames(intf) :
+    """
+    Returns the names of the methods of a Java interface and of its parents
+    """
+    names = set()
+    for c in intf.__mro__ :
+        jc = c.__dict__.get("__javaclass__")
+        if jc is not None :
+            names.update(jm.getName() for jm in jc.getClassMethods())
+    return names
+
+
+def _timed(key, method) :
+    """
+    Wraps a callback to measure its calls
+    """
+    with _STATS_LOCK :
+        stats = _STATISTICS.setdefault(key, [0, 0, 0.0, 0.0])
+
+    def callback(*args) :
+        start = _clock()
+        try :
+            return method(*args)
+        except :
+            stats[1] += 1
+            raise
+        finally :
+            elapsed = _clock() - start
+            with _STATS_LOCK :
+                stats[0] += 1
+                stats[2] += elapsed
+                if elapsed > stats[3] :
+                    stats[3] = elapsed
+
+    return callback
+
+
+def getStatistics() :
+    """
+    Returns the statistics of the callbacks of the proxies, by
+    "interface.method": calls, errors, total and maximum time (milliseconds)
+    """
+    with _STATS_LOCK :
+        return dict((key, {"calls": calls, "errors": errors,
+                           "total_ms": total * 1000., "max_ms": peak * 1000.})
+                    for key, (calls, errors, total, peak)
+                    in _STATISTICS.items())
+
+
 class JProxy(object) :
     def __init__(self, intf, dictionary=None, inst=None) :
         actualIntf = None
@@ -31,7 +106,7 @@ class JProxy(object) :
             actualIntf = [ _jclass.JClass(intf) ]
         elif isinstance(intf, _jclass._JavaClass) :
             actualIntf = [ intf ]
-        elif isinstance(intf, collections.Sequence):
+        elif isinstance(intf, Sequence):
             actualIntf = []
             for i in intf :
                 if isinstance(i, str):
@@ -52,11 +127,44 @@ class JProxy(object) :
 
         self._dict = dictionary
         self._inst = inst
+        self._intf = actualIntf
+        self._dispatch = {}
+        self.refresh()
 
         self._proxy = _jpype.createProxy(self, actualIntf)
 
-    def getCallable(self, name) :
+    def refresh(self) :
+        """
+        Resolves again the callables of the interfaces methods, e.g. after a
+        change of the dictionary
+        """
+        timed = os.getenv(STATS_ENV, "1") != "0"
+        dispatch = {}
+        for i in self._intf :
+            for name in _getMethodNames(i) :
+                if name in dispatch :
+                    continue
+
+                try :
+                    method = self._lookup(name)
+                except (KeyError, AttributeError) :
+                    # The error will be raised on call
+                    continue
+
+                if timed :
+                    method = _timed("{0}.{1}".format(i.__name__, name), method)
+                dispatch[name] = method
+        self._dispatch = dispatch
+
+    def _lookup(self, name) :
         if self._dict is not None :
             return self._dict[name]
         else :
             return getattr(self._inst, name)
+
+    def getCallable(self, name) :
+        # Called by the JVM on each call of a proxy method
+        try :
+            return self._dispatch[name]
+        except KeyError :
+            return self._lookup(name)
@@ -0,0 +1,131 @@
+#*****************************************************************************
+#   Copyright 2015 isandlaTech
+#
+#   Licensed under the Apache License, Version 2.0 (the "License");
+#   you may not use this file except in compliance with the License.
+#   You may obtain a copy of the License at
+#
+#       http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS,
+#   WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#   See the License for the specific language governing permissions and
+#   limitations under the License.
+#
+#*****************************************************************************
+"""
+Attachment of the Python threads to the JVM
+
+A Python thread is attached to the JVM the first time it uses a Java class
+or object, and detached when it ends: the attachment is kept in a thread
+local object, released by the exiting thread itself.
+
+The main thread and the threads which haven't been started by the Python
+threading module (e.g. Java threads calling a proxy) are never detached.
+"""
+
+import threading
+
+try:
+    from _thread import get_ident
+except ImportError:
+    # Python 2
+    from thread import get_ident
+
+import _jpype
+
+# ------------------------------------------------------------------------------
+
+attached = threading.local()
+""" Thread-local marker: its dictionary is empty until the thread is attached """
+
+_LOCK = threading.Lock()
+
+_STATISTICS = {"attached": 0, "detached": 0, "failed": 0}
+""" Counters of attachments and detachments """
+
+# ------------------------------------------------------------------------------
+
+class _Attachment(object):
+    """
+    Detaches its thread from the JVM when released
+    """
+    __slots__ = ("ident",)
+
+    def __init__(self):
+        self.ident = get_ident()
+
+    def __del__(self):
+        if self.ident is None:
+            # Explicitly detached
+            return
+        elif get_ident() != self.ident:
+            # JNI only allows a thread to detach itself
+            _count("failed")
+            return
+
+        try:
+            if _jpype.isStarted() and _jpype.isThreadAttachedToJVM():
+                _jpype.detachThreadFromJVM()
+                _count("detached")
+        except Exception:
+            # Interpreter or JVM shutting down
+            pass
+
+
+def _count(name):
+    with _LOCK:
+        _STATISTICS[name] += 1
+
+
+def _isPythonThread(thread):
+    """
+    Checks if the given thread has been started by the threading module
+    """
+    return not isinstance(thread, (threading._MainThread,
+                                   threading._DummyThread))
+
+
+def attach():
+    """
+    Attaches the current thread to the JVM, if it's not already done. Threads
+    started by the threading module will be detached when they end.
+    """
+    if attached.__dict__ or not _jpype.isStarted():
+        return
+
+    if not _jpype.isThreadAttachedToJVM():
+        _jpype.attachThreadToJVM()
+        _count("attached")
+
+    if _isPythonThread(threading.current_thread()):
+        attached.attachment = _Attachment()
+    else:
+        attached.attachment = None
+
+
+def detach():
+    """
+    Detaches the current thread from the JVM
+    """
+    attachment = attached.__dict__.pop("attachment", None)
+    if attachment is not None:
+        # Detached here, not when released
+        attachment.ident = None
+
+    if _jpype.isThreadAttachedToJVM():
+        _jpype.detachThreadFromJVM()
+        _count("detached")
+
+
+def getStatistics():
+    """
+    Returns the counters of thread attachments: attached, detached, failed
+    (released by another thread, not detached) and active (attachments
+    made by this module and not released yet)
+    """
+    with _LOCK:
+        statistics = dict(_STATISTICS)
+    statistics["active"] = statistics["attached"] - statistics["detached"]
+    return statistics
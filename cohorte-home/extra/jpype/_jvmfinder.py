@@ -15,10 +15,16 @@
 #
 #*****************************************************************************
 
+from . import _cache
 import os
 
 # ------------------------------------------------------------------------------
 
+CACHE_FILE = "jvm-path.json"
+""" Name of the cache file of the found JVM libraries, per JAVA_HOME """
+
+# ------------------------------------------------------------------------------
+
 class JVMFinder(object):
     """
     JVM library finder base class
@@ -97,6 +103,10 @@ class JVMFinder(object):
         :return: The path to the JVM shared library file
         :raise ValueError: No JVM library found
         """
+        jvm = self._get_from_cache()
+        if jvm is not None:
+            return jvm
+
         for method in self._methods:
             try:
                 jvm = method()
@@ -107,6 +117,7 @@ class JVMFinder(object):
 
             else:
                 if jvm is not None:
+                    self._store_in_cache(jvm)
                     return jvm
 
         else:
@@ -115,6 +126,59 @@ class JVMFinder(object):
                              "variable properly.".format(self._libfile))
 
 
+    @staticmethod
+    def _get_cache_key():
+        """
+        Computes the cache key of the current environment: the JAVA_HOME
+        installation path and its modification time, which changes when the
+        installation is updated in place
+
+        :return: A (key, modification time) tuple
+        """
+        java_home = os.getenv("JAVA_HOME")
+        if java_home and os.path.exists(java_home):
+            java_home = os.path.realpath(java_home)
+            return java_home, os.path.getmtime(java_home)
+
+        # No JAVA_HOME: the library depends on the installed JVMs only
+        return "", None
+
+
+    def _get_from_cache(self):
+        """
+        Retrieves the JVM library path found by a previous call, if it is
+        still valid
+
+        :return: The path to the JVM library, or None
+        """
+        cache = _cache.read_json(CACHE_FILE)
+        if not isinstance(cache, dict):
+            return None
+
+        key, mtime = self._get_cache_key()
+        entry = cache.get(key)
+        if isinstance(entry, dict) and entry.get("mtime") == mtime \
+                and entry.get("libfile") == self._libfile:
+            jvm = entry.get("jvm")
+            if jvm and os.path.exists(jvm):
+                return jvm
+
+
+    def _store_in_cache(self, jvm):
+        """
+        Stores the found JVM library path in the cache
+
+        :param jvm: The path to the JVM library
+        """
+        cache = _cache.read_json(CACHE_FILE)
+        if not isinstance(cache, dict):
+            cache = {}
+
+        key, mtime = self._get_cache_key()
+        cache[key] = {"jvm": jvm, "mtime": mtime, "libfile": self._libfile}
+        _cache.write_json(CACHE_FILE, cache)
+
+
     def _get_from_java_home(self):
         """
         Retrieves the Java library path according to the JAVA_HOME environment
@@ -21,25 +21,41 @@ def _initialize() :
 	_jclass.registerClassCustomizer(PropertiesCustomizer())
 
 class PropertiesCustomizer(object) :
+	# Bean properties are only needed once the members are accessed
+	lazy = True
+
 	def canCustomize(self, name, jc) :
 		return True
 
 	def customize(self, name, jc, bases, members) :
+		table = _jclass._getCachedTable(name, "properties")
+		if table is None :
+			table = self._findProperties(members)
+			_jclass._setCachedTable(name, "properties", table)
+
+		for i in table :
+			getter, setter = table[i]
+			if getter in members :
+				members[i] = property(members[getter], members.get(setter, None))
+
+	def _findProperties(self, members) :
 		gets = {}
 		sets = {}
 
 		for i in members :
-			if not isinstance(members[i], _jpype._JavaMethod) :
+			prefix = i[:3]
+			if (prefix != 'get' and prefix != 'set') or len(i) == 3 :
 				continue
 
-			if i[:3] == 'get' :
-				if len(i) > 3 and members[i].isBeanAccessor() :
-					gets[i[3:]] = members[i]
-			elif i[:3] == 'set' :
-				if len(i) > 3 and members[i].isBeanMutator() :
-					sets[i[3:]] = members[i]
-
-		for i in gets :
-			members[i[0].lower() + i[1:]] = property(gets[i], sets.get(i, None))
+			if not isinstance(members[i], _jpype._JavaMethod) :
+				continue
 
+			if prefix == 'get' :
+				if members[i].isBeanAccessor() :
+					gets[i[3:]] = i
+			elif members[i].isBeanMutator() :
+				sets[i[3:]] = i
 
+		# Property name -> (getter name, setter name)
+		return dict((i[0].lower() + i[1:], (gets[i], sets.get(i, None)))
+					for i in gets)
@@ -15,6 +15,13 @@
 #
 #*****************************************************************************
 import _jpype
+from . import _jclass
+import ctypes
+import mmap
+import struct
+import threading
+
+_NATIVE_ORDER = None
 
 def _initialize() :
     pass
@@ -22,3 +29,269 @@ def _initialize() :
 def convertToDirectBuffer(obj):
     '''Efficiently convert all array.array types, string and unicode to java.nio.Buffer objects.'''
     return _jpype.convertToDirectBuffer(obj)
+
+def convertToNativeDirectBuffer(obj):
+    '''Same as convertToDirectBuffer(), with the native byte order, as seen from Python.'''
+    global _NATIVE_ORDER
+    if _NATIVE_ORDER is None :
+        _NATIVE_ORDER = _jclass.JClass('java.nio.ByteOrder').nativeOrder()
+    return _jpype.convertToDirectBuffer(obj).order(_NATIVE_ORDER)
+
+def asMemoryView(buffer):
+    '''
+    Returns a writable memoryview on the memory of a Java direct ByteBuffer
+    (no copy). The Java buffer must be kept referenced while the view is used.
+    '''
+    if not buffer.isDirect() :
+        raise TypeError("Only direct buffers can be shared")
+
+    # sun.nio.ch.DirectBuffer.address(): JNI ignores the module restrictions
+    address = buffer.address()
+    capacity = buffer.capacity()
+    if not address or not capacity :
+        raise ValueError("Empty or unmapped direct buffer")
+    return memoryview((ctypes.c_char * capacity).from_address(address)).cast('B')
+
+
+class SharedBuffer(object) :
+    '''
+    A memory region seen from Python as a writable memoryview, and from Java
+    as a direct ByteBuffer in native byte order
+    '''
+    def __init__(self, memory, buffer, owner=None) :
+        self.memory = memory
+        self.buffer = buffer
+        self._owner = owner
+
+    @staticmethod
+    def allocate(size, path=None) :
+        '''
+        Allocates a region in Python: an anonymous memory map, or a map of the
+        given file (created or resized)
+        '''
+        if path is None :
+            region = mmap.mmap(-1, size)
+        else :
+            with open(path, "a+b") as mapped :
+                mapped.truncate(size)
+                region = mmap.mmap(mapped.fileno(), size)
+        return SharedBuffer(memoryview(region), convertToNativeDirectBuffer(region), region)
+
+    @staticmethod
+    def wrap(buffer) :
+        '''
+        Shares a direct ByteBuffer allocated in Java
+        '''
+        buffer = buffer.order(_jclass.JClass('java.nio.ByteOrder').nativeOrder())
+        return SharedBuffer(asMemoryView(buffer), buffer)
+
+    def close(self) :
+        '''
+        Releases the region. Java must not use the buffer anymore.
+        '''
+        self.memory.release()
+        if isinstance(self._owner, mmap.mmap) :
+            self._owner.close()
+        self._owner = None
+        self.buffer = None
+
+
+class RingBuffer(object) :
+    '''
+    Single producer, single consumer queue of records in a shared buffer.
+
+    Both ends can be in Python or in Java, in the same process. The layout,
+    in native byte order, is:
+
+    * header (64 bytes): magic 'JPRB' (uint32), version (uint32), capacity of
+      the data area (uint64), head: bytes written (uint64, updated by the
+      producer only), tail: bytes read (uint64, updated by the consumer only)
+    * data area: records made of their payload size (uint32) followed by the
+      payload, padded to 8 bytes. A record never wraps: a size of 0xFFFFFFFF
+      tells to skip to the beginning of the area. A record takes at most
+      half of the data area, so that it fits wherever the head is once the
+      ring is empty.
+
+    The producer publishes a record by storing the new head after writing it,
+    the consumer frees it by storing the new tail after reading it.
+
+    Requires Python 3 (memoryview.cast()).
+    '''
+    MAGIC = 0x4250524A
+    VERSION = 1
+    HEADER_SIZE = 64
+    WRAP = 0xFFFFFFFF
+
+    _HEADER = struct.Struct("=IIQ")
+    _SIZE = struct.Struct("=I")
+
+    def __init__(self, shared, initialize=False) :
+        '''
+        :param shared: A SharedBuffer
+        :param initialize: If True, the ring is (re)initialized, else its
+                           header must be valid
+        '''
+        self.shared = shared
+        memory = shared.memory
+        if initialize :
+            capacity = (len(memory) - RingBuffer.HEADER_SIZE) // 8 * 8
+            if capacity < 16 :
+                raise ValueError("Buffer too small for a ring buffer")
+            memory[:RingBuffer.HEADER_SIZE] = b"\0" * RingBuffer.HEADER_SIZE
+            RingBuffer._HEADER.pack_into(memory, 0, RingBuffer.MAGIC, RingBuffer.VERSION, capacity)
+        else :
+            magic, version, capacity = RingBuffer._HEADER.unpack_from(memory, 0)
+            if magic != RingBuffer.MAGIC or version != RingBuffer.VERSION :
+                raise ValueError("Not a ring buffer")
+
+        self.capacity = capacity
+        # Largest payload of a record (see reserve())
+        self.maxSize = capacity // 2 // 8 * 8 - 4
+        self._data = memory[RingBuffer.HEADER_SIZE:RingBuffer.HEADER_SIZE + capacity]
+
+        # Aligned 8 bytes stores: head and tail are never seen half-written
+        self._counters = memory[:RingBuffer.HEADER_SIZE].cast('Q')
+
+        # Record reserved by the producer, read by the consumer
+        self._reserved = None
+        self._peeked = None
+        self._lock = threading.Lock()
+
+    def _getHead(self) :
+        return self._counters[2]
+
+    def _getTail(self) :
+        return self._counters[3]
+
+    def __len__(self) :
+        '''
+        Returns the number of bytes used by the pending records
+        '''
+        return self._getHead() - self._getTail()
+
+    def free(self) :
+        '''
+        Returns the number of free bytes
+        '''
+        return self.capacity - len(self)
+
+    def reserve(self, size) :
+        '''
+        Reserves a record to be written in place, and published by commit()
+
+        :param size: Size of the record payload, at most maxSize
+        :return: A writable memoryview of the payload, or None if the ring
+                 is full
+        :raise ValueError: Record too large for the ring buffer
+        '''
+        if size > self.maxSize :
+            # Once the head isn't aligned on the beginning of the area, a
+            # larger record would never fit, even in an empty ring: it can't
+            # be stored before the end of the area nor before the head
+            raise ValueError("Record larger than half the ring buffer")
+        record = (4 + size + 7) // 8 * 8
+
+        with self._lock :
+            if self._reserved is not None :
+                raise ValueError("A record is already reserved")
+
+            head = self._getHead()
+            position = head % self.capacity
+            skipped = 0
+            if position + record > self.capacity :
+                # Doesn't fit before the end: start from the beginning
+                skipped = self.capacity - position
+            if self.capacity - (head - self._getTail()) < skipped + record :
+                return None
+
+            if skipped :
+                RingBuffer._SIZE.pack_into(self._data, position, RingBuffer.WRAP)
+                position = 0
+
+            RingBuffer._SIZE.pack_into(self._data, position, size)
+            self._reserved = head + skipped + record
+            return self._data[position + 4:position + 4 + size]
+
+    def commit(self) :
+        '''
+        Publishes the reserved record
+        '''
+        with self._lock :
+            if self._reserved is None :
+                raise ValueError("No reserved record")
+            self._counters[2] = self._reserved
+            self._reserved = None
+
+    def write(self, data) :
+        '''
+        Writes a record
+
+        :param data: Record payload (bytes or any buffer)
+        :return: True if the record has been written, False if the ring is
+                 full
+        :raise ValueError: Record larger than maxSize
+        '''
+        data = memoryview(data).cast('B')
+        payload = self.reserve(len(data))
+        if payload is None :
+            return False
+        payload[:] = data
+        self.commit()
+        return True
+
+    def peek(self) :
+        '''
+        Returns a view on the payload of the next record, valid until
+        release() is called
+
+        :return: A memoryview of the payload, or None if the ring is empty
+        '''
+        with self._lock :
+            if self._peeked is not None :
+                raise ValueError("A record is already being read")
+
+            tail = self._getTail()
+            if tail == self._getHead() :
+                return None
+
+            position = tail % self.capacity
+            size = RingBuffer._SIZE.unpack_from(self._data, position)[0]
+            if size == RingBuffer.WRAP :
+                # Next record is at the beginning
+                tail += self.capacity - position
+                position = 0
+                size = RingBuffer._SIZE.unpack_from(self._data, 0)[0]
+
+            self._peeked = tail + (4 + size + 7) // 8 * 8
+            return self._data[position + 4:position + 4 + size]
+
+    def release(self) :
+        '''
+        Frees the record returned by peek()
+        '''
+        with self._lock :
+            if self._peeked is None :
+                raise ValueError("No record being read")
+            self._counters[3] = self._peeked
+            self._peeked = None
+
+    def read(self) :
+        '''
+        Reads and frees the next record
+
+        :return: The record payload (bytes), or None if the ring is empty
+        '''
+        payload = self.peek()
+        if payload is None :
+            return None
+        try :
+            return payload.tobytes()
+        finally :
+            self.release()
+
+    def close(self) :
+        '''
+        Releases the views of the ring on the shared buffer
+        '''
+        self._data.release()
+        self._counters.release()
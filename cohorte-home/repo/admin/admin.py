@@ -21,6 +21,13 @@ import herald.beans as beans
 import cohorte.composer
 import cohorte.monitor
 
+# Activity journal
+from restapi.journal import ActivityJournal, DEFAULT_MAX_ACTIVITIES
+
+# REST API responses encoder and routes
+import restapi.encoder
+import restapi.routes
+
 # Standard library
 import logging
 import threading
@@ -52,7 +59,9 @@ COHORTE_VERSION = "1.0.1"
 
 @ComponentFactory("cohorte-admin-factory")
 @Provides(['pelix.http.servlet', herald.SERVICE_DIRECTORY_LISTENER])
-@Property('_path', 'pelix.http.path', "/admin")\
+@Property('_path', 'pelix.http.path', "/admin")
+@Property('_max_activities', 'activities.max', DEFAULT_MAX_ACTIVITIES)
+@Property('_spill_activities', 'activities.spill', False)
 # Consume a single Herald Directory service
 @Requires("_directory", herald.SERVICE_DIRECTORY)
 @Requires('_herald', herald.SERVICE_HERALD)
@@ -85,9 +94,10 @@ class Admin(object):
         self._icomposerlocal = None
         self._isolates = []
 
-        # List of platform activities
-        self._platform_activities = []
-        self._platform_activities_index = 0
+        # Journal of platform activities
+        self._max_activities = DEFAULT_MAX_ACTIVITIES
+        self._spill_activities = False
+        self._platform_activities = ActivityJournal()
 
         # a Map of last updated lists
         self._last_updates = {}
@@ -95,6 +105,9 @@ class Admin(object):
         self._last_updates["nodes"] = time_now
         self._last_updates["platform_activities"] = time_now
 
+        # method + path -> API method
+        self._routes = self._setup_routes()
+
     def decrypt_request(self, request, action="GET"):
         """
         Decrypts the request and extracts these information:
@@ -138,10 +151,8 @@ class Admin(object):
         data["meta"]["duration"] = 0.0
         return data
 
-    def send_json(self, data, response):
-        result = json.dumps(data, sort_keys=False,
-                            indent=4, separators=(',', ': '))
-        response.send_content(data["meta"]["status"], result, "application/json")
+    def send_json(self, data, request, response):
+        restapi.encoder.send_json(request, response, data, data["meta"]["status"])
 
     def bad_request(self, request, response, in_data, out_data):
         out_data["meta"]["status"] = 400
@@ -157,13 +168,20 @@ class Admin(object):
     def get_platform_activities(self, request, response, in_data, out_data):
         out_data["platform"] = {}
         out_data["activities"] = []
-        count = 0
-
-        for activity in self._platform_activities:
-            out_data["activities"].append(activity)
-            count = count + 1
+        criteria = dict((key, in_data[key][0]) for key in ("node", "uuid", "event")
+                        if key in in_data)
+        try:
+            out_data["activities"] = self._platform_activities.query(
+                since=in_data.get("since", [None])[0],
+                rang=in_data.get("rang", [None])[0],
+                ldap_filter=in_data.get("filter", [None])[0],
+                limit=in_data.get("limit", [None])[0],
+                **criteria)
+        except ValueError:
+            self.bad_request(request, response, in_data, out_data)
 
-        out_data["meta"]["count"] = count
+        out_data["meta"]["count"] = len(out_data["activities"])
+        out_data["meta"]["last-order"] = self._platform_activities.last_order
         out_data["meta"]["lastupdate"] = self._last_updates["platform_activities"]
 
     def get_platform_composition(self, request, response, in_data, out_data):
@@ -325,6 +343,9 @@ class Admin(object):
     def delete_platform_activities(self, request, response, in_data, out_data):
         out_data["platform"] = {}
         out_data["activities"] = []
+        with self._lock:
+            self._platform_activities.clear()
+            self._last_updates["platform_activities"] = time.time()
 
     def delete_nodes(self, request, response, in_data, out_data):
         out_data["nodes"] = []
@@ -364,17 +385,8 @@ class Admin(object):
             time_now = time.time()
             self._last_updates["nodes"] = time_now
             self._last_updates["platform_activities"] = time_now
-            self._platform_activities_index += 1
-            self._platform_activities.append({
-                    "order": self._platform_activities_index,
-                    "timestamp": str(time.strftime("%Y-%m-%d %H:%M:%S")),
-                    "event" : "Isolate Created",
-                    "object": "Isolate",
-                    "name" : peer.name,
-                    "uuid" : peer.uid,
-                    "node" : peer.node_name,
-                    "info" : ""
-                })
+            self._platform_activities.add("Isolate Created", "Isolate", peer.name,
+                                          peer.uid, peer.node_name)
 
     def peer_updated(self, peer, access_id, data, previous):
         pass
@@ -384,144 +396,76 @@ class Admin(object):
             time_now = time.time()
             self._last_updates["nodes"] = time_now
             self._last_updates["platform_activities"] = time_now
-            self._platform_activities_index += 1
-            self._platform_activities.append({
-                    "order": self._platform_activities_index,
-                    "timestamp": str(time.strftime("%Y-%m-%d %H:%M:%S")),
-                    "event" : "Isolate Lost",
-                    "object": "Isolate",
-                    "name" : peer.name,
-                    "uuid" : peer.uid,
-                    "node" : peer.node_name,
-                    "info" : ""
-                })
+            self._platform_activities.add("Isolate Lost", "Isolate", peer.name,
+                                          peer.uid, peer.node_name)
 
     """
     Servlet (url mapping to rest api) ================================================================
     """
 
-    def do_GET(self, request, response):
+    def _setup_routes(self):
         """
-        Handle a GET
+        Prepares the routes table of the API
+        """
+        routes = restapi.routes.Router("admin", ADMIN_REST_API_PATH)
+        # Platform API
+        routes.add("GET", "platform", self.get_platform)
+        # platform/activities path data: since=10 (only the activities after
+        # the given order number), rang=1..10 (*..* for all), filter=(node=x),
+        # node=, uuid=, event= (indexed criteria), limit=100
+        routes.add("GET", "platform/activities", self.get_platform_activities)
+        routes.add("GET", "platform/composition", self.get_platform_composition)
+        routes.add("DELETE", "platform", self.delete_platform)
+        routes.add("DELETE", "platform/activities", self.delete_platform_activities)
+        # Nodes API
+        routes.add("GET", "nodes", self.get_nodes)
+        routes.add("GET", "nodes/{uuid}", self.get_node)
+        routes.add("GET", "nodes/{uuid}/isolates", self.get_node_isolates)
+        routes.add("DELETE", "nodes", self.delete_nodes)
+        routes.add("DELETE", "nodes/{uuid}", self.delete_node)
+        routes.add("DELETE", "nodes/{uuid}/isolates", self.delete_node_isolates)
+        # Isolates API
+        routes.add("GET", "isolates", self.get_isolates)
+        routes.add("GET", "isolates/{uuid}", self.get_isolate)
+        routes.add("GET", "isolates/{uuid}/components", self.get_isolate_components)
+        routes.add("DELETE", "isolates", self.delete_isolates)
+        routes.add("DELETE", "isolates/{uuid}", self.delete_isolate)
+        routes.add("DELETE", "isolates/{uuid}/components", self.delete_isolate_components)
+        # Components API
+        routes.add("GET", "components", self.get_components)
+        routes.add("GET", "components/{uuid}", self.get_component)
+        routes.add("DELETE", "components", self.delete_components)
+        routes.add("DELETE", "components/{uuid}", self.delete_component)
+        return routes
+
+    def dispatch(self, request, response, action):
+        """
+        Calls the API method matching the request and sends its result
         """
         path, parts, in_data = self.decrypt_request(request)
 
-        out_data = self.prepare_response(request, "GET")
-
-        if path.startswith(ADMIN_REST_API_PATH):
-
-            # Platform API
-            if path == ADMIN_REST_API_PATH + "/platform":
-                out_data["meta"]["api-method"] = "get_platform"
-                self.get_platform(request, response, in_data, out_data)
-            elif path == ADMIN_REST_API_PATH + "/platform/activities":
-                """
-                path data:
-                {
-                    "rang": "1..10", # possible values: *..* (if 0..0 return only associated meta-data)
-                    "filter": "(node=led-raspberry)"
-                }
-                """
-                out_data["meta"]["api-method"] = "get_platform_activities"
-                self.get_platform_activities(request, response, in_data, out_data)
-            elif path == ADMIN_REST_API_PATH + "/platform/composition":
-                out_data["meta"]["api-method"] = "get_platform_composition"
-                self.get_platform_composition(request, response, in_data, out_data)
-            # Nodes API
-            elif path == ADMIN_REST_API_PATH + "/nodes":
-                out_data["meta"]["api-method"] = "get_nodes"
-                self.get_nodes(request, response, in_data, out_data)
-            elif path == ADMIN_REST_API_PATH + "/components":
-                out_data["meta"]["api-method"] = "get_components"
-                self.get_components(request, response, in_data, out_data)
-            elif path == ADMIN_REST_API_PATH + "/isolates":
-                out_data["meta"]["api-method"] = "get_isolates"
-                self.get_isolates(request, response, in_data, out_data)
-
-            elif len(parts) >= 5:
-                if path == ADMIN_REST_API_PATH + "/nodes/" + parts[4]:
-                    out_data["meta"]["api-method"] = "get_node"
-                    self.get_node(request, response, in_data, out_data, parts[4])
-                elif path == ADMIN_REST_API_PATH + "/nodes/" + parts[4] + "/isolates":
-                    out_data["meta"]["api-method"] = "get_node_isolates"
-                    self.get_node_isolates(request, response, in_data, out_data, parts[4])
-
-                elif path == ADMIN_REST_API_PATH + "/isolates/" + parts[4]:
-                    out_data["meta"]["api-method"] = "get_isolate"
-                    self.get_isolate(request, response, in_data, out_data, parts[4])
-                elif path == ADMIN_REST_API_PATH + "/isolates/" + parts[4] + "/components":
-                    out_data["meta"]["api-method"] = "get_isolate_components"
-                    self.get_isolate_components(request, response, in_data, out_data, parts[4])
-
-                elif path == ADMIN_REST_API_PATH + "/components/" + parts[4]:
-                    out_data["meta"]["api-method"] = "get_component"
-                    self.get_component(request, response, in_data, out_data, parts[4])
-                else:
-                    self.bad_request(request, response, in_data, out_data)
-            else:
-                self.bad_request(request, response, in_data, out_data)
+        out_data = self.prepare_response(request, action)
 
+        route, args = self._routes.match(action, path)
+        if route is not None:
+            out_data["meta"]["api-method"] = route.name
+            route(request, response, in_data, out_data, *args)
         else:
             self.bad_request(request, response, in_data, out_data)
 
-        self.send_json(out_data, response)
+        self.send_json(out_data, request, response)
+
+    def do_GET(self, request, response):
+        """
+        Handle a GET
+        """
+        self.dispatch(request, response, "GET")
 
     def do_delete(self, request, response):
         """
 		Handle Delete actions
 		"""
-        path, parts, in_data = self.decrypt_request(request)
-
-        out_data = self.prepare_response(request, "DELETE")
-
-        if path.startswith(ADMIN_REST_API_PATH):
-
-            # Platform API
-            if path == ADMIN_REST_API_PATH + "/platform":
-                out_data["meta"]["api-method"] = "delete_platform"
-                self.delete_platform(request, response, in_data, out_data)
-            elif path == ADMIN_REST_API_PATH + "/platform/activities":
-                out_data["meta"]["api-method"] = "delete_platform_activities"
-                self.delete_platform_activities(request, response, in_data, out_data)
-
-            # Nodes API
-            elif path == ADMIN_REST_API_PATH + "/nodes":
-                out_data["meta"]["api-method"] = "delete_nodes"
-                self.delete_nodes(request, response, in_data, out_data)
-            elif path == ADMIN_REST_API_PATH + "/components":
-                out_data["meta"]["api-method"] = "delete_components"
-                self.delete_components(request, response, in_data, out_data)
-            elif path == ADMIN_REST_API_PATH + "/isolates":
-                out_data["meta"]["api-method"] = "delete_isolates"
-                self.delete_isolates(request, response, in_data, out_data)
-
-            elif len(parts) >= 5:
-                if path == ADMIN_REST_API_PATH + "/nodes/" + parts[4]:
-                    out_data["meta"]["api-method"] = "delete_node"
-                    self.delete_node(request, response, in_data, out_data, parts[4])
-                elif path == ADMIN_REST_API_PATH + "/nodes/" + parts[4] + "/isolates":
-                    out_data["meta"]["api-method"] = "delete_node_isolates"
-                    self.delete_node_isolates(request, response, in_data, out_data, parts[4])
-
-                elif path == ADMIN_REST_API_PATH + "/isolates/" + parts[4]:
-                    out_data["meta"]["api-method"] = "delete_isolate"
-                    self.delete_isolate(request, response, in_data, out_data, parts[4])
-                elif path == ADMIN_REST_API_PATH + "/isolates/" + parts[4] + "/components":
-                    out_data["meta"]["api-method"] = "delete_isolate_components"
-                    self.delete_isolate_components(request, response, in_data, out_data, parts[4])
-
-                elif path == ADMIN_REST_API_PATH + "/components/" + parts[4]:
-                    out_data["meta"]["api-method"] = "delete_component"
-                    self.delete_component(request, response, in_data, out_data, parts[4])
-                else:
-                    self.bad_request(request, response, in_data, out_data)
-            else:
-                self.bad_request(request, response, in_data, out_data)
-
-        else:
-            self.bad_request(request, response, in_data, out_data)
-
-        self.send_json(out_data, response)
+        self.dispatch(request, response, "DELETE")
 
 
 
@@ -534,10 +478,17 @@ class Admin(object):
         _logger.info("Admin REST API validated")
         self._context = context
 
+        spill_file = None
+        if self._spill_activities:
+            spill_file = os.path.join(context.get_property("cohorte.base"),
+                                      "var", "activities-admin.log")
+        self._platform_activities = ActivityJournal(self._max_activities, spill_file)
+
 
     @Invalidate
     def invalidate(self, context):
         _logger.info("Admin REST API invalidated")
+        self._platform_activities.close()
 
 
     def bound_to(self, path, params):
@@ -60,6 +60,7 @@ import json
 
 # cohorte plutform debug agent and api
 import debug
+import debug.logs
 
 # ------------------------------------------------------------------------------
 
@@ -106,6 +107,9 @@ SUBJECT_GET_ISOLATE_LOGS = "{0}/get_isolate_logs".format(_SUBJECT_PREFIX)
 SUBJECT_GET_ISOLATE_LOG = "{0}/get_isolate_log".format(_SUBJECT_PREFIX)
 """ Signal to request the isolate logs """
 
+SUBJECT_READ_ISOLATE_LOG = "{0}/read_isolate_log".format(_SUBJECT_PREFIX)
+""" Signal to request a part of an isolate log file """
+
 SUBJECT_GET_ISOLATE_DIRECTORY = "{0}/get_isolate_directory".format(_SUBJECT_PREFIX)
 """ Signal to request the isolate herald local directory """
 
@@ -115,6 +119,40 @@ SUBJECT_GET_ISOLATE_ACCESSES = "{0}/get_isolate_accesses".format(_SUBJECT_PREFIX
 SUBJECT_SET_ISOLATE_LOGS_LEVEL = "{0}/set_isolate_logs_level".format(_SUBJECT_PREFIX)
 """ Signal to change the isolate logs level """
 
+SUBJECT_GET_JVM_STATISTICS = "{0}/get_jvm_statistics".format(_SUBJECT_PREFIX)
+""" Signal to request the counters of the JPype bridge (threads, proxies) """
+
+# ------------------------------------------------------------------------------
+
+LOG_CHUNK_SIZE = 256 * 1024
+""" Maximum size of a log part sent in a single message, in bytes """
+
+LOG_BLOCK_SIZE = 8192
+""" Size of the blocks read backwards to find the last lines of a log """
+
+# ------------------------------------------------------------------------------
+
+SNAPSHOT_BUNDLES = "bundles"
+""" Cached snapshot of the list of bundles """
+
+SNAPSHOT_FACTORIES = "factories"
+""" Cached snapshot of the list of iPOPO factories """
+
+SNAPSHOT_INSTANCES = "instances"
+""" Cached snapshot of the list of iPOPO instances """
+
+SNAPSHOT_SERVICES = "services"
+""" Cached snapshot of the list of services """
+
+SNAPSHOT_ETAG = "etag"
+""" Key of the snapshot version, in requests and replies """
+
+SNAPSHOT_CONTENT = "content"
+""" Key of the snapshot content, in replies """
+
+SNAPSHOT_NOT_MODIFIED = "not-modified"
+""" Reply flag set when the requested version is still the current one """
+
 @ComponentFactory('cohorte-debug-agent-factory')
 @Requires("_ipopo", pelix.ipopo.constants.SERVICE_IPOPO)
 @Requires('_herald', herald.SERVICE_HERALD)
@@ -141,8 +179,101 @@ class DebugAgent(object):
         self._filters = None
         # Herald directory
         self._directory = None
-        
-        
+
+        # Cached snapshots: name -> (etag, JSON string)
+        self._snapshots = {}
+        # Snapshots versions, incremented on each invalidation
+        self._snapshots_versions = {}
+        # Snapshots builders: name -> method returning a JSON string
+        self._snapshots_builders = {
+            SNAPSHOT_BUNDLES: self._build_bundles,
+            SNAPSHOT_FACTORIES: self._build_factories,
+            SNAPSHOT_INSTANCES: self._build_instances,
+            SNAPSHOT_SERVICES: self._build_services,
+        }
+        # ETag prefix, changes each time the agent is validated
+        self._snapshots_prefix = None
+        self._snapshots_lock = threading.Lock()
+
+    def _get_snapshot(self, name):
+        """
+        Returns the cached snapshot with the given name, building it if
+        necessary
+
+        :param name: Name of the snapshot (SNAPSHOT_* constants)
+        :return: A (etag, JSON string) tuple
+        """
+        with self._snapshots_lock:
+            snapshot = self._snapshots.get(name)
+            if snapshot is not None:
+                return snapshot
+            version = self._snapshots_versions.setdefault(name, 0)
+
+        # Build it outside the lock: framework calls can take some time
+        content = self._snapshots_builders[name]()
+        snapshot = ("{0}-{1}-{2}".format(self._snapshots_prefix, name, version),
+                    content)
+        with self._snapshots_lock:
+            if self._snapshots_versions[name] == version:
+                # Not invalidated while building it
+                self._snapshots[name] = snapshot
+        return snapshot
+
+    def _invalidate_snapshots(self, *names):
+        """
+        Drops the given cached snapshots
+        """
+        with self._snapshots_lock:
+            for name in names:
+                self._snapshots_versions[name] = \
+                    self._snapshots_versions.get(name, 0) + 1
+                self._snapshots.pop(name, None)
+
+    def get_snapshot(self, name, etag=None):
+        """
+        Returns the given snapshot with its version (etag), as a JSON object
+        string. If the given etag is the current one, the content is not
+        returned and the "not-modified" flag is set.
+
+        :param name: Name of the snapshot (SNAPSHOT_* constants)
+        :param etag: Version of the snapshot known by the caller
+        :return: A JSON object string
+        """
+        current_etag, content = self._get_snapshot(name)
+        if etag == current_etag:
+            return json.dumps({SNAPSHOT_ETAG: current_etag,
+                               SNAPSHOT_NOT_MODIFIED: True})
+        # The content is already serialized
+        return '{{"{0}": {1}, "{2}": {3}}}'.format(
+            SNAPSHOT_ETAG, json.dumps(current_etag), SNAPSHOT_CONTENT, content)
+
+    def _reply_snapshot(self, name, content):
+        """
+        Prepares the reply to a snapshot request: requests with an etag get a
+        versioned reply, others get the raw snapshot (compatibility)
+        """
+        if isinstance(content, dict) and SNAPSHOT_ETAG in content:
+            return self.get_snapshot(name, content[SNAPSHOT_ETAG])
+        return self._get_snapshot(name)[1]
+
+    def bundle_changed(self, event):
+        """
+        Called by Pelix when a bundle event occurs
+        """
+        self._invalidate_snapshots(SNAPSHOT_BUNDLES, SNAPSHOT_FACTORIES,
+                                   SNAPSHOT_INSTANCES)
+
+    def service_changed(self, event):
+        """
+        Called by Pelix when a service event occurs
+        """
+        self._invalidate_snapshots(SNAPSHOT_SERVICES)
+
+    def handle_ipopo_event(self, event):
+        """
+        Called by iPOPO when a factory or an instance event occurs
+        """
+        self._invalidate_snapshots(SNAPSHOT_FACTORIES, SNAPSHOT_INSTANCES)
 
     def get_isolate_detail(self):
         """
@@ -169,6 +300,12 @@ class DebugAgent(object):
         """
         Returns the list of isolate bundles
         """
+        return self._get_snapshot(SNAPSHOT_BUNDLES)[1]
+
+    def _build_bundles(self):
+        """
+        Computes the bundles snapshot
+        """
         bundles = self._context.get_bundles()
         bundles.insert(0, self._context.get_bundle(0))
         
@@ -236,6 +373,12 @@ class DebugAgent(object):
         """
         Returns the list of isolate factories
         """
+        return self._get_snapshot(SNAPSHOT_FACTORIES)[1]
+
+    def _build_factories(self):
+        """
+        Computes the factories snapshot
+        """
         ipopo_factories = self._ipopo.get_factories()
         result = [
             { 
@@ -311,6 +454,12 @@ class DebugAgent(object):
         """
         Returns the list of iPOPO instances in the local isolate
         """
+        return self._get_snapshot(SNAPSHOT_INSTANCES)[1]
+
+    def _build_instances(self):
+        """
+        Computes the instances snapshot
+        """
         ipopo_instances = self._ipopo.get_instances()
         result = [
             {"name" : name, 
@@ -357,6 +506,12 @@ class DebugAgent(object):
         """
         Returns the list of services in the local isolate
         """
+        return self._get_snapshot(SNAPSHOT_SERVICES)[1]
+
+    def _build_services(self):
+        """
+        Computes the services snapshot
+        """
         result = []
         for svc_ref in self._context.get_all_service_references(None, None):
             s_id = svc_ref.get_property(pelix.constants.SERVICE_ID)
@@ -410,9 +565,58 @@ class DebugAgent(object):
             result.append(th)
         return json.dumps(result)
         
+    def _load_log_index(self):
+        """
+        Loads the logs index of the local isolate
+
+        :return: The LogIndex, or None if the logs are not indexed
+        """
+        path = debug.logs.get_index_path(
+            self._context.get_property(cohorte.PROP_BASE),
+            self._context.get_property(cohorte.PROP_KIND),
+            self._context.get_property(cohorte.PROP_NAME))
+        if not os.path.exists(path):
+            return None
+        return debug.logs.LogIndex.load(path)
+
+    def _get_log_run(self, log_id):
+        """
+        Returns the logs index of the local isolate if it knows the given run
+
+        :return: The LogIndex, or None
+        """
+        index = self._load_log_index()
+        if index is not None:
+            try:
+                index.get_run(log_id)
+                return index
+            except KeyError:
+                pass
+        return None
+
     def get_isolate_logs(self):
         isolate = json.loads(self.get_isolate_detail())
         if isolate is not None:            
+            index = self._load_log_index()
+            if index is not None:
+                # runs and segments, without scanning the var directory
+                log_files = []
+                runs = {}
+                for log_id, run in index.get_runs():
+                    log_files.append({log_id: debug.logs.format_time(run["start"])})
+                    runs[log_id] = {
+                        "start": run["start"],
+                        "end": run["end"],
+                        "first": index.get_first_offset(log_id),
+                        "size": index.get_size(log_id),
+                        "segments": [{"start": segment["start"],
+                                      "end": segment["end"],
+                                      "offset": segment["offset"],
+                                      "size": segment["size"]}
+                                     for segment in run["segments"]]}
+                return json.dumps({"kind": isolate["cohorte.isolate.kind"], "level": "INFO",
+                                   "log-files": log_files, "runs": runs})
+
             cohorte_base = isolate["cohorte.base"]
             if isolate["cohorte.isolate.kind"] == "forker":
                 # this is a forker. returns only "000" which references var/forker.log file                
@@ -440,23 +644,162 @@ class DebugAgent(object):
                             result.append({toadd: time.strftime("%Y-%m-%dT%H:%M:%S", ct_parser)})                                                      
                 return json.dumps({"kind": isolate["cohorte.isolate.kind"] , "level": "INFO", "log-files": result})
     
-    def get_isolate_log(self, log_id):
+    def _get_isolate_log_path(self, log_id):
+        """
+        Returns the path to the given log file of the local isolate
+        """
         isolate = json.loads(self.get_isolate_detail())
-        if isolate is not None:            
-            cohorte_base = isolate["cohorte.base"]
-            if isolate["cohorte.isolate.kind"] == "forker":                
-                path = os.path.join(cohorte_base, "var", "forker.log")                
-            else:
-                isolate_uid = isolate["cohorte.isolate.uid"]
-                isolate_name = isolate["cohorte.isolate.name"]
-                path = os.path.join(cohorte_base, "var", isolate_name, 
-                                 log_id + "-" + isolate_uid, "log_" + isolate_name + ".log")
-            with open (path, "r") as forker_log:
-                log=forker_log.read()
-                return json.dumps({"content": log})
-                                 
-        return json.dumps("")
-    
+        cohorte_base = isolate["cohorte.base"]
+        if isolate["cohorte.isolate.kind"] == "forker":                
+            return os.path.join(cohorte_base, "var", "forker.log")                
+        else:
+            isolate_uid = isolate["cohorte.isolate.uid"]
+            isolate_name = isolate["cohorte.isolate.name"]
+            return os.path.join(cohorte_base, "var", isolate_name, 
+                                log_id + "-" + isolate_uid, "log_" + isolate_name + ".log")
+
+    def get_isolate_log(self, log_id):
+        index = self._get_log_run(log_id)
+        if index is not None:
+            # kept segments (compressed or not) and live log
+            try:
+                log = debug.logs.read_run(index, log_id)
+            except (IOError, OSError):
+                # a segment has been compressed or removed since the index
+                # has been loaded
+                index = self._get_log_run(log_id)
+                log = debug.logs.read_run(index, log_id) \
+                    if index is not None else None
+            if log is not None:
+                return json.dumps({"content": log.decode("UTF-8", "replace")})
+
+        path = self._get_isolate_log_path(log_id)
+        with open (path, "r") as forker_log:
+            log=forker_log.read()
+            return json.dumps({"content": log})
+
+    @staticmethod
+    def _find_tail_offset(log_file, size, lines):
+        """
+        Finds the offset of the last lines of a file, reading it backwards
+        by blocks
+
+        :param log_file: A file opened in binary mode
+        :param size: Size of the file
+        :param lines: Number of lines to keep
+        :return: The offset of the first of the last lines
+        """
+        end = size
+        if size > 0:
+            log_file.seek(size - 1)
+            if log_file.read(1) == b"\n":
+                # the last end of line doesn't start a new line
+                end -= 1
+
+        while end > 0:
+            start = max(0, end - LOG_BLOCK_SIZE)
+            log_file.seek(start)
+            data = log_file.read(end - start)
+            idx = len(data)
+            while True:
+                idx = data.rfind(b"\n", 0, idx)
+                if idx < 0:
+                    break
+                lines -= 1
+                if lines <= 0:
+                    return start + idx + 1
+            end = start
+        return 0
+
+    def read_isolate_log(self, log_id, offset=None, limit=None, tail=None):
+        """
+        Reads a part of a log file of the local isolate, without loading the
+        whole file. At most LOG_CHUNK_SIZE bytes are returned: the caller
+        must continue reading from the returned "next" offset.
+
+        Indexed logs are read across their rotated segments: offsets are
+        positions in the whole log stream of the run, and a single reply
+        never spans two segments.
+
+        :param log_id: ID of the log file
+        :param offset: Offset of the first byte to read (negative values
+                       are relative to the end of the file)
+        :param limit: Maximum number of bytes to read
+        :param tail: If given, read the last lines of the file (overrides
+                     the offset). Only the live log file is considered.
+        :return: A JSON object string: offset, next offset, size of the file
+                 and content
+        """
+        index = self._get_log_run(log_id)
+        try:
+            return self._read_log(log_id, index, offset, limit, tail)
+        except (IOError, OSError):
+            if index is None:
+                raise
+            # a segment has been compressed or removed since the index has
+            # been loaded: locate the offset again in the current one
+            return self._read_log(log_id, self._get_log_run(log_id),
+                                  offset, limit, tail)
+
+    def _read_log(self, log_id, index, offset, limit, tail):
+        """
+        Reads a part of a log file of the local isolate (see
+        read_isolate_log)
+
+        :param index: The logs index knowing the run, or None
+        :raise IOError: Error reading the log file
+        """
+        if index is not None:
+            size = index.get_size(log_id)
+            first = index.get_first_offset(log_id)
+        else:
+            path = self._get_isolate_log_path(log_id)
+            size = os.path.getsize(path)
+            first = 0
+
+        def locate(position):
+            """
+            Returns the (path, compressed, part offset, part size) of the
+            part containing the given position
+            """
+            if index is not None:
+                return index.locate(log_id, position)
+            return path, False, 0, size
+
+        if tail is not None:
+            part_path, _, part_offset, part_size = locate(size)
+            with open(part_path, "rb") as log_file:
+                offset = part_offset + self._find_tail_offset(
+                    log_file, part_size, int(tail))
+        elif offset is None:
+            offset = first
+        else:
+            offset = int(offset)
+            if offset < 0:
+                offset = size + offset
+        offset = max(first, min(offset, size))
+
+        part_path, compressed, part_offset, part_size = locate(offset)
+        if limit is None:
+            limit = LOG_CHUNK_SIZE
+        limit = max(0, min(int(limit), LOG_CHUNK_SIZE,
+                           part_offset + part_size - offset))
+
+        with debug.logs.open_part(part_path, compressed) as log_file:
+            log_file.seek(offset - part_offset)
+            data = log_file.read(limit)
+
+        if offset + len(data) < size:
+            # stop at the end of the last complete line, if any
+            idx = data.rfind(b"\n")
+            if idx >= 0:
+                data = data[:idx + 1]
+
+        return json.dumps({"offset": offset,
+                           "next": offset + len(data),
+                           "size": size,
+                           "content": data.decode("UTF-8", "replace")})
+
     def get_isolate_directory(self):        
         return self._directory.dump()
 
@@ -467,6 +810,17 @@ class DebugAgent(object):
             result[access] = self._directory.get_local_peer().get_access(access).dump()            
         return json.dumps(result)
     
+    def get_jvm_statistics(self):
+        """
+        Returns the counters of the JPype bridge of the isolate: attachments
+        of the Python threads to the JVM and calls of the Java proxies.
+        Isolates which haven't loaded JPype have no JVM.
+        """
+        jpype = sys.modules.get("jpype")
+        if jpype is None or not hasattr(jpype, "getJVMStatistics"):
+            return json.dumps({"started": False})
+        return json.dumps(jpype.getJVMStatistics())
+
     def set_isolate_logs_level(self, level):
         return json.dumps({"old_log_level": "ALL", "new_log_level": "INFO"})
 
@@ -480,22 +834,22 @@ class DebugAgent(object):
         if subject == SUBJECT_GET_ISOLATE_DETAIL:
             reply = self.get_isolate_detail()
         elif subject == SUBJECT_GET_BUNDLES:
-            reply = self.get_bundles()
+            reply = self._reply_snapshot(SNAPSHOT_BUNDLES, message.content)
         elif subject == SUBJECT_GET_BUNDLE_DETAIL:
             bundle_number = message.content
             reply = self.get_bundle_detail(bundle_number)    
         elif subject == SUBJECT_GET_FACTORIES:
-            reply = self.get_factories()
+            reply = self._reply_snapshot(SNAPSHOT_FACTORIES, message.content)
         elif subject == SUBJECT_GET_FACTORY_DETAIL:
             factory_name = message.content
             reply = self.get_factory_detail(factory_name)
         elif subject == SUBJECT_GET_INSTANCES:
-            reply = self.get_instances()        
+            reply = self._reply_snapshot(SNAPSHOT_INSTANCES, message.content)
         elif subject == SUBJECT_GET_INSTANCE_DETAIL:
             instance_name = message.content
             reply = self.get_instance_detail(instance_name)            
         elif subject == SUBJECT_GET_SERVICES:
-            reply = self.get_services()
+            reply = self._reply_snapshot(SNAPSHOT_SERVICES, message.content)
         elif subject == SUBJECT_GET_THREADS:
             reply = self.get_threads()
         elif subject == SUBJECT_GET_ISOLATE_LOGS:
@@ -503,10 +857,16 @@ class DebugAgent(object):
         elif subject == SUBJECT_GET_ISOLATE_LOG:
             log_id = message.content
             reply = self.get_isolate_log(log_id)
+        elif subject == SUBJECT_READ_ISOLATE_LOG:
+            request = message.content
+            reply = self.read_isolate_log(request["log_id"], request.get("offset"),
+                                          request.get("limit"), request.get("tail"))
         elif subject == SUBJECT_GET_ISOLATE_DIRECTORY:            
             reply = self.get_isolate_directory()
         elif subject == SUBJECT_GET_ISOLATE_ACCESSES:            
             reply = self.get_isolate_accesses()
+        elif subject == SUBJECT_GET_JVM_STATISTICS:
+            reply = self.get_jvm_statistics()
         elif subject == SUBJECT_SET_ISOLATE_LOGS_LEVEL:
             level = message.content
             reply = self.set_isolate_logs_level(level)
@@ -524,6 +884,13 @@ class DebugAgent(object):
         """
         # Store the framework access
         self._context = context
+
+        # Snapshots are invalidated by framework events
+        self._snapshots_prefix = "{0}-{1:x}".format(
+            context.get_property(cohorte.PROP_UID), int(time.time() * 1000))
+        context.add_bundle_listener(self)
+        context.add_service_listener(self)
+        self._ipopo.add_listener(self)
         _logger.info("Debug agent Ready")
 
     @Invalidate
@@ -533,6 +900,12 @@ class DebugAgent(object):
 
         :param context: The bundle context
         """
+        # Stop listening to framework events
+        self._ipopo.remove_listener(self)
+        context.remove_service_listener(self)
+        context.remove_bundle_listener(self)
+        self._invalidate_snapshots(*self._snapshots_builders)
+
         # Clear the framework access
         self._context = None
         _logger.info("Debug agent Gone")
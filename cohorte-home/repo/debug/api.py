@@ -22,21 +22,22 @@ import logging
 from pelix.ipopo.decorators import ComponentFactory, Provides, Property, Instantiate, \
     Validate, Invalidate, Requires, RequiresMap, Bind, BindField, UnbindField
 import pelix.remote
+import pelix.threadpool
 import threading
 
 import debug
 import herald
 import herald.beans as beans
+import herald.exceptions
+
+# REST API responses encoder and routes
+import restapi.encoder
+import restapi.routes
 
 
 # Herald
 # Cohorte 
 # Standard library
-try:
-    import Cookie
-except ImportError:
-    import http.cookies as Cookie
-
 try:
     # Python 3
     import urllib.parse as urlparse
@@ -58,19 +59,40 @@ DEBUG_REST_API_PATH = "debug/api/v2"
 # API Version
 DEBUG_REST_API_VERSION = "v2"
 
+# API methods which don't need a session
+PUBLIC_API_METHODS = ("auth_login", "auth_logout")
+
 PROP_USERNAME = "username"
 
 PROP_PASSWORD = "password"
 
 PROP_SESSION_TIMEOUT = "session.timeout"
 
-# ------------------------------------------------------------------------------------
+PROP_BATCH_MAX_THREADS = "batch.max_threads"
 
-class SetEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, set):
-            return list(obj)
-        return json.JSONEncoder.default(self, obj)
+PROP_BATCH_TIMEOUT = "batch.timeout"
+
+PROP_LOGS_FOLLOW_TIMEOUT = "logs.follow.timeout"
+
+LOGS_FOLLOW_PERIOD = 1
+""" Time between two reads of a followed log, in seconds """
+
+BATCH_ALL_ISOLATES = "*"
+""" Isolate UID used to query all the known isolates at once """
+
+BATCH_QUERIES = {
+    "isolate": "_get_isolate_detail",
+    "bundles": "_get_isolate_bundles",
+    "factories": "_get_isolate_factories",
+    "instances": "_get_isolate_instances",
+    "services": "_get_isolate_services",
+    "threads": "_get_isolate_threads",
+    "logs": "_get_isolate_logs",
+    "directory": "_get_isolate_directory",
+    "accesses": "_get_isolate_accesses",
+    "jvm": "_get_isolate_jvm",
+}
+""" Queries allowed in batches: name -> internal agent method """
 
 # ------------------------------------------------------------------------------------
 
@@ -93,6 +115,9 @@ class SetEncoder(json.JSONEncoder):
 @Property('_username', PROP_USERNAME, 'admin')
 @Property('_password', PROP_PASSWORD, 'admin')
 @Property('_sessions_timeout', PROP_SESSION_TIMEOUT, 120000)
+@Property('_logs_follow_timeout', PROP_LOGS_FOLLOW_TIMEOUT, 600)
+@Property('_batch_max_threads', PROP_BATCH_MAX_THREADS, 10)
+@Property('_batch_timeout', PROP_BATCH_TIMEOUT, 5)
 class DebugAPI(object):
     """
     A Component that provides the REST Admin API
@@ -142,6 +167,23 @@ class DebugAPI(object):
         # in muliseconds
         self._sessions_timeout = 1 * 60 * 1000
 
+        # maximum time a log can be followed, in seconds
+        self._logs_follow_timeout = 600
+        # isolates which agent can't read parts of logs (e.g. Java ones)
+        self._legacy_log_agents = set()
+
+        # agents snapshots cache: (isolate uid, snapshot name) -> (etag, value)
+        self._snapshots = {}
+        self._snapshots_lock = threading.Lock()
+
+        # batch queries: thread pool size and default timeout (in seconds)
+        self._batch_max_threads = 10
+        self._batch_timeout = 5
+        self._batch_pool = None
+
+        # method + path -> API method
+        self._routes = self._setup_routes()
+
     def decrypt_request(self, request, action="GET"):
         """
         Decrypts the request and extracts these information:
@@ -186,15 +228,33 @@ class DebugAPI(object):
         data["meta"]["duration"] = 0.0
         return data
 
-    def send_json(self, data, response):
-        result = json.dumps(data, sort_keys=False,
-                            indent=4, separators=(',', ': '),
-                            cls=SetEncoder)
-        response.send_content(data["meta"]["status"], result, "application/json")
+    def send_json(self, data, request, response):
+        if data["meta"]["status"] == 304:
+            # not modified: no content
+            response.send_content(304, "", "application/json")
+            return
+        restapi.encoder.send_json(request, response, data, data["meta"]["status"])
     	
     def send_text(self, data, response, status):
         response.send_content(status, data, "text/plain")
         
+    def not_modified(self, request, response, out_data, etag):
+        """
+        Sets the ETag header of the response and checks if the client
+        already has this version of the resource
+
+        :return: True if the resource has not been modified (304)
+        """
+        if etag is None:
+            return False
+        etag = '"{0}"'.format(etag)
+        response.set_header("ETag", etag)
+        if request.get_header("If-None-Match") == etag:
+            out_data["meta"]["status"] = 304
+            out_data["meta"]["msg"] = "NOT MODIFIED"
+            return True
+        return False
+
     def bad_request(self, request, response, in_data, out_data, msg=None):
         out_data["meta"]["status"] = 400
         if msg:
@@ -223,6 +283,13 @@ class DebugAPI(object):
     def get_api_info(self, request, response, in_data, out_data):
         out_data["api"] = {"name": "debug"} 
 
+    def get_metrics(self, request, response, in_data, out_data):
+        """
+        Calls count and durations (in seconds) of the routes of the REST
+        APIs of this isolate
+        """
+        out_data["metrics"] = restapi.routes.get_metrics()
+
     def get_platform_details(self, request, response, in_data, out_data):
         out_data["platform"] = {}        
         out_data["platform"]["cohorte-version"] = self._get_cohorte_version()
@@ -251,11 +318,18 @@ class DebugAPI(object):
         out_data["meta"]["count"] = count
 
     def get_isolate(self, request, response, in_data, out_data, uuid):
-        out_data["isolate"] = self._get_isolate_detail(uuid)
+        try:
+            out_data["isolate"] = self._get_isolate_detail(uuid)
+        except KeyError:
+            # unknown isolate
+            out_data["isolate"] = None
         
     def get_isolate_bundles(self, request, response, in_data, out_data, uuid):
         out_data["isolate"] = {"uuid" : uuid}
-        bundles = self._get_isolate_bundles(uuid)
+        etag, bundles = self._query_snapshot(uuid, debug.agent.SUBJECT_GET_BUNDLES,
+                                             debug.agent.SNAPSHOT_BUNDLES)
+        if self.not_modified(request, response, out_data, etag):
+            return
         out_data["bundles"] = bundles
         if bundles is not None:
             count = len(bundles)
@@ -270,7 +344,10 @@ class DebugAPI(object):
             
     def get_isolate_factories(self, request, response, in_data, out_data, uuid):
         out_data["isolate"] = {"uuid" : uuid}
-        factories = self._get_isolate_factories(uuid)
+        etag, factories = self._query_snapshot(uuid, debug.agent.SUBJECT_GET_FACTORIES,
+                                               debug.agent.SNAPSHOT_FACTORIES)
+        if self.not_modified(request, response, out_data, etag):
+            return
         out_data["factories"] = factories
         if factories is not None:
             count = len(factories)
@@ -285,7 +362,10 @@ class DebugAPI(object):
 
     def get_isolate_instances(self, request, response, in_data, out_data, uuid):
         out_data["isolate"] = {"uuid" : uuid}                
-        instances = self._get_isolate_instances(uuid)
+        etag, instances = self._query_snapshot(uuid, debug.agent.SUBJECT_GET_INSTANCES,
+                                               debug.agent.SNAPSHOT_INSTANCES)
+        if self.not_modified(request, response, out_data, etag):
+            return
         out_data["instances"] = instances        
         if instances is not None:
             count = len(instances)
@@ -300,7 +380,10 @@ class DebugAPI(object):
         
     def get_isolate_services(self, request, response, in_data, out_data, uuid):
         out_data["isolate"] = {"uuid" : uuid}
-        services = self._get_isolate_services(uuid)
+        etag, services = self._query_snapshot(uuid, debug.agent.SUBJECT_GET_SERVICES,
+                                              debug.agent.SNAPSHOT_SERVICES)
+        if self.not_modified(request, response, out_data, etag):
+            return
         out_data["services"] = services
         if services is not None:
             count = len(services)
@@ -332,6 +415,54 @@ class DebugAPI(object):
         out_data["isolate"] = {"uuid" : isolate_uuid}        
         out_data["log"] = self._get_isolate_log(isolate_uuid, log_id)        
 
+    @staticmethod
+    def _is_follow(in_data):
+        """
+        Checks if the request asks to follow a log (follow query parameter)
+        """
+        return in_data.get("follow", ["0"])[0] not in ("0", "false")
+
+    def stream_isolate_log(self, request, response, in_data, isolate_uuid, log_id):
+        """
+        Sends the raw content of a log (text/plain), part by part.
+        Query parameters (all optional):
+            offset=<bytes>: first byte to send (negative: from the end)
+            limit=<bytes>: maximum number of bytes to send
+            tail=<lines>: only send the last lines
+            follow=1: wait for new lines, until the client disconnects
+        """
+        try:
+            offset = in_data.get("offset", [None])[0]
+            offset = int(offset) if offset else None
+            limit = in_data.get("limit", [None])[0]
+            limit = int(limit) if limit else None
+            tail = in_data.get("tail", [None])[0]
+            tail = int(tail) if tail else None
+        except ValueError:
+            response.send_content(400, "BAD REQUEST: invalid range", "text/plain")
+            return
+        follow = self._is_follow(in_data)
+
+        part = self._read_isolate_log(isolate_uuid, log_id, offset, limit, tail)
+        response.set_response(200)
+        response.set_header("content-type", "text/plain; charset=UTF-8")
+        response.end_headers()
+
+        deadline = time.time() + self._logs_follow_timeout
+        while True:
+            if part["content"]:
+                response.write(part["content"].encode("UTF-8"))
+            if limit is not None:
+                limit -= part["next"] - part["offset"]
+                if limit <= 0:
+                    break
+            if part["next"] >= part["size"]:
+                if not follow or time.time() > deadline:
+                    break
+                # wait for new lines
+                time.sleep(LOGS_FOLLOW_PERIOD)
+            part = self._read_isolate_log(isolate_uuid, log_id, part["next"], limit)
+
     def get_isolate_directory(self, request, response, in_data, out_data, uuid):
         out_data["isolate"] = {"uuid" : uuid}
         directory = self._get_isolate_directory(uuid)
@@ -342,6 +473,44 @@ class DebugAPI(object):
         accesses = self._get_isolate_accesses(uuid)
         out_data["accesses"] = accesses        
 
+    def get_isolate_jvm(self, request, response, in_data, out_data, uuid):
+        out_data["isolate"] = {"uuid" : uuid}
+        out_data["jvm"] = self._get_isolate_jvm(uuid)
+
+    def get_isolates_batch(self, request, response, in_data, out_data, uuids, queries, timeout=None):
+        """
+        Sends the given queries to the given isolates concurrently.
+        The result of each query is stored in out_data["results"][uid][query],
+        and its error (unknown isolate, timeout, ...) in out_data["errors"][uid][query]
+        """
+        if not isinstance(queries, list):
+            self.bad_request(request, response, in_data, out_data, "queries must be a list")
+            return
+        for query in queries:
+            if query not in BATCH_QUERIES:
+                self.bad_request(request, response, in_data, out_data, "unknown query " + str(query))
+                return
+
+        if timeout is None:
+            timeout = self._batch_timeout
+        try:
+            timeout = float(timeout)
+        except (TypeError, ValueError):
+            self.bad_request(request, response, in_data, out_data, "invalid timeout")
+            return
+        if uuids == BATCH_ALL_ISOLATES:
+            uuids = [self._directory.get_local_peer().uid]
+            uuids.extend(p.uid for p in self._directory.get_peers())
+        elif not isinstance(uuids, list):
+            self.bad_request(request, response, in_data, out_data,
+                             'uids must be a list or "{0}"'.format(BATCH_ALL_ISOLATES))
+            return
+
+        results, errors = self._scatter_gather(uuids, queries, timeout)
+        out_data["results"] = results
+        out_data["errors"] = errors
+        out_data["meta"]["count"] = len(results)
+
 
     """
     POST actions ========================================================================
@@ -416,151 +585,228 @@ class DebugAPI(object):
     Internal agent methods ===========================================================================
     """
 
-    def _get_isolate_detail(self, uuid):
-        lp = self._directory.get_local_peer()
-        if lp.uid != uuid:  
-            # this is another isolate   
-            try:       
-                msg = beans.Message(debug.agent.SUBJECT_GET_ISOLATE_DETAIL)
-                reply = self._herald.send(uuid, msg)
-                return json.loads(reply.content)
-            except KeyError:
-                return None
-        else:
-            # this is the local isolate
-            return json.loads(self._agent.get_isolate_detail())
-
-    def _get_isolate_bundles(self, uuid):
-        lp = self._directory.get_local_peer()
-        if lp.uid != uuid:  
-            # this is another isolate          
-            msg = beans.Message(debug.agent.SUBJECT_GET_BUNDLES)
-            reply = self._herald.send(uuid, msg)
-            return json.loads(reply.content)
-        else:
-            # this is the local isolate
-            return json.loads(self._agent.get_bundles())
-    
-    def _get_bundle_detail(self, uuid, bundle_id):
+    def _query_agent(self, uuid, subject, local_method, content=None,
+                     timeout=None, decode=True):
+        """
+        Queries the debug agent of the given isolate: the local agent is
+        called directly, the other ones are requested using Herald.
+
+        :param uuid: UID of the isolate
+        :param subject: Subject of the Herald message
+        :param local_method: Method of the local agent
+        :param content: Argument of the request (if any)
+        :param timeout: Time to wait for the reply of a remote isolate
+        :param decode: If True, the JSON result of the agent is decoded
+        :return: The (decoded) result of the agent
+        :raise KeyError: Unknown isolate
+        :raise HeraldTimeout: No reply in time
+        """
         lp = self._directory.get_local_peer()
-        if lp.uid != uuid:  
-            # this is another isolate          
-            msg = beans.Message(debug.agent.SUBJECT_GET_BUNDLE_DETAIL, bundle_id)
-            reply = self._herald.send(uuid, msg)
-            return json.loads(reply.content)
-        else:
+        if lp.uid != uuid:
+            # this is another isolate
+            msg = beans.Message(subject, content)
+            result = self._herald.send(uuid, msg, timeout=timeout).content
+        elif content is not None:
             # this is the local isolate
-            return json.loads(self._agent.get_bundle_detail(bundle_id))
-                
-    def _get_isolate_factories(self, uuid):
-        lp = self._directory.get_local_peer()
-        if lp.uid != uuid:  
-            # this is another isolate          
-            msg = beans.Message(debug.agent.SUBJECT_GET_FACTORIES)
-            reply = self._herald.send(uuid, msg)
-            return json.loads(reply.content)
+            result = local_method(content)
         else:
-            # this is the local isolate
-            return json.loads(self._agent.get_factories())
+            result = local_method()
 
-    def _get_factory_detail(self, uuid, factory_name):
-        lp = self._directory.get_local_peer()
-        if lp.uid != uuid:  
-            # this is another isolate          
-            msg = beans.Message(debug.agent.SUBJECT_GET_FACTORY_DETAIL, factory_name)
-            reply = self._herald.send(uuid, msg)
-            return json.loads(reply.content)
-        else:
-            # this is the local isolate
-            return json.loads(self._agent.get_factory_detail(factory_name))
-            
-    def _get_isolate_instances(self, uuid):
-        lp = self._directory.get_local_peer()
-        if lp.uid != uuid:  
-            # this is another isolate          
-            msg = beans.Message(debug.agent.SUBJECT_GET_INSTANCES)
-            reply = self._herald.send(uuid, msg)
-            return json.loads(reply.content)
-        else:
-            # this is the local isolate
-            return json.loads(self._agent.get_instances())
+        if decode:
+            return json.loads(result)
+        return result
 
-    def _get_instance_detail(self, uuid, instance_name):
-        lp = self._directory.get_local_peer()
-        if lp.uid != uuid:  
-            # this is another isolate          
-            msg = beans.Message(debug.agent.SUBJECT_GET_INSTANCE_DETAIL, instance_name)
-            reply = self._herald.send(uuid, msg)
-            return json.loads(reply.content)
-        else:
-            # this is the local isolate
-            return json.loads(self._agent.get_instance_detail(instance_name))
+    def _query_snapshot(self, uuid, subject, name, timeout=None):
+        """
+        Queries a snapshot (bundles, factories, ...) of the debug agent of
+        the given isolate. The version (etag) of the last known snapshot is
+        sent along the request, so that the agent doesn't send it again if
+        it didn't change.
+
+        Agents without snapshot support (e.g. Java ones) reply the raw
+        snapshot, which is not cached.
+
+        :param uuid: UID of the isolate
+        :param subject: Subject of the Herald message
+        :param name: Name of the snapshot (see debug.agent)
+        :param timeout: Time to wait for the reply of a remote isolate
+        :return: A (etag, value) tuple, etag is None for raw snapshots
+        """
+        key = (uuid, name)
+        with self._snapshots_lock:
+            etag, value = self._snapshots.get(key, (None, None))
+
+        request = {debug.agent.SNAPSHOT_ETAG: etag}
+        try:
+            reply = self._query_agent(uuid, subject,
+                                      lambda content: self._agent.get_snapshot(name, etag),
+                                      request, timeout)
+        except KeyError:
+            # unknown isolate: forget its snapshots
+            with self._snapshots_lock:
+                self._snapshots.pop(key, None)
+            raise
+
+        if not isinstance(reply, dict) or debug.agent.SNAPSHOT_ETAG not in reply:
+            # raw snapshot
+            return None, reply
+
+        if reply.get(debug.agent.SNAPSHOT_NOT_MODIFIED) and etag == reply[debug.agent.SNAPSHOT_ETAG]:
+            return etag, value
+
+        etag = reply[debug.agent.SNAPSHOT_ETAG]
+        value = reply.get(debug.agent.SNAPSHOT_CONTENT)
+        with self._snapshots_lock:
+            self._snapshots[key] = (etag, value)
+        return etag, value
+
+    def _scatter_gather(self, uuids, queries, timeout):
+        """
+        Runs the given queries on all the given isolates using the thread
+        pool: the whole batch takes the time of the slowest isolate instead
+        of the sum of all round trips.
+
+        :param uuids: UIDs of the isolates to query
+        :param queries: Names of the queries (keys of BATCH_QUERIES)
+        :param timeout: Maximum time to wait for each isolate, in seconds
+        :return: A (results, errors) tuple of {uid -> {query -> value}} dicts
+        """
+        futures = []
+        for isolate_uid in uuids:
+            for query in queries:
+                method = getattr(self, BATCH_QUERIES[query])
+                started = (threading.Event(), [])
+                futures.append((isolate_uid, query, started,
+                                self._batch_pool.enqueue(self._run_batch_query, started,
+                                                         method, isolate_uid, timeout)))
+
+        results = {}
+        errors = {}
+        # Queued queries wait for the previous ones, which are bounded by
+        # their own timeout: the timeout of a query starts with it
+        rounds = -(-len(futures) // max(1, int(self._batch_max_threads)))
+        start_deadline = time.time() + timeout * rounds
+        for isolate_uid, query, (event, start), future in futures:
+            try:
+                if not event.wait(max(0, start_deadline - time.time())):
+                    errors.setdefault(isolate_uid, {})[query] = "timeout"
+                    continue
+                value = future.result(max(0, start[0] + timeout - time.time()))
+                results.setdefault(isolate_uid, {})[query] = value
+            except OSError as ex:
+                if future.done():
+                    # error raised by the query itself
+                    errors.setdefault(isolate_uid, {})[query] = "{0}: {1}".format(type(ex).__name__, ex)
+                else:
+                    # FutureResult timeout
+                    errors.setdefault(isolate_uid, {})[query] = "timeout"
+            except KeyError:
+                errors.setdefault(isolate_uid, {})[query] = "unknown isolate"
+            except Exception as ex:
+                errors.setdefault(isolate_uid, {})[query] = "{0}: {1}".format(type(ex).__name__, ex)
+        return results, errors
 
-    def _get_isolate_services(self, uuid):
-        lp = self._directory.get_local_peer()
-        if lp.uid != uuid:  
-            # this is another isolate          
-            msg = beans.Message(debug.agent.SUBJECT_GET_SERVICES)
-            reply = self._herald.send(uuid, msg)
-            return json.loads(reply.content)
-        else:
-            # this is the local isolate
-            return json.loads(self._agent.get_services())
+    @staticmethod
+    def _run_batch_query(started, method, isolate_uid, timeout):
+        """
+        Runs a query of a batch in a thread of the pool
 
-    def _get_isolate_threads(self, uuid):
-        lp = self._directory.get_local_peer()
-        if lp.uid != uuid:  
-            # this is another isolate          
-            msg = beans.Message(debug.agent.SUBJECT_GET_THREADS)
-            reply = self._herald.send(uuid, msg)
-            return json.loads(reply.content)
-        else:
-            # this is the local isolate
-            return json.loads(self._agent.get_threads())
-    	
-    def _get_isolate_logs(self, uuid):
-        lp = self._directory.get_local_peer()
-        if lp.uid != uuid:  
-            # this is another isolate          
-            msg = beans.Message(debug.agent.SUBJECT_GET_ISOLATE_LOGS)
-            reply = self._herald.send(uuid, msg)
-            return json.loads(reply.content)
-        else:
-            # this is the local isolate
-            return json.loads(self._agent.get_isolate_logs())
-            
-    def _get_isolate_log(self, uuid, log_id):
-        lp = self._directory.get_local_peer()
-        if lp.uid != uuid:  
-            # this is another isolate          
-            msg = beans.Message(debug.agent.SUBJECT_GET_ISOLATE_LOG, log_id)
-            reply = self._herald.send(uuid, msg)
-            return json.loads(reply.content)
-        else:
-            # this is the local isolate
-            return json.loads(self._agent.get_isolate_log(log_id))
+        :param started: An (event, list) tuple: the event is set when the
+                        query starts, and its start time added to the list
+        """
+        started[1].append(time.time())
+        started[0].set()
+        return method(isolate_uid, timeout)
 
-    def _get_isolate_directory(self, uuid):
-        lp = self._directory.get_local_peer()
-        if lp.uid != uuid:  
-            # this is another isolate          
-            msg = beans.Message(debug.agent.SUBJECT_GET_ISOLATE_DIRECTORY)
-            reply = self._herald.send(uuid, msg)
-            return reply.content
-        else:
-            # this is the local isolate
-            return self._agent.get_isolate_directory()
+    def _get_isolate_detail(self, uuid, timeout=None):
+        return self._query_agent(uuid, debug.agent.SUBJECT_GET_ISOLATE_DETAIL,
+                                 self._agent.get_isolate_detail, timeout=timeout)
 
-    def _get_isolate_accesses(self, uuid):
-        lp = self._directory.get_local_peer()
-        if lp.uid != uuid:  
-            # this is another isolate          
-            msg = beans.Message(debug.agent.SUBJECT_GET_ISOLATE_ACCESSES)
-            reply = self._herald.send(uuid, msg)            
-            return json.loads(reply.content)
-        else:
-            # this is the local isolate
-            return json.loads(self._agent.get_isolate_accesses())
+    def _get_isolate_bundles(self, uuid, timeout=None):
+        return self._query_snapshot(uuid, debug.agent.SUBJECT_GET_BUNDLES, debug.agent.SNAPSHOT_BUNDLES,
+                                    timeout)[1]
+
+    def _get_bundle_detail(self, uuid, bundle_id, timeout=None):
+        return self._query_agent(uuid, debug.agent.SUBJECT_GET_BUNDLE_DETAIL, self._agent.get_bundle_detail,
+                                 bundle_id, timeout)
+
+    def _get_isolate_factories(self, uuid, timeout=None):
+        return self._query_snapshot(uuid, debug.agent.SUBJECT_GET_FACTORIES, debug.agent.SNAPSHOT_FACTORIES,
+                                    timeout)[1]
+
+    def _get_factory_detail(self, uuid, factory_name, timeout=None):
+        return self._query_agent(uuid, debug.agent.SUBJECT_GET_FACTORY_DETAIL, self._agent.get_factory_detail,
+                                 factory_name, timeout)
+
+    def _get_isolate_instances(self, uuid, timeout=None):
+        return self._query_snapshot(uuid, debug.agent.SUBJECT_GET_INSTANCES, debug.agent.SNAPSHOT_INSTANCES,
+                                    timeout)[1]
+
+    def _get_instance_detail(self, uuid, instance_name, timeout=None):
+        return self._query_agent(uuid, debug.agent.SUBJECT_GET_INSTANCE_DETAIL, self._agent.get_instance_detail,
+                                 instance_name, timeout)
+
+    def _get_isolate_services(self, uuid, timeout=None):
+        return self._query_snapshot(uuid, debug.agent.SUBJECT_GET_SERVICES, debug.agent.SNAPSHOT_SERVICES,
+                                    timeout)[1]
+
+    def _get_isolate_threads(self, uuid, timeout=None):
+        return self._query_agent(uuid, debug.agent.SUBJECT_GET_THREADS, self._agent.get_threads,
+                                 timeout=timeout)
+
+    def _get_isolate_logs(self, uuid, timeout=None):
+        return self._query_agent(uuid, debug.agent.SUBJECT_GET_ISOLATE_LOGS, self._agent.get_isolate_logs,
+                                 timeout=timeout)
+
+    def _get_isolate_log(self, uuid, log_id, timeout=None):
+        return self._query_agent(uuid, debug.agent.SUBJECT_GET_ISOLATE_LOG, self._agent.get_isolate_log,
+                                 log_id, timeout)
+
+    def _read_isolate_log(self, uuid, log_id, offset=None, limit=None, tail=None):
+        """
+        Reads a part of a log of the given isolate (see
+        DebugAgent.read_isolate_log). Agents which can't read parts of logs
+        send the whole log, which is then cut here.
+
+        :return: A dictionary: offset, next offset, size of the log, content
+        """
+        if uuid not in self._legacy_log_agents:
+            request = {"log_id": log_id, "offset": offset, "limit": limit, "tail": tail}
+            try:
+                return self._query_agent(
+                    uuid, debug.agent.SUBJECT_READ_ISOLATE_LOG,
+                    lambda content: self._agent.read_isolate_log(**content), request)
+            except (herald.exceptions.NoListener, ValueError, TypeError):
+                _logger.debug("Isolate %s can't read parts of logs", uuid)
+                self._legacy_log_agents.add(uuid)
+
+        content = self._get_isolate_log(uuid, log_id)["content"]
+        size = len(content)
+        if tail is not None:
+            lines = content.splitlines(True)
+            offset = size - sum(len(line) for line in lines[-tail:]) if tail > 0 else size
+        elif offset is None:
+            offset = 0
+        elif offset < 0:
+            offset = max(0, size + offset)
+        offset = min(offset, size)
+        end = size if limit is None else min(size, offset + limit)
+        return {"offset": offset, "next": end, "size": size,
+                "content": content[offset:end]}
+
+    def _get_isolate_directory(self, uuid, timeout=None):
+        # the directory dump is not JSON encoded by the agent
+        return self._query_agent(uuid, debug.agent.SUBJECT_GET_ISOLATE_DIRECTORY,
+                                 self._agent.get_isolate_directory,
+                                 timeout=timeout, decode=False)
+
+    def _get_isolate_accesses(self, uuid, timeout=None):
+        return self._query_agent(uuid, debug.agent.SUBJECT_GET_ISOLATE_ACCESSES, self._agent.get_isolate_accesses,
+                                 timeout=timeout)
+
+    def _get_isolate_jvm(self, uuid, timeout=None):
+        return self._query_agent(uuid, debug.agent.SUBJECT_GET_JVM_STATISTICS, self._agent.get_jvm_statistics,
+                                 timeout=timeout)
 
     def _set_isolate_logs_level(self, uuid, level):
         lp = self._directory.get_local_peer()
@@ -606,6 +852,119 @@ class DebugAPI(object):
     Servlet (url mapping to rest api) ================================================================
     """
 
+    def _setup_routes(self):
+        """
+        Prepares the routes table of the API
+        """
+        routes = restapi.routes.Router("debug", DEBUG_REST_API_PATH)
+        # GET
+        routes.add("GET", "", self.get_api_info)
+        routes.add("GET", "auth", self._route_auth_info, "get_auth_info")
+        routes.add("GET", "metrics", self.get_metrics)
+        routes.add("GET", "platform", self.get_platform_details)
+        routes.add("GET", "application", self.get_application_details)
+        routes.add("GET", "application/composition", self.get_application_composition)
+        routes.add("GET", "isolates", self.get_isolates)
+        routes.add("GET", "isolates/" + BATCH_ALL_ISOLATES, self._route_isolates_batch,
+                   "get_isolates_batch")
+        # e.g. isolates/*/threads?uids=uid1,uid2&timeout=2
+        routes.add("GET", "isolates/" + BATCH_ALL_ISOLATES + "/{query}",
+                   self._route_isolates_batch_query, "get_isolates_batch")
+        routes.add("GET", "isolates/{uuid}", self.get_isolate)
+        routes.add("GET", "isolates/{uuid}/bundles", self.get_isolate_bundles)
+        routes.add("GET", "isolates/{uuid}/factories", self.get_isolate_factories)
+        routes.add("GET", "isolates/{uuid}/instances", self.get_isolate_instances)
+        routes.add("GET", "isolates/{uuid}/services", self.get_isolate_services)
+        routes.add("GET", "isolates/{uuid}/threads", self.get_isolate_threads)
+        routes.add("GET", "isolates/{uuid}/logs", self.get_isolate_logs)
+        routes.add("GET", "isolates/{uuid}/directory", self.get_isolate_directory)
+        routes.add("GET", "isolates/{uuid}/accesses", self.get_isolate_accesses)
+        routes.add("GET", "isolates/{uuid}/jvm", self.get_isolate_jvm)
+        routes.add("GET", "isolates/{uuid}/bundles/{bundle}", self.get_bundle_detail)
+        routes.add("GET", "isolates/{uuid}/factories/{factory}", self.get_factory_detail)
+        routes.add("GET", "isolates/{uuid}/instances/{instance}", self.get_instance_detail)
+        routes.add("GET", "isolates/{uuid}/logs/{log}", self._route_isolate_log, "get_isolate_log")
+        # POST
+        routes.add("POST", "auth/login", self.auth_login)
+        routes.add("POST", "auth/logout", self.auth_logout)
+        routes.add("POST", "isolates/batch", self._route_isolates_batch_post, "get_isolates_batch")
+        routes.add("POST", "isolates/{uuid}/logs/level", self._route_set_logs_level,
+                   "set_isolate_logs_level")
+        return routes
+
+    def _route_auth_info(self, request, response, in_data, out_data):
+        self.get_auth_info(request, response, in_data, out_data, out_data["meta"]["session"])
+
+    def _route_isolates_batch(self, request, response, in_data, out_data):
+        self.get_isolates_batch(request, response, in_data, out_data,
+                                BATCH_ALL_ISOLATES, ["isolate"],
+                                in_data.get("timeout", [None])[0])
+
+    def _route_isolates_batch_query(self, request, response, in_data, out_data, query):
+        uuids = BATCH_ALL_ISOLATES
+        if in_data.get("uids", [""])[0]:
+            uuids = in_data["uids"][0].split(",")
+        self.get_isolates_batch(request, response, in_data, out_data,
+                                uuids, [query], in_data.get("timeout", [None])[0])
+
+    def _route_isolate_log(self, request, response, in_data, out_data, uuid, log_id):
+        """
+        Returns True if the log has been streamed (response already sent)
+        """
+        if set(in_data).intersection(('raw', 'offset', 'limit', 'tail', 'follow')):
+            # send raw log, part by part
+            self.stream_isolate_log(request, response, in_data, uuid, log_id)
+            return True
+        # send log within a json object data["log"]
+        self.get_isolate_log(request, response, in_data, out_data, uuid, log_id)
+
+    def _route_isolates_batch_post(self, request, response, in_data, out_data):
+        """
+        request data:
+        {
+            "uids": ["uid1", "uid2"], # or "*" for all isolates
+            "queries": ["bundles", "threads"],
+            "timeout": 5 # per isolate, in seconds (optional)
+        }
+        """
+        if in_data and "uids" in in_data and "queries" in in_data:
+            self.get_isolates_batch(request, response, in_data, out_data,
+                                    in_data["uids"], in_data["queries"],
+                                    in_data.get("timeout"))
+        else:
+            self.bad_request(request, response, in_data, out_data, "uids and queries must be provided!")
+
+    def _route_set_logs_level(self, request, response, in_data, out_data, uuid):
+        if 'logLevel' in in_data:
+            self.set_isolate_logs_level(request, response, in_data, out_data, uuid)
+        else:
+            self.bad_request(request, response, in_data, out_data, "no logLevel parameter provided!")
+
+    def _check_session(self, request, response, in_data, out_data):
+        """
+        Checks the session cookie of the request. Sets the 401 status of the
+        response if it is missing or has expired.
+
+        :return: True if the session is valid
+        """
+        if not request.get_header("Cookie"):
+            out_data["meta"]["status"] = 401
+            out_data["meta"]["msg"] = "Unauthorized - request cookie not provided!"
+            return False
+
+        session_id = restapi.routes.get_session_id(request)
+        if not session_id:
+            out_data["meta"]["status"] = 401
+            out_data["meta"]["msg"] = "Unauthorized - session cookie no provided!"
+            return False
+
+        out_data["meta"]["session"] = session_id
+        if self.check_session_timeout(request, response, in_data, out_data, session_id) != False:
+            out_data["meta"]["status"] = 401
+            out_data["meta"]["msg"] = "Unauthorized - session timeout!"
+            return False
+        return True
+
     def do_GET(self, request, response):
         """
         Handle a GET
@@ -613,115 +972,23 @@ class DebugAPI(object):
         path, parts, in_data = self.decrypt_request(request)
 
         out_data = self.prepare_response(request, "GET")
-        
-        # check session
-        cookies = request.get_header("Cookie")
-        if cookies:
-            cookie = Cookie.SimpleCookie()
-            cookie.load(cookies)
-            session_id = cookie["session"].value
-            if session_id:
-                out_data["meta"]["session"] = session_id
-                if self.check_session_timeout(request, response, in_data, out_data, session_id) == False:                    
-                    # valid session                
-                    if path.startswith(DEBUG_REST_API_PATH):
-                        if path.startswith(DEBUG_REST_API_PATH + "/auth"):
-                            out_data["meta"]["api-method"] = "get_auth_info"
-                            self.get_auth_info(request, response, in_data, out_data, session_id)
-                        elif path == DEBUG_REST_API_PATH:                            
-                            out_data["meta"]["api-method"] = "get_api_info"            
-                            self.get_api_info(request, response, in_data, out_data)
-                        elif path == DEBUG_REST_API_PATH + "/platform":
-                            out_data["meta"]["api-method"] = "get_platform_details"
-                            self.get_platform_details(request, response, in_data, out_data)
-                        elif path == DEBUG_REST_API_PATH + "/application":
-                            out_data["meta"]["api-method"] = "get_application_details"
-                            self.get_application_details(request, response, in_data, out_data)    
-                        elif path == DEBUG_REST_API_PATH + "/isolates":
-                            out_data["meta"]["api-method"] = "get_isolates"
-                            self.get_isolates(request, response, in_data, out_data)
-
-                        elif len(parts) == 5:    
-                            if path == DEBUG_REST_API_PATH + "/application/composition":
-                                out_data["meta"]["api-method"] = "get_application_composition"
-                                self.get_application_composition(request, response, in_data, out_data)
-                            elif path == DEBUG_REST_API_PATH + "/isolates/" + parts[4]:
-                                out_data["meta"]["api-method"] = "get_isolate"
-                                self.get_isolate(request, response, in_data, out_data, parts[4])
-                            else:
-                                self.bad_request(request, response, in_data, out_data)
-                        
-                        elif len(parts) == 6:
-                            if path == DEBUG_REST_API_PATH + "/isolates/" + parts[4] + "/bundles":
-                                out_data["meta"]["api-method"] = "get_isolate_bundles"
-                                self.get_isolate_bundles(request, response, in_data, out_data, parts[4])
-                            
-                            elif path == DEBUG_REST_API_PATH + "/isolates/" + parts[4] + "/factories":
-                                out_data["meta"]["api-method"] = "get_isolate_factories"
-                                self.get_isolate_factories(request, response, in_data, out_data, parts[4])
-                                        
-                            elif path == DEBUG_REST_API_PATH + "/isolates/" + parts[4] + "/instances":
-                                out_data["meta"]["api-method"] = "get_isolate_instances"
-                                self.get_isolate_instances(request, response, in_data, out_data, parts[4])
-                                    
-                            elif path == DEBUG_REST_API_PATH + "/isolates/" + parts[4] + "/services":
-                                out_data["meta"]["api-method"] = "get_isolate_services"
-                                self.get_isolate_services(request, response, in_data, out_data, parts[4])
-                            
-                            elif path == DEBUG_REST_API_PATH + "/isolates/" + parts[4] + "/threads":
-                                out_data["meta"]["api-method"] = "get_isolate_threads"
-                                self.get_isolate_threads(request, response, in_data, out_data, parts[4])
-                            elif path == DEBUG_REST_API_PATH + "/isolates/" + parts[4] + "/logs":
-                                out_data["meta"]["api-method"] = "get_isolate_logs"
-                                self.get_isolate_logs(request, response, in_data, out_data, parts[4])
-                            elif path == DEBUG_REST_API_PATH + "/isolates/" + parts[4] + "/directory":
-                                out_data["meta"]["api-method"] = "get_isolate_directory"
-                                self.get_isolate_directory(request, response, in_data, out_data, parts[4])
-                            elif path == DEBUG_REST_API_PATH + "/isolates/" + parts[4] + "/accesses":
-                                out_data["meta"]["api-method"] = "get_isolate_accesses"
-                                self.get_isolate_accesses(request, response, in_data, out_data, parts[4])
-
-                        elif len(parts) == 7:
-                            if path == DEBUG_REST_API_PATH + "/isolates/" + parts[4] + "/bundles/" + parts[6]:
-                                out_data["meta"]["api-method"] = "get_bundle_detail"
-                                self.get_bundle_detail(request, response, in_data, out_data, parts[4], parts[6])
-                            elif path == DEBUG_REST_API_PATH + "/isolates/" + parts[4] + "/factories/" + parts[6]:
-                                out_data["meta"]["api-method"] = "get_factory_detail"
-                                self.get_factory_detail(request, response, in_data, out_data, parts[4], parts[6])
-                            elif path == DEBUG_REST_API_PATH + "/isolates/" + parts[4] + "/instances/" + parts[6]:
-                                out_data["meta"]["api-method"] = "get_instance_detail"
-                                self.get_instance_detail(request, response, in_data, out_data, parts[4], parts[6])
-                            elif path == DEBUG_REST_API_PATH + "/isolates/" + parts[4] + "/logs/" + parts[6]:
-                                if 'raw' in in_data:
-                                    # send raw log
-                                    log = self._get_isolate_log(parts[4], parts[6])
-                                    self.send_text(log["content"], response, 200)
-                                else:
-                                    # send log within a json object data["log"]
-                                    out_data["meta"]["api-method"] = "get_isolate_log"
-                                    self.get_isolate_log(request, response, in_data, out_data, parts[4], parts[6])
-                        else:
-                            self.bad_request(request, response, in_data, out_data)
-
-                    else:
-                        self.bad_request(request, response, in_data, out_data)
-                
-                else:
-                    # session timeout
-                    out_data["meta"]["status"] = 401
-                    out_data["meta"]["msg"] = "Unauthorized - session timeout!" 
+
+        if self._check_session(request, response, in_data, out_data):
+            # valid session
+            route, args = self._routes.match("GET", path)
+            if route is not None:
+                out_data["meta"]["api-method"] = route.name
+                # followed logs are streamed as long as the client listens
+                if route(request, response, in_data, out_data, *args,
+                         timed=not self._is_follow(in_data)):
+                    # the response has already been sent
+                    out_data = None
             else:
-                # session timeout
-                out_data["meta"]["status"] = 401
-                out_data["meta"]["msg"] = "Unauthorized - session cookie no provided!"
-        else:
-            # session timeout
-            out_data["meta"]["status"] = 401
-            out_data["meta"]["msg"] = "Unauthorized - request cookie not provided!" 
-                
-        self.send_json(out_data, response)
+                self.bad_request(request, response, in_data, out_data)
+
+        if out_data is not None:
+            self.send_json(out_data, request, response)
 
-    
     def do_POST(self, request, response):
         """
         Handle a POST
@@ -730,36 +997,16 @@ class DebugAPI(object):
 
         out_data = self.prepare_response(request, "POST")
 
-        if path.startswith(DEBUG_REST_API_PATH): 
-            if path.startswith(DEBUG_REST_API_PATH + "/auth/login"):
-                out_data["meta"]["api-method"] = "auth_login"
-                self.auth_login(request, response, in_data, out_data)
-            elif path.startswith(DEBUG_REST_API_PATH + "/auth/logout"):
-                out_data["meta"]["api-method"] = "auth_logout"
-                self.auth_logout(request, response, in_data, out_data)
-            elif len(parts) == 7:
-                if path == DEBUG_REST_API_PATH + "/isolates/" + parts[4] + "/logs/level":
-                    out_data["meta"]["api-method"] = "set_isolate_logs_level"
-                    # check session
-                    cookies = request.get_header("Cookie")
-                    if cookies:
-                        cookie = Cookie.SimpleCookie()
-                        cookie.load(cookies)
-                        session_id = cookie["session"].value
-                        if session_id:
-                            out_data["meta"]["session"] = session_id
-                            if self.check_session_timeout(request, response, in_data, out_data, session_id) == False: 
-                                if 'logLevel' in in_data:                                           
-                                    self.set_isolate_logs_level(request, response, in_data, out_data, parts[4])
-                                else:
-                                    self.bad_request(request, response, in_data, out_data, "no logLevel parameter provided!")
-            else:
-                self.bad_request(request, response, in_data, out_data)
-
+        route, args = self._routes.match("POST", path)
+        if route is not None:
+            out_data["meta"]["api-method"] = route.name
+            if route.name in PUBLIC_API_METHODS \
+                    or self._check_session(request, response, in_data, out_data):
+                route(request, response, in_data, out_data, *args)
         else:
             self.bad_request(request, response, in_data, out_data)
 
-        self.send_json(out_data, response)
+        self.send_json(out_data, request, response)
 
     """
 	iPOPO STUFF --------------------------------------------------------------------------------------------------------
@@ -769,11 +1016,16 @@ class DebugAPI(object):
     def validate(self, context):
         _logger.info("Debug REST API validated")
         self._context = context
+        self._batch_pool = pelix.threadpool.ThreadPool(
+            max(1, int(self._batch_max_threads)), logname="debug-api-batch")
+        self._batch_pool.start()
 
 
     @Invalidate
     def invalidate(self, context):
         _logger.info("Debug REST API invalidated")
+        self._batch_pool.stop()
+        self._batch_pool = None
 
 
     def bound_to(self, path, params):
@@ -0,0 +1,744 @@
+#!/usr/bin/env python
+# -- Content-Encoding: UTF-8 --
+"""
+COHORTE logs archive.
+
+The logs of the forker (``var/forker.log``) and of the isolates
+(``var/<isolate>/<id>-<uid>/log_<isolate>.log``) are rotated when they
+reach a maximum size or age. Rotated segments are compressed with gzip in
+a background thread, and old segments and runs (previous executions of an
+isolate) are removed according to a retention policy.
+
+Each log owner keeps an index (``var/logs-index.json`` for the forker,
+``var/<isolate>/logs-index.json`` for an isolate) describing its runs and
+their segments: file, time range and position in the log stream. The debug
+agent uses it to list and read the logs without scanning the directories.
+
+Offsets are positions in the whole log stream of a run: a segment starts
+at the offset where the previous one ended, and the live log file starts
+at the end of the last segment. They stay valid when old segments are
+removed.
+
+When installed as a bundle (see ``conf/boot-common.js``), this module
+rotates the log of its isolate.
+
+Rotation renames the live file and makes the logging handlers of the
+process open a new one, without losing any line. A live file which is not
+written by a handler of this process (e.g. the output of the forker
+redirected by the start script) is copied then truncated instead: lines
+written by its owner between the end of the copy and the truncation are
+lost.
+
+:author: Bassem Debbabi
+:license: Apache Software License 2.0
+
+..
+
+    Copyright 2015 isandlaTech
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Documentation strings format
+__docformat__ = "restructuredtext en"
+
+# Boot module version
+__version__ = "1.0.0"
+
+# ------------------------------------------------------------------------------
+
+# Cohorte
+import cohorte
+
+# Standard library
+import glob
+import gzip
+import json
+import logging
+import os
+import shutil
+import threading
+import time
+
+try:
+    # Python 3
+    import queue
+except ImportError:
+    # Python 2
+    import Queue as queue
+
+# ------------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+
+INDEX_FILE = "logs-index.json"
+""" Name of the logs index file """
+
+INDEX_FORMAT = 1
+""" Version of the index format """
+
+FORKER_LOG_ID = "000"
+""" ID of the forker log run """
+
+PROP_MAX_SIZE = "cohorte.logs.max_size"
+""" Framework property: maximum size of a log segment (bytes) """
+
+PROP_MAX_AGE = "cohorte.logs.max_age"
+""" Framework property: maximum age of a log segment (seconds) """
+
+PROP_MAX_SEGMENTS = "cohorte.logs.max_segments"
+""" Framework property: number of segments kept per run """
+
+PROP_MAX_RUNS = "cohorte.logs.max_runs"
+""" Framework property: number of runs kept per isolate """
+
+PROP_RETENTION = "cohorte.logs.retention"
+""" Framework property: time during which segments and runs are kept (s) """
+
+DEFAULT_MAX_SIZE = 10 * 1024 * 1024
+DEFAULT_MAX_AGE = 24 * 3600
+DEFAULT_MAX_SEGMENTS = 10
+DEFAULT_MAX_RUNS = 5
+DEFAULT_RETENTION = 7 * 24 * 3600
+
+CHECK_PERIOD = 60
+""" Period of the checks of the size of the live log (seconds) """
+
+# ------------------------------------------------------------------------------
+
+
+def get_index_path(base, kind, name):
+    """
+    Returns the path to the logs index of the given isolate
+
+    :param base: COHORTE base directory
+    :param kind: Kind of isolate ("forker" for forkers)
+    :param name: Name of the isolate
+    """
+    if kind == "forker":
+        return os.path.join(base, "var", INDEX_FILE)
+    return os.path.join(base, "var", name, INDEX_FILE)
+
+
+def format_time(timestamp):
+    """
+    Formats a timestamp as shown in the debug API
+    """
+    return time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(timestamp))
+
+
+class LogIndex(object):
+    """
+    Index of the logs of an isolate: runs and segments. Paths are relative
+    to the directory of the index.
+    """
+    def __init__(self, path):
+        """
+        Sets up members
+
+        :param path: Path to the index file
+        """
+        self.path = path
+        self.directory = os.path.dirname(path)
+        self._lock = threading.RLock()
+        # Log ID -> run
+        self._runs = {}
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads the index file, if any
+
+        :param path: Path to the index file
+        :return: A LogIndex (empty if the file doesn't exist or is invalid)
+        """
+        index = cls(path)
+        try:
+            with open(path) as index_file:
+                content = json.load(index_file)
+            if content.get("format") == INDEX_FORMAT:
+                index._runs = content["runs"]
+        except (IOError, OSError, ValueError, KeyError):
+            pass
+        return index
+
+    def save(self):
+        """
+        Writes the index file, replacing the previous one at once
+        """
+        with self._lock:
+            content = json.dumps({"format": INDEX_FORMAT, "runs": self._runs},
+                                 indent=1, sort_keys=True)
+            tmp_path = "{0}.{1}.tmp".format(self.path, os.getpid())
+            with open(tmp_path, "w") as index_file:
+                index_file.write(content)
+            if os.name == "nt" and os.path.exists(self.path):
+                os.remove(self.path)
+            os.rename(tmp_path, self.path)
+
+    def get_path(self, relative):
+        """
+        Returns the absolute path of a file of the index
+        """
+        return os.path.join(self.directory, relative)
+
+    def get_runs(self):
+        """
+        Returns the runs, the oldest first
+
+        :return: A list of (log ID, run) tuples
+        """
+        with self._lock:
+            return sorted(self._runs.items(), key=lambda item: item[1]["start"])
+
+    def get_run(self, log_id):
+        """
+        Returns a copy of the given run
+
+        :raise KeyError: Unknown run
+        """
+        with self._lock:
+            run = dict(self._runs[log_id])
+            run["segments"] = [dict(segment)
+                               for segment in run["segments"]]
+            return run
+
+    def add_run(self, log_id, live, start=None):
+        """
+        Adds a run, or reuses the existing one with the same ID (restarted
+        isolate appending to its log)
+
+        :param log_id: ID of the run
+        :param live: Path to the live log file, relative to the index
+        :param start: Start time of the run
+        :return: The files of the replaced run with the same ID, if any
+        """
+        if start is None:
+            start = time.time()
+        with self._lock:
+            run = self._runs.get(log_id)
+            if run is not None and run["live"] == live:
+                run["end"] = None
+                return []
+
+            replaced = self._drop_run(log_id) if run is not None else []
+            self._runs[log_id] = {"live": live, "start": start,
+                                  "end": None, "live_start": start,
+                                  "live_offset": 0, "sequence": 0,
+                                  "segments": []}
+            return replaced
+
+    def end_run(self, log_id, end=None):
+        """
+        Sets the end time of a run
+        """
+        with self._lock:
+            run = self._runs.get(log_id)
+            if run is not None:
+                run["end"] = end or time.time()
+
+    def remove_run(self, log_id):
+        """
+        Removes a run from the index
+
+        :return: The removed run, or None
+        """
+        with self._lock:
+            return self._runs.pop(log_id, None)
+
+    def add_segment(self, log_id, file_name, size, end=None):
+        """
+        Adds a segment at the end of a run. The live log now starts after it.
+
+        :param log_id: ID of the run
+        :param file_name: Segment file, relative to the index
+        :param size: Size of the (uncompressed) segment
+        :param end: Time of the rotation
+        :return: The new segment
+        """
+        if end is None:
+            end = time.time()
+        with self._lock:
+            run = self._runs[log_id]
+            segment = {"file": file_name, "start": run["live_start"],
+                       "end": end, "offset": run["live_offset"],
+                       "size": size, "compressed": False}
+            run["segments"].append(segment)
+            run["live_start"] = end
+            run["live_offset"] += size
+            return segment
+
+    def set_compressed(self, log_id, file_name, compressed_name):
+        """
+        Updates a segment once compressed
+
+        :return: False if the segment isn't in the index anymore
+        """
+        with self._lock:
+            run = self._runs.get(log_id)
+            for segment in run["segments"] if run else ():
+                if segment["file"] == file_name:
+                    segment["file"] = compressed_name
+                    segment["compressed"] = True
+                    return True
+            return False
+
+    def next_sequence(self, log_id):
+        """
+        Returns the next segment number of a run
+        """
+        with self._lock:
+            run = self._runs[log_id]
+            run["sequence"] += 1
+            return run["sequence"]
+
+    def get_first_offset(self, log_id):
+        """
+        Returns the offset of the first kept byte of the log stream of a run
+        """
+        run = self.get_run(log_id)
+        if run["segments"]:
+            return run["segments"][0]["offset"]
+        return run["live_offset"]
+
+    def get_size(self, log_id):
+        """
+        Returns the offset of the end of the log stream of a run
+        """
+        run = self.get_run(log_id)
+        try:
+            live_size = os.path.getsize(self.get_path(run["live"]))
+        except OSError:
+            live_size = 0
+        return run["live_offset"] + live_size
+
+    def locate(self, log_id, offset):
+        """
+        Finds the part of a run (segment or live file) containing the given
+        offset of the log stream
+
+        :param log_id: ID of the run
+        :param offset: Offset in the log stream
+        :return: A (path, compressed, part offset, part size) tuple. Offsets
+                 before the first kept segment give the first segment.
+        :raise KeyError: Unknown run
+        """
+        run = self.get_run(log_id)
+        for segment in run["segments"]:
+            if offset < segment["offset"] + segment["size"]:
+                return (self.get_path(segment["file"]),
+                        segment["compressed"], segment["offset"],
+                        segment["size"])
+
+        live = self.get_path(run["live"])
+        try:
+            size = os.path.getsize(live)
+        except OSError:
+            size = 0
+        return live, False, run["live_offset"], size
+
+    def apply_retention(self, max_segments, retention, max_runs=None,
+                        keep=None):
+        """
+        Removes the segments and runs which must not be kept anymore
+
+        :param max_segments: Maximum number of segments per run
+        :param retention: Maximum age of segments and ended runs (seconds)
+        :param max_runs: Maximum number of ended runs (None: no limit)
+        :param keep: ID of the current run, never removed
+        :return: The list of removed files, relative to the index
+        """
+        removed = []
+        limit = time.time() - retention
+        with self._lock:
+            for log_id, run in list(self._runs.items()):
+                segments = run["segments"]
+                while segments and (len(segments) > max_segments
+                                    or segments[0]["end"] < limit):
+                    removed.append(segments.pop(0)["file"])
+
+                if log_id != keep and run["end"] is not None \
+                        and run["end"] < limit:
+                    removed.extend(self._drop_run(log_id))
+
+            if max_runs is not None:
+                ended = [log_id for log_id, run in self.get_runs()
+                         if log_id != keep]
+                for log_id in ended[:max(0, len(ended) - max_runs)]:
+                    removed.extend(self._drop_run(log_id))
+        return removed
+
+    def _drop_run(self, log_id):
+        """
+        Removes a run from the index
+
+        :return: The files of the run
+        """
+        run = self._runs.pop(log_id)
+        return [segment["file"] for segment in run["segments"]] \
+            + [run["live"]]
+
+
+def open_part(path, compressed):
+    """
+    Opens a segment or live log file for reading, in binary mode
+    """
+    if compressed:
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_run(index, log_id):
+    """
+    Reads the whole log stream of a run
+
+    :return: The content of the kept segments and of the live file (bytes)
+    :raise IOError: A segment can't be read: the index is outdated (the
+                    segment has been compressed or removed since it was
+                    loaded)
+    """
+    run = index.get_run(log_id)
+    data = []
+    for segment in run["segments"]:
+        with open_part(index.get_path(segment["file"]),
+                       segment["compressed"]) as part:
+            data.append(part.read())
+
+    try:
+        with open_part(index.get_path(run["live"]), False) as part:
+            data.append(part.read())
+    except (IOError, OSError) as ex:
+        _logger.debug("Can't read live log %s: %s", run["live"], ex)
+    return b"".join(data)
+
+
+def _remove_files(directory, files):
+    """
+    Removes files of an index and the directories they leave empty
+    """
+    for relative in files:
+        path = os.path.join(directory, relative)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+        parent = os.path.dirname(path)
+        while parent and os.path.abspath(parent) != \
+                os.path.abspath(directory):
+            try:
+                os.rmdir(parent)
+            except OSError:
+                break
+            parent = os.path.dirname(parent)
+
+# ------------------------------------------------------------------------------
+
+
+class LogArchive(object):
+    """
+    Rotates the live log file of a run
+    """
+    def __init__(self, index, log_id, max_size=DEFAULT_MAX_SIZE,
+                 max_age=DEFAULT_MAX_AGE):
+        """
+        Sets up members
+
+        :param index: The LogIndex of the run
+        :param log_id: ID of the run
+        :param max_size: Maximum size of the live log file
+        :param max_age: Maximum age of the live log file
+        """
+        self._index = index
+        self._log_id = log_id
+        self._max_size = max_size
+        self._max_age = max_age
+        self._live = index.get_path(index.get_run(log_id)["live"])
+
+        # Segments to compress: (file name, path)
+        self._pending = queue.Queue()
+        self._compressor = None
+
+    def start(self):
+        """
+        Starts the compression thread, and compresses the segments left
+        uncompressed by a previous run
+        """
+        self._compressor = threading.Thread(target=self._compress_loop,
+                                            name="cohorte-logs-gzip")
+        self._compressor.daemon = True
+        self._compressor.start()
+
+        for log_id, run in self._index.get_runs():
+            for segment in run["segments"]:
+                if not segment["compressed"]:
+                    self._pending.put((log_id, segment["file"]))
+
+    def stop(self):
+        """
+        Stops the compression thread, after the pending segments
+        """
+        if self._compressor is not None:
+            self._pending.put(None)
+            self._compressor.join()
+            self._compressor = None
+
+    def needs_rotation(self):
+        """
+        Checks if the live log file reached its maximum size or age
+        """
+        try:
+            size = os.path.getsize(self._live)
+        except OSError:
+            return False
+        if size == 0:
+            return False
+        return size >= self._max_size or time.time() \
+            - self._index.get_run(self._log_id)["live_start"] >= self._max_age
+
+    def rotate(self):
+        """
+        Moves the content of the live log file to a new segment
+
+        :return: The new segment, or None if the live file is empty
+        """
+        sequence = self._index.next_sequence(self._log_id)
+        live_name = self._index.get_run(self._log_id)["live"]
+        file_name = "{0}.{1}".format(live_name, sequence)
+        path = self._index.get_path(file_name)
+
+        if not _reopen_handlers(self._live, path):
+            # the log isn't written by this process: copy and truncate it.
+            # Truncate right after the last read, to keep the window where
+            # new lines are lost as short as possible.
+            with open(self._live, "r+b") as live_file:
+                with open(path, "wb") as segment_file:
+                    shutil.copyfileobj(live_file, segment_file)
+                live_file.truncate(0)
+
+        size = os.path.getsize(path)
+        if size == 0:
+            os.remove(path)
+            return None
+
+        segment = self._index.add_segment(self._log_id, file_name, size)
+        self._index.save()
+        self._pending.put((self._log_id, file_name))
+        return segment
+
+    def _compress_loop(self):
+        """
+        Compresses the rotated segments, in the background
+        """
+        while True:
+            item = self._pending.get()
+            if item is None:
+                return
+
+            log_id, file_name = item
+            path = self._index.get_path(file_name)
+            try:
+                with open(path, "rb") as source:
+                    with gzip.open(path + ".gz", "wb") as target:
+                        shutil.copyfileobj(source, target)
+                if self._index.set_compressed(log_id, file_name,
+                                              file_name + ".gz"):
+                    self._index.save()
+                else:
+                    # removed by the retention policy meanwhile
+                    os.remove(path + ".gz")
+                os.remove(path)
+            except (IOError, OSError) as ex:
+                _logger.warning("Can't compress log segment %s: %s",
+                                path, ex)
+
+
+def _reopen_handlers(live, target):
+    """
+    Renames the log file of the logging handlers of this process writing to
+    the given file, and makes them open a new one
+
+    :param live: Path to the live log file
+    :param target: New path of the current content
+    :return: True if the file was written by a handler of this process
+    """
+    live = os.path.abspath(live)
+    handlers = []
+    for logger in [logging.getLogger()] + [
+            logger for logger in logging.Logger.manager.loggerDict.values()
+            if isinstance(logger, logging.Logger)]:
+        for handler in logger.handlers:
+            if isinstance(handler, logging.FileHandler) \
+                    and os.path.abspath(handler.baseFilename) == live \
+                    and handler not in handlers:
+                handlers.append(handler)
+
+    if not handlers:
+        return False
+
+    for handler in handlers:
+        handler.acquire()
+    try:
+        for handler in handlers:
+            if handler.stream is not None:
+                handler.stream.flush()
+                handler.stream.close()
+                handler.stream = None
+        os.rename(live, target)
+        for handler in handlers:
+            handler.stream = handler._open()
+    finally:
+        for handler in handlers:
+            handler.release()
+    return True
+
+# ------------------------------------------------------------------------------
+
+
+class _Activator(object):
+    """
+    Rotates the log of the isolate
+    """
+    def __init__(self):
+        """
+        Sets up members
+        """
+        self._index = None
+        self._archive = None
+        self._log_id = None
+        self._timer = None
+        self._max_segments = DEFAULT_MAX_SEGMENTS
+        self._retention = DEFAULT_RETENTION
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _get_int(context, name, default):
+        """
+        Returns the integer value of a framework property
+        """
+        try:
+            return int(context.get_property(name) or default)
+        except (TypeError, ValueError):
+            return default
+
+    @staticmethod
+    def _find_live_log(context):
+        """
+        Finds the live log file of the isolate
+
+        :return: A (log ID, path) tuple, or (None, None)
+        """
+        base = context.get_property(cohorte.PROP_BASE) or os.getcwd()
+        if context.get_property(cohorte.PROP_KIND) == "forker":
+            path = os.environ.get("COHORTE_LOGFILE") \
+                or os.path.join(base, "var", "forker.log")
+            return FORKER_LOG_ID, path
+
+        name = context.get_property(cohorte.PROP_NAME)
+        uid = context.get_property(cohorte.PROP_UID)
+        pattern = os.path.join(base, "var", name, "*-{0}".format(uid),
+                               "log_{0}.log".format(name))
+        paths = sorted(glob.glob(pattern), key=os.path.getmtime)
+        if not paths:
+            return None, None
+        path = paths[-1]
+        return os.path.basename(os.path.dirname(path))[:3], path
+
+    def start(self, context):
+        """
+        Bundle started
+        """
+        log_id, live = self._find_live_log(context)
+        if live is None:
+            _logger.debug("No log file to rotate")
+            return
+
+        index_path = get_index_path(context.get_property(cohorte.PROP_BASE)
+                                    or os.getcwd(),
+                                    context.get_property(cohorte.PROP_KIND),
+                                    context.get_property(cohorte.PROP_NAME))
+        self._index = LogIndex.load(index_path)
+        self._log_id = log_id
+        self._max_segments = self._get_int(context, PROP_MAX_SEGMENTS,
+                                           DEFAULT_MAX_SEGMENTS)
+        self._retention = self._get_int(context, PROP_RETENTION,
+                                        DEFAULT_RETENTION)
+
+        # runs of other isolates may have ended without updating the index
+        for other_id, run in self._index.get_runs():
+            if other_id != log_id and run["end"] is None:
+                self._index.end_run(other_id, run["live_start"])
+        removed = self._index.add_run(
+            log_id, os.path.relpath(live, self._index.directory))
+        removed += self._index.apply_retention(
+            self._max_segments, self._retention,
+            self._get_int(context, PROP_MAX_RUNS, DEFAULT_MAX_RUNS), log_id)
+        self._index.save()
+        _remove_files(self._index.directory, removed)
+
+        self._archive = LogArchive(
+            self._index, log_id,
+            self._get_int(context, PROP_MAX_SIZE, DEFAULT_MAX_SIZE),
+            self._get_int(context, PROP_MAX_AGE, DEFAULT_MAX_AGE))
+        self._archive.start()
+        self._schedule()
+
+    def stop(self, context):
+        """
+        Bundle stopped
+        """
+        if self._archive is None:
+            return
+
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            self._archive.stop()
+            self._archive = None
+
+        self._index.end_run(self._log_id)
+        self._index.save()
+        self._index = None
+
+    def _schedule(self):
+        """
+        Schedules the next check of the live log
+        """
+        self._timer = threading.Timer(CHECK_PERIOD, self._check)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _check(self):
+        """
+        Rotates the live log if necessary and applies the retention policy
+        """
+        with self._lock:
+            if self._archive is None:
+                return
+            try:
+                if self._archive.needs_rotation():
+                    self._archive.rotate()
+                removed = self._index.apply_retention(
+                    self._max_segments, self._retention, keep=self._log_id)
+                if removed:
+                    self._index.save()
+                    _remove_files(self._index.directory, removed)
+            except (IOError, OSError) as ex:
+                _logger.warning("Error rotating the log: %s", ex)
+            self._schedule()
+
+# Pelix bundle activator
+activator = _Activator()
@@ -0,0 +1,463 @@
+#!/usr/bin/env python
+# -- Content-Encoding: UTF-8 --
+"""
+COHORTE startup tracer.
+
+Records the duration of the startup phases of a node (configuration
+parsing, var/ preparation, boot...), of the installation and start of each
+bundle and of the instantiation of each component, in the Chrome
+trace-event format (chrome://tracing, Perfetto).
+
+Tracing is enabled when the COHORTE_STARTUP_TRACE environment variable
+gives the directory where the traces are written (``var/trace``, set by
+``cohorte-start-node --trace-startup``). Each isolate writes its own trace
+in this directory; the forker merges them in ``var/startup-trace.json``.
+
+When installed as a bundle (first bundle of the boot configurations), this
+module traces the bundles and components events of the isolate. The bundles
+installed before it are recorded when it starts, without their durations.
+
+:author: Bassem Debbabi
+:license: Apache Software License 2.0
+
+..
+
+    Copyright 2015 isandlaTech
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Documentation strings format
+__docformat__ = "restructuredtext en"
+
+# Boot module version
+__version__ = "1.0.0"
+
+# ------------------------------------------------------------------------------
+
+# Cohorte
+import cohorte
+
+# Pelix
+import pelix.framework
+from pelix.ipopo.constants import IPopoEvent, SERVICE_IPOPO
+
+# Standard library
+import contextlib
+import json
+import logging
+import os
+import threading
+import time
+
+# ------------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+
+ENV_STARTUP_TRACE = "COHORTE_STARTUP_TRACE"
+""" Environment variable giving the traces directory """
+
+TRACE_FILE = "startup-trace.json"
+""" Name of the merged trace file, in var/ """
+
+WRITE_DELAY = 30
+""" Time after the start of the tracing bundle before writing the trace """
+
+MERGE_PERIOD = 10
+""" Period of the merge of the isolates traces, in the forker (seconds) """
+
+MERGE_DURATION = 300
+""" Time during which the forker merges the isolates traces (seconds) """
+
+CATEGORY_PHASE = "phase"
+CATEGORY_BUNDLE = "bundle"
+CATEGORY_COMPONENT = "component"
+
+try:
+    # Python 3.3+: the monotonic clock is shared by all processes
+    _clock = time.monotonic
+except AttributeError:
+    # Python 2
+    _clock = time.time
+
+# ------------------------------------------------------------------------------
+
+
+def now():
+    """
+    Returns the current monotonic time, in microseconds
+    """
+    return int(_clock() * 1000000)
+
+
+class StartupTracer(object):
+    """
+    Records trace events of the current process
+    """
+    def __init__(self, trace_dir):
+        """
+        Sets up members
+
+        :param trace_dir: Directory where traces are written
+        """
+        self.trace_dir = trace_dir
+        self._pid = os.getpid()
+        self._events = []
+        self._last_checkpoint = now()
+        self._lock = threading.Lock()
+
+    def _add(self, event):
+        """
+        Stores an event
+        """
+        event["pid"] = self._pid
+        event["tid"] = threading.current_thread().ident or 0
+        with self._lock:
+            self._events.append(event)
+
+    def set_process_name(self, name):
+        """
+        Sets the name of the process shown in the trace viewers
+        """
+        self._add({"name": "process_name", "ph": "M",
+                   "args": {"name": name}})
+
+    def complete(self, name, start, end=None, category=CATEGORY_PHASE,
+                 args=None):
+        """
+        Records an event with a duration
+
+        :param name: Event name
+        :param start: Start time (see now())
+        :param end: End time (now if None)
+        :param category: Event category
+        :param args: Additional details
+        """
+        if end is None:
+            end = now()
+        self._add({"name": name, "cat": category, "ph": "X",
+                   "ts": start, "dur": max(0, end - start),
+                   "args": args or {}})
+
+    def instant(self, name, category=CATEGORY_PHASE, args=None):
+        """
+        Records an instant event
+        """
+        self._add({"name": name, "cat": category, "ph": "i", "s": "p",
+                   "ts": now(), "args": args or {}})
+
+    def checkpoint(self, name):
+        """
+        Records a phase which started at the previous checkpoint (or at the
+        creation of the tracer) and ends now
+        """
+        end = now()
+        self.complete(name, self._last_checkpoint, end)
+        self._last_checkpoint = end
+
+    @contextlib.contextmanager
+    def phase(self, name, category=CATEGORY_PHASE, **args):
+        """
+        Records the duration of a block of code::
+
+            with tracer.phase("read configuration"):
+                ...
+        """
+        start = now()
+        try:
+            yield
+        finally:
+            self.complete(name, start, category=category, args=args)
+
+    def get_events(self):
+        """
+        Returns a copy of the recorded events
+        """
+        with self._lock:
+            return list(self._events)
+
+    def write(self, name=None):
+        """
+        Writes the trace of this process in the traces directory
+
+        :param name: File name (default: the PID of the process)
+        :return: The path to the written file
+        """
+        if not os.path.isdir(self.trace_dir):
+            os.makedirs(self.trace_dir)
+        path = os.path.join(self.trace_dir,
+                            "{0}.json".format(name or self._pid))
+        _write_trace(path, self.get_events())
+        return path
+
+
+def _write_trace(path, events):
+    """
+    Writes a trace file, replacing the previous one at once
+    """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as trace_file:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"},
+                  trace_file)
+    if os.path.exists(path):
+        os.remove(path)
+    os.rename(tmp_path, path)
+
+
+def merge_traces(trace_dir, output):
+    """
+    Merges the traces of all the processes in a single file
+
+    :param trace_dir: Directory of the traces of the processes
+    :param output: Path to the merged trace file
+    :return: The number of merged traces
+    """
+    events = []
+    count = 0
+    for name in sorted(os.listdir(trace_dir)):
+        if not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(trace_dir, name)) as trace_file:
+                events.extend(json.load(trace_file)["traceEvents"])
+            count += 1
+        except (IOError, OSError, ValueError, KeyError) as ex:
+            _logger.debug("Ignoring trace %s: %s", name, ex)
+
+    _write_trace(output, events)
+    return count
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """
+    Returns the tracer of this process, or None if tracing is disabled
+    """
+    global _tracer
+    if _tracer is None:
+        trace_dir = os.environ.get(ENV_STARTUP_TRACE)
+        if trace_dir:
+            with _tracer_lock:
+                if _tracer is None:
+                    _tracer = StartupTracer(trace_dir)
+    return _tracer
+
+# ------------------------------------------------------------------------------
+
+
+class _Activator(object):
+    """
+    Traces the bundles and components events of the isolate
+    """
+    def __init__(self):
+        """
+        Sets up members
+        """
+        self._tracer = None
+        self._context = None
+        self._file_name = None
+        self._is_forker = False
+        # Bundle ID -> start time
+        self._bundles = {}
+        # Component name -> instantiation time
+        self._components = {}
+        self._ipopo_ref = None
+        self._timers = []
+        self._merge_end = 0
+
+    def start(self, context):
+        """
+        Bundle started: registers the listeners
+        """
+        self._tracer = get_tracer()
+        if self._tracer is None:
+            # tracing disabled
+            return
+
+        self._context = context
+        name = context.get_property(cohorte.PROP_NAME) or "isolate"
+        self._file_name = context.get_property(cohorte.PROP_UID) \
+            or str(os.getpid())
+        self._is_forker = context.get_property(cohorte.PROP_KIND) == "forker"
+        self._tracer.set_process_name(name)
+
+        # Bundles installed before this one
+        self._record_bundles(context)
+
+        context.add_bundle_listener(self)
+        context.add_service_listener(self, None, SERVICE_IPOPO)
+        svc_ref = context.get_service_reference(SERVICE_IPOPO)
+        if svc_ref is not None:
+            self._bind_ipopo(svc_ref)
+
+        self._schedule(WRITE_DELAY, self._write)
+        if self._is_forker:
+            self._merge_end = time.time() + MERGE_DURATION
+            self._schedule(MERGE_PERIOD, self._merge)
+
+    def stop(self, context):
+        """
+        Bundle stopped: writes the trace
+        """
+        if self._tracer is None:
+            return
+
+        for timer in self._timers:
+            timer.cancel()
+        del self._timers[:]
+
+        context.remove_bundle_listener(self)
+        context.remove_service_listener(self)
+        self._unbind_ipopo()
+
+        self._write()
+        if self._is_forker:
+            self._merge_now()
+        self._tracer = None
+
+    def _schedule(self, delay, method):
+        """
+        Calls the given method after the given delay, in a daemon thread
+        """
+        timer = threading.Timer(delay, method)
+        timer.daemon = True
+        self._timers.append(timer)
+        timer.start()
+
+    def _write(self):
+        """
+        Writes the trace of the isolate
+        """
+        try:
+            self._tracer.write(self._file_name)
+        except (IOError, OSError) as ex:
+            _logger.warning("Can't write the startup trace: %s", ex)
+
+    def _merge_now(self):
+        """
+        Merges the traces of the isolates of the node
+        """
+        trace_dir = self._tracer.trace_dir
+        output = os.path.join(os.path.dirname(trace_dir), TRACE_FILE)
+        try:
+            merge_traces(trace_dir, output)
+        except (IOError, OSError) as ex:
+            _logger.warning("Can't merge the startup traces: %s", ex)
+
+    def _merge(self):
+        """
+        Periodically merges the traces of the isolates started by the forker
+        """
+        if self._tracer is None:
+            return
+        self._merge_now()
+        if time.time() < self._merge_end:
+            self._schedule(MERGE_PERIOD, self._merge)
+
+    def _bind_ipopo(self, svc_ref):
+        """
+        Registers the iPOPO listener
+        """
+        if self._ipopo_ref is None:
+            self._ipopo_ref = svc_ref
+            self._context.get_service(svc_ref).add_listener(self)
+
+    def _unbind_ipopo(self):
+        """
+        Unregisters the iPOPO listener
+        """
+        if self._ipopo_ref is not None:
+            try:
+                self._context.get_service(self._ipopo_ref) \
+                    .remove_listener(self)
+                self._context.unget_service(self._ipopo_ref)
+            except Exception:
+                # iPOPO is already gone
+                pass
+            self._ipopo_ref = None
+
+    def _record_bundles(self, context):
+        """
+        Records the bundles installed before the tracer was activated. Their
+        installation and start times are unknown: they are recorded as
+        instant events, with their state at activation.
+        """
+        states = {pelix.framework.Bundle.INSTALLED: "installed",
+                  pelix.framework.Bundle.RESOLVED: "resolved",
+                  pelix.framework.Bundle.STARTING: "starting",
+                  pelix.framework.Bundle.ACTIVE: "active",
+                  pelix.framework.Bundle.STOPPING: "stopping"}
+        for bundle in context.get_bundles():
+            if bundle.get_bundle_id() == 0:
+                # the framework
+                continue
+            name = bundle.get_symbolic_name()
+            self._tracer.instant("install " + name, CATEGORY_BUNDLE,
+                                 {"bundle": name,
+                                  "state": states.get(bundle.get_state()),
+                                  "before_tracer": True})
+
+    def bundle_changed(self, event):
+        """
+        Records bundles installation and start durations
+        """
+        kind = event.get_kind()
+        bundle = event.get_bundle()
+        name = bundle.get_symbolic_name()
+        if kind == pelix.framework.BundleEvent.INSTALLED:
+            self._tracer.instant("install " + name, CATEGORY_BUNDLE,
+                                 {"bundle": name})
+        elif kind == pelix.framework.BundleEvent.STARTING:
+            self._bundles[bundle.get_bundle_id()] = now()
+        elif kind == pelix.framework.BundleEvent.STARTED:
+            start = self._bundles.pop(bundle.get_bundle_id(), None)
+            if start is not None:
+                self._tracer.complete("start " + name, start,
+                                      category=CATEGORY_BUNDLE,
+                                      args={"bundle": name})
+
+    def service_changed(self, event):
+        """
+        Binds the iPOPO service when it appears
+        """
+        if event.get_kind() == pelix.framework.ServiceEvent.REGISTERED:
+            self._bind_ipopo(event.get_service_reference())
+        elif event.get_kind() == pelix.framework.ServiceEvent.UNREGISTERING \
+                and event.get_service_reference() is self._ipopo_ref:
+            self._unbind_ipopo()
+
+    def handle_ipopo_event(self, event):
+        """
+        Records the time between the instantiation and the validation of
+        components
+        """
+        kind = event.get_kind()
+        name = event.get_component_name()
+        if kind == IPopoEvent.INSTANTIATED:
+            self._components[name] = now()
+        elif kind == IPopoEvent.VALIDATED:
+            start = self._components.pop(name, None)
+            if start is not None:
+                self._tracer.complete(
+                    "instantiate " + name, start,
+                    category=CATEGORY_COMPONENT,
+                    args={"component": name,
+                          "factory": event.get_factory_name()})
+
+# Pelix bundle activator
+activator = _Activator()
@@ -23,6 +23,7 @@ import threading
 
 # handles http staff (already bundled with cohorte)
 import requests
+import requests.adapters
 
 try:
     # Python 3
@@ -37,13 +38,60 @@ _logger = logging.getLogger("proxy.proxy")
 # collecting information 
 SUBJECT_GET_HTTP = "cohorte/shell/agent/get_http"
 
+ACCESS_HTTP = "http"
+""" ID of the Herald HTTP access of peers """
+
+PORT_REQUEST_TIMEOUT = 10
+""" Time to wait for the HTTP port of an isolate, in seconds """
+
 # PROXY SUB PATH
 PROXY_SUB_PATH = "/p/"
 
+PROP_MAX_CONNECTIONS = "max_connections"
+""" Maximum number of kept-alive connections to each isolate """
+
+CHUNK_SIZE = 64 * 1024
+""" Size of the chunks of forwarded bodies """
+
+HOP_BY_HOP_HEADERS = frozenset(("connection", "keep-alive", "proxy-authenticate",
+                                "proxy-authorization", "te", "trailer", "trailers",
+                                "transfer-encoding", "upgrade"))
+""" Headers which must not be forwarded (lower case) """
+
+REQUEST_SKIPPED_HEADERS = HOP_BY_HOP_HEADERS.union(("host", "content-length"))
+""" Request headers set by the proxy itself (lower case) """
+
+
+class _BoundedReader(object):
+    """
+    File-like object reading at most a given number of bytes of a request
+    body. Its length lets requests send the body with a Content-Length,
+    without loading it in memory.
+    """
+    def __init__(self, rfile, length):
+        self._rfile = rfile
+        self._remaining = length
+
+    def __len__(self):
+        return self._remaining
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b""
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._rfile.read(size)
+        self._remaining -= len(data)
+        if not data:
+            # client disconnected
+            self._remaining = 0
+        return data
+
 
 @ComponentFactory("cohorte-http-service-proxy-factory")
 @Provides(['pelix.http.servlet', herald.SERVICE_DIRECTORY_LISTENER])
 @Property('_path', 'pelix.http.path', "/")
+@Property('_max_connections', PROP_MAX_CONNECTIONS, 10)
 @Requires("_directory", herald.SERVICE_DIRECTORY)
 @Requires('_herald', herald.SERVICE_HERALD)
 @Property('_reject', pelix.remote.PROP_EXPORT_REJECT, ['pelix.http.servlet'])
@@ -65,6 +113,12 @@ class HTTPServiceProxy(object):
         # list of local isolates
         # peer.name -> {p_ref, peer.uid, http.port}
         self._local_isolates = {}
+        # peer.uid -> peer.name
+        self._local_isolates_names = {}
+
+        # kept-alive connections: peer.name -> requests.Session
+        self._max_connections = 10
+        self._sessions = {}
 
         
     """
@@ -81,15 +135,31 @@ class HTTPServiceProxy(object):
             
 
     def peer_updated(self, peer, access_id, data, previous):
-        pass
+        """
+        Called when an access of an isolate has been updated
+        """
+        if access_id == ACCESS_HTTP:
+            with self._lock:
+                name = self._local_isolates_names.get(peer.uid)
+                if name is None:
+                    return
+                port = getattr(data, "port", None)
+                self._local_isolates[name]["port"] = port if port else -1
+            if not port:
+                self._request_port(peer.uid)
 
     def peer_unregistered(self, peer):
         """
         Called when an isolate is gone
         """         
-        if peer.name in self._local_isolates:
-            with self._lock:
-                del self._local_isolates[peer.name]
+        with self._lock:
+            if self._local_isolates_names.get(peer.uid) != peer.name:
+                return
+            del self._local_isolates_names[peer.uid]
+            del self._local_isolates[peer.name]
+            session = self._sessions.pop(peer.name, None)
+        if session is not None:
+            session.close()
     
     """
     Utils -------------------------------------------------------------------------------------------------------------
@@ -104,21 +174,81 @@ class HTTPServiceProxy(object):
                 
     def _add_peer(self, p):
         """
-        Adds an isolate to the local list of Node's isolates
+        Adds an isolate to the local list of Node's isolates.
+        Its HTTP port is read from its Herald HTTP access, or requested
+        asynchronously if it doesn't have one.
         """
         local_isolate = self._directory.get_local_peer()
         if p.node_uid == local_isolate.node_uid:  
+            try:
+                port = p.get_access(ACCESS_HTTP).port
+            except (KeyError, AttributeError):
+                port = None
+
             with self._lock:
-                if p.name not in self._local_isolates:    
-                    # to avoid synchronization problems, port is initialized to -1.
-                    # when the first time is requested, we find its concrate value
-                    # using get_isolate_http_port.
-                    self._local_isolates[p.name] = { 
-                                            "p_ref": p, 
-                                            "uid" : p.uid,
-                                            "port": -1
-                                           }
-        
+                if p.name in self._local_isolates:
+                    return
+                self._local_isolates[p.name] = { 
+                                        "p_ref": p, 
+                                        "uid" : p.uid,
+                                        "port": port if port else -1
+                                       }
+                self._local_isolates_names[p.uid] = p.name
+
+            if not port:
+                self._request_port(p.uid)
+
+    def _request_port(self, uid):
+        """
+        Requests the HTTP port of the given isolate, without waiting for
+        the reply
+        """
+        try:
+            self._herald.post(uid, beans.Message(SUBJECT_GET_HTTP),
+                              self._on_port_reply, self._on_port_error,
+                              PORT_REQUEST_TIMEOUT)
+        except Exception as ex:
+            # the port will be requested on first use
+            _logger.debug("Can't request the HTTP port of %s: %s", uid, ex)
+
+    def _on_port_reply(self, herald_svc, message):
+        """
+        Herald callback: stores the HTTP port of an isolate
+        """
+        self._set_port(message.sender, message.content['http.port'])
+
+    def _on_port_error(self, herald_svc, exception):
+        """
+        Herald errback: the port will be requested on first use
+        """
+        _logger.debug("Error requesting an isolate HTTP port: %s", exception)
+
+    def _set_port(self, uid, port):
+        """
+        Stores the HTTP port of the given isolate, if it is still known
+        """
+        with self._lock:
+            name = self._local_isolates_names.get(uid)
+            if name is not None:
+                self._local_isolates[name]["port"] = port
+
+    def _get_session(self, isolate):
+        """
+        Returns the HTTP session (pool of kept-alive connections) used to
+        forward requests to the given isolate
+        """
+        with self._lock:
+            session = self._sessions.get(isolate)
+            if session is None:
+                session = requests.Session()
+                # don't use the environment proxies to reach local isolates
+                session.trust_env = False
+                adapter = requests.adapters.HTTPAdapter(
+                    pool_connections=1, pool_maxsize=int(self._max_connections))
+                session.mount("http://", adapter)
+                self._sessions[isolate] = session
+            return session
+
     def get_isolate_http_port(self, uid):
         """
         Retrieves the http port of the given isolate
@@ -126,7 +256,7 @@ class HTTPServiceProxy(object):
         lp = self._directory.get_local_peer()
         if lp.uid != uid:
             msg = beans.Message(SUBJECT_GET_HTTP)
-            reply = self._herald.send(uid, msg)
+            reply = self._herald.send(uid, msg, timeout=PORT_REQUEST_TIMEOUT)
             return reply.content['http.port']
         else:
             # Get the isolate HTTP port
@@ -159,81 +289,166 @@ class HTTPServiceProxy(object):
     Servlet =========================================================================================
     """
 
-    def do_GET(self, request, response):
+    def _get_target(self, request):
+        """
+        Finds the isolate targeted by the request and the path to request
+        on its HTTP service
+
+        :return: A (isolate name, path with query string) tuple, or
+                 (None, None) if the request doesn't target an isolate
         """
-        Handle a GET
-        """        
         referer = request.get_header('Referer')
         req_path = request.get_path()
         if PROXY_SUB_PATH not in req_path and referer is not None and PROXY_SUB_PATH in referer:
             # case of relative link from a page located in another isolate.
             # request contain a referer of the parent page.
             path, parts = self.get_path(referer)             
-            isolate = parts[1]
-            try:
-                intern_isolate_port = self._local_isolates[isolate]["port"]
-            except:
-                response.send_content(501, "Internal error")
-                return    
-            if intern_isolate_port == -1 :
-                intern_isolate_port = self.get_isolate_http_port(self._local_isolates[isolate]["uid"])
-                self._local_isolates[isolate]["port"] = intern_isolate_port            
-            intern_url = 'http://localhost:' + str(intern_isolate_port) + req_path
-            try:
-                r = requests.get(intern_url)                               
-                response.send_content(r.status_code, r.content, mime_type=r.headers['content-type'])     
-            except:
-                response.send_content(501, "Error", "text/html")           
-        else:                              
-            if req_path.startswith(PROXY_SUB_PATH):
-                # link to another isolate
-                # e.g., /__proxy/led-gateway-python-auto01/...
-                path, parts = self.get_path(request.get_path())                
-                isolate = parts[1]
-                intern_isolate_port = self._local_isolates[isolate]["port"]
-                if intern_isolate_port == -1 :
-                    intern_isolate_port = self.get_isolate_http_port(self._local_isolates[isolate]["uid"])
-                    self._local_isolates[isolate]["port"] = intern_isolate_port
-                intern_url = 'http://localhost:' + str(intern_isolate_port) + "/" + "/".join(parts[2:])                
-                try:
-                    r = requests.get(intern_url)                                        
-                    response.send_content(r.status_code, r.content, mime_type=r.headers['content-type'])                
-                except:
-                    response.send_content(501, "Error", "text/html")
-            else:
-                # any other link                
-                number = len(self._local_isolates) 
-                if number == 0:
-                    # no servlets
-                    http_content = "<h3>HTTP Services Proxy</h3><ul>"
-                    http_content += "<p>This node has no local isolates!</p><p>Please refresh this page to request again the list of local isolates' HTTP proxies.</p>"
-                    response.send_content(200, http_content)
-                elif number == 1:
-                    # redirect automatically to first one
-                    for isolate in self._local_isolates:        
-                        # one loop                
-                        to_url = PROXY_SUB_PATH + isolate + "/"
-                        http_content = "<html><head><meta http-equiv='refresh' content='0; URL=" + to_url + "'/></head><body></body></html>"                                         
-                        response.send_content(200, http_content)                        
-                else:    
-                    http_content = "<h3>HTTP Services Proxy</h3><ul>"                
-                    for isolate in self._local_isolates:
-                        http_content += "<li><a href='" + PROXY_SUB_PATH + isolate + "/'>" + isolate + "</a></li>"                    
-                    http_content += "</ul>"
-                    response.send_content(200, http_content)                
-                    
-
-    def do_delete(self, request, response):
-        """
-		Handle Delete actions : not yet IMPLEMENTED!
-		"""
-        pass
-        
-    def do_post(self, request, response):
+            return parts[1], req_path
+        elif req_path.startswith(PROXY_SUB_PATH):
+            # link to another isolate
+            # e.g., /__proxy/led-gateway-python-auto01/...
+            o = urlparse.urlparse(req_path)
+            path, parts = self.get_path(o.path)
+            intern_path = "/" + "/".join(parts[2:])
+            if o.query:
+                intern_path += "?" + o.query
+            return parts[1], intern_path
+        return None, None
+
+    def _get_isolate_port(self, isolate):
+        """
+        Returns the HTTP port of the given local isolate
+
+        :raise KeyError: Unknown isolate
+        """
+        with self._lock:
+            entry = self._local_isolates[isolate]
+            intern_isolate_port = entry["port"]
+            uid = entry["uid"]
+        if intern_isolate_port == -1 :
+            # not yet resolved: wait for it
+            intern_isolate_port = self.get_isolate_http_port(uid)
+            self._set_port(uid, intern_isolate_port)
+        return intern_isolate_port
+
+    def forward(self, request, response, method):
+        """
+        Forwards the request to the HTTP service of the targeted isolate.
+        Bodies are streamed in both directions, chunk by chunk.
+
+        :return: False if the request doesn't target an isolate
+        """
+        isolate, intern_path = self._get_target(request)
+        if isolate is None:
+            return False
+
+        try:
+            intern_url = 'http://localhost:' + str(self._get_isolate_port(isolate)) + intern_path
+        except KeyError:
+            response.send_content(501, "Internal error")
+            return True
+
+        headers = dict((name, value) for name, value in request.get_headers().items()
+                       if name.lower() not in REQUEST_SKIPPED_HEADERS)
+        body = None
+        length = request.get_header('Content-Length')
+        if length:
+            body = _BoundedReader(request.get_rfile(), int(length))
+
+        try:
+            r = self._get_session(isolate).request(method, intern_url, headers=headers,
+                                                   data=body, stream=True,
+                                                   allow_redirects=False)
+        except Exception as ex:
+            _logger.debug("Error forwarding %s %s: %s", method, intern_url, ex)
+            response.send_content(501, "Error", "text/html")
+            return True
+
+        try:
+            response.set_response(r.status_code, r.reason)
+            for name, value in r.headers.items():
+                if name.lower() not in HOP_BY_HOP_HEADERS:
+                    response.set_header(name, value)
+            response.end_headers()
+            if method != "HEAD":
+                # raw content: keep the content encoding of the isolate
+                for chunk in r.raw.stream(CHUNK_SIZE, decode_content=False):
+                    response.write(chunk)
+        except Exception as ex:
+            # client disconnected
+            _logger.debug("Error sending the response of %s: %s", intern_url, ex)
+        finally:
+            r.close()
+        return True
+
+    def do_GET(self, request, response):
+        """
+        Handle a GET
+        """        
+        if not self.forward(request, response, "GET"):
+            # any other link                
+            number = len(self._local_isolates) 
+            if number == 0:
+                # no servlets
+                http_content = "<h3>HTTP Services Proxy</h3><ul>"
+                http_content += "<p>This node has no local isolates!</p><p>Please refresh this page to request again the list of local isolates' HTTP proxies.</p>"
+                response.send_content(200, http_content)
+            elif number == 1:
+                # redirect automatically to first one
+                for isolate in self._local_isolates:        
+                    # one loop                
+                    to_url = PROXY_SUB_PATH + isolate + "/"
+                    http_content = "<html><head><meta http-equiv='refresh' content='0; URL=" + to_url + "'/></head><body></body></html>"                                         
+                    response.send_content(200, http_content)                        
+            else:    
+                http_content = "<h3>HTTP Services Proxy</h3><ul>"                
+                for isolate in self._local_isolates:
+                    http_content += "<li><a href='" + PROXY_SUB_PATH + isolate + "/'>" + isolate + "</a></li>"                    
+                http_content += "</ul>"
+                response.send_content(200, http_content)                
+
+    def _forward_or_reject(self, request, response, method):
+        """
+        Forwards a request which can only target an isolate
+        """
+        if not self.forward(request, response, method):
+            response.send_content(404, "Not found", "text/html")
+
+    def do_HEAD(self, request, response):
+        """
+        Handle a HEAD
+        """
+        self._forward_or_reject(request, response, "HEAD")
+
+    def do_POST(self, request, response):
+        """
+        Handle a POST
+        """
+        self._forward_or_reject(request, response, "POST")
+
+    def do_PUT(self, request, response):
+        """
+        Handle a PUT
+        """
+        self._forward_or_reject(request, response, "PUT")
+
+    def do_PATCH(self, request, response):
+        """
+        Handle a PATCH
+        """
+        self._forward_or_reject(request, response, "PATCH")
+
+    def do_DELETE(self, request, response):
+        """
+        Handle a DELETE
+        """
+        self._forward_or_reject(request, response, "DELETE")
+
+    def do_OPTIONS(self, request, response):
         """
-        Not yet Implemented!
+        Handle an OPTIONS
         """
-        pass        
+        self._forward_or_reject(request, response, "OPTIONS")
 
 
     """
@@ -251,6 +466,11 @@ class HTTPServiceProxy(object):
     @Invalidate
     def invalidate(self, context):
         _logger.info("HTTP Service Proxy invalidated")
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
 
 
     def bound_to(self, path, params):
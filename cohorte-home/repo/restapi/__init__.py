@@ -0,0 +1,12 @@
+#!/usr/bin/env python
+# -- Content-Encoding: UTF-8 --
+"""
+COHORTE REST API utilities, shared by the web admin, admin and debug
+servlets
+
+:author: Bassem Debbabi
+:license: Apache License v2
+"""
+
+# Documentation strings format
+__docformat__ = "restructuredtext en"
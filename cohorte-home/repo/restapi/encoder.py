@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# -- Content-Encoding: UTF-8 --
+"""
+COHORTE REST API response encoder.
+
+Serializes the responses of the admin, debug and web admin servlets. JSON is
+compact by default (indented only if the request has a ``pretty=1`` query
+parameter) and is compressed with gzip when the client accepts it. The
+fastest JSON library available is used: ``orjson``, ``ujson``, or the
+standard ``json`` module.
+
+:author: Bassem Debbabi
+:license: Apache Software License 2.0
+
+..
+
+    Copyright 2015 isandlaTech
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Documentation strings format
+__docformat__ = "restructuredtext en"
+
+# ------------------------------------------------------------------------------
+
+# Python standard library
+import json
+import zlib
+
+try:
+    # Python 3
+    import urllib.parse as urlparse
+
+except ImportError:
+    # Python 2
+    import urlparse
+
+# Faster JSON libraries, if available
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+# ------------------------------------------------------------------------------
+
+MIME_JSON = "application/json"
+""" MIME type of the JSON responses """
+
+GZIP_MIN_SIZE = 1024
+""" Responses smaller than this size (in bytes) are never compressed """
+
+GZIP_LEVEL = 6
+""" Compression level of the gzip responses """
+
+PRETTY_VALUES = ("1", "true", "yes")
+""" Values of the 'pretty' query parameter asking for indented JSON """
+
+# ------------------------------------------------------------------------------
+
+
+def default_encoder(obj):
+    """
+    Converts objects the JSON libraries can't serialize (sets)
+
+    :raise TypeError: Unhandled object
+    """
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError("{0!r} is not JSON serializable".format(obj))
+
+
+def to_json(data, pretty=False):
+    """
+    Serializes the given data to JSON
+
+    :param data: Data to serialize
+    :param pretty: If True, indent the result
+    :return: The JSON string, as UTF-8 bytes
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(data, default=default_encoder,
+                                option=orjson.OPT_INDENT_2 if pretty else 0)
+        except TypeError:
+            # e.g. non-string keys: use the standard module
+            pass
+
+    elif ujson is not None and not pretty:
+        try:
+            return ujson.dumps(data, ensure_ascii=False).encode("utf-8")
+        except (TypeError, OverflowError):
+            # sets aren't handled by all versions of ujson
+            pass
+
+    if pretty:
+        result = json.dumps(data, sort_keys=False, indent=4,
+                            separators=(',', ': '), default=default_encoder)
+    else:
+        result = json.dumps(data, separators=(',', ':'),
+                            default=default_encoder)
+    if not isinstance(result, bytes):
+        result = result.encode("utf-8")
+    return result
+
+
+def is_pretty(request):
+    """
+    Checks if the request asks for indented JSON (``?pretty=1``)
+    """
+    query = urlparse.urlparse(request.get_path()).query
+    if not query:
+        return False
+    values = urlparse.parse_qs(query).get("pretty")
+    return bool(values) and values[-1].lower() in PRETTY_VALUES
+
+
+def accepts_gzip(request):
+    """
+    Checks if the client accepts gzip-encoded responses
+    """
+    header = request.get_header("Accept-Encoding")
+    if not header:
+        return False
+
+    for encoding in header.split(","):
+        parts = encoding.split(";")
+        if parts[0].strip().lower() not in ("gzip", "*"):
+            continue
+        for param in parts[1:]:
+            name, _, value = param.partition("=")
+            if name.strip() == "q":
+                try:
+                    return float(value) > 0
+                except ValueError:
+                    return False
+        return True
+    return False
+
+
+def gzip_content(content):
+    """
+    Compresses the given bytes in the gzip format
+    """
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED,
+                                  16 + zlib.MAX_WBITS)
+    return compressor.compress(content) + compressor.flush()
+
+
+def send_content(request, response, status, content, mime_type):
+    """
+    Sends the given content, compressed if the client accepts it
+
+    :param request: The servlet request
+    :param response: The servlet response
+    :param status: HTTP status code
+    :param content: Content to send (bytes or string)
+    :param mime_type: MIME type of the content
+    """
+    if not isinstance(content, bytes):
+        content = content.encode("utf-8")
+
+    compressed = len(content) >= GZIP_MIN_SIZE and accepts_gzip(request)
+    if compressed:
+        content = gzip_content(content)
+
+    response.set_response(status)
+    response.set_header("Content-Type", mime_type)
+    response.set_header("Content-Length", len(content))
+    response.set_header("Vary", "Accept-Encoding")
+    if compressed:
+        response.set_header("Content-Encoding", "gzip")
+    response.end_headers()
+    response.write(content)
+
+
+def send_json(request, response, data, status=200):
+    """
+    Sends the given data as JSON: compact unless the request has a
+    ``pretty=1`` parameter, and gzipped if the client accepts it
+
+    :param request: The servlet request
+    :param response: The servlet response
+    :param data: Data to send
+    :param status: HTTP status code
+    """
+    send_content(request, response, status,
+                 to_json(data, is_pretty(request)), MIME_JSON)
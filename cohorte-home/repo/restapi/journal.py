@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# -- Content-Encoding: UTF-8 --
+"""
+COHORTE platform activity journal.
+
+Activities (isolates created, lost...) are kept in a bounded ring buffer,
+indexed by node, isolate UUID and event kind. Each activity has an order
+number, which can be used as a cursor by the clients (``since=<order>``) or
+to select a range of activities (``rang=<first>..<last>``). The activities
+dropped from the ring buffer can be spilled to a file (one JSON object per
+line).
+
+:author: Bassem Debbabi
+:license: Apache Software License 2.0
+
+..
+
+    Copyright 2015 isandlaTech
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Documentation strings format
+__docformat__ = "restructuredtext en"
+
+# ------------------------------------------------------------------------------
+
+# Pelix
+import pelix.ldapfilter
+
+# Python standard library
+import collections
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+
+# ------------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+
+DEFAULT_MAX_ACTIVITIES = 1000
+""" Default number of activities kept in memory """
+
+INDEXED_KEYS = ("node", "uuid", "event")
+""" Activity entries which are indexed """
+
+# ------------------------------------------------------------------------------
+
+
+def parse_range(rang):
+    """
+    Parses a range of order numbers, in the form "first..last". Each bound
+    can be replaced by a '*' to get an open range.
+
+    :param rang: A range string ("1..10", "5..*", "*..*")
+    :return: A (first, last) tuple, with None for open bounds
+    :raise ValueError: Invalid range
+    """
+    try:
+        first, last = rang.split("..", 1)
+    except ValueError:
+        raise ValueError("Invalid range: {0}".format(rang))
+
+    first = first.strip()
+    last = last.strip()
+    return (None if first in ("", "*") else int(first),
+            None if last in ("", "*") else int(last))
+
+
+class ActivityJournal(object):
+    """
+    Bounded and indexed journal of platform activities
+    """
+    def __init__(self, max_activities=DEFAULT_MAX_ACTIVITIES, spill_file=None):
+        """
+        Sets up members
+
+        :param max_activities: Maximum number of activities kept in memory
+        :param spill_file: Path to the file where dropped activities are
+                           appended (None to forget them)
+        """
+        self._max_activities = max(1, int(max_activities))
+        # Order number -> activity. Order numbers kept in memory are
+        # contiguous, from _first_order to _last_order
+        self._activities = {}
+        self._first_order = 1
+        self._last_order = 0
+        self._last_update = time.time()
+
+        # Index key -> {value -> deque of order numbers}
+        self._indexes = dict((key, {}) for key in INDEXED_KEYS)
+
+        self._spill_file = spill_file
+        self._spill = None
+        self._lock = threading.RLock()
+
+    @property
+    def last_order(self):
+        """
+        Order number of the last activity
+        """
+        return self._last_order
+
+    @property
+    def last_update(self):
+        """
+        Time stamp of the last activity
+        """
+        return self._last_update
+
+    def __len__(self):
+        """
+        Number of activities kept in memory
+        """
+        return len(self._activities)
+
+    def add(self, event, obj, name, uuid, node, info=""):
+        """
+        Appends a new activity
+
+        :param event: Event kind ("Isolate Created", "Isolate Lost", ...)
+        :param obj: Kind of object concerned by the event ("Isolate", ...)
+        :param name: Name of the object
+        :param uuid: UUID of the object
+        :param node: Name of the node hosting the object
+        :param info: Additional information
+        :return: The new activity entry
+        """
+        with self._lock:
+            self._last_order += 1
+            self._last_update = time.time()
+            activity = {
+                "order": self._last_order,
+                "timestamp": str(time.strftime("%Y-%m-%d %H:%M:%S")),
+                "event": event,
+                "object": obj,
+                "name": name,
+                "uuid": uuid,
+                "node": node,
+                "info": info
+            }
+            self._activities[self._last_order] = activity
+            for key in INDEXED_KEYS:
+                self._indexes[key].setdefault(activity[key],
+                                              collections.deque()) \
+                    .append(activity["order"])
+
+            while len(self._activities) > self._max_activities:
+                self._drop_oldest()
+
+            return activity
+
+    def _drop_oldest(self):
+        """
+        Removes the oldest activity from the ring buffer and the indexes,
+        and spills it if necessary. Must be called with the lock held.
+        """
+        activity = self._activities.pop(self._first_order)
+        self._first_order += 1
+        for key in INDEXED_KEYS:
+            index = self._indexes[key]
+            orders = index[activity[key]]
+            # The oldest activity is always the first of its index entries
+            orders.popleft()
+            if not orders:
+                del index[activity[key]]
+
+        if self._spill_file:
+            try:
+                if self._spill is None:
+                    parent = os.path.dirname(self._spill_file)
+                    if parent and not os.path.isdir(parent):
+                        os.makedirs(parent)
+                    self._spill = open(self._spill_file, "a")
+                self._spill.write(json.dumps(activity))
+                self._spill.write("\n")
+                self._spill.flush()
+            except (IOError, OSError) as ex:
+                _logger.warning("Can't spill activities to %s: %s",
+                                self._spill_file, ex)
+                self._spill_file = None
+
+    def clear(self):
+        """
+        Removes all the activities kept in memory. Order numbers are not
+        reset, so that clients cursors stay valid.
+        """
+        with self._lock:
+            self._activities.clear()
+            self._first_order = self._last_order + 1
+            for index in self._indexes.values():
+                index.clear()
+            self._last_update = time.time()
+
+    def close(self):
+        """
+        Closes the spill file
+        """
+        with self._lock:
+            if self._spill is not None:
+                self._spill.close()
+                self._spill = None
+
+    def query(self, since=None, rang=None, ldap_filter=None, limit=None,
+              **criteria):
+        """
+        Selects activities
+
+        :param since: Only return activities after this order number
+        :param rang: Range of order numbers ("first..last", see parse_range)
+        :param ldap_filter: LDAP filter string the activities must match
+        :param limit: Maximum number of activities to return (the oldest
+                      ones are returned first)
+        :param criteria: Exact values of indexed entries (node, uuid, event)
+        :return: The list of selected activities
+        :raise ValueError: Invalid range, filter or criteria
+        """
+        first = last = None
+        if rang:
+            first, last = parse_range(rang)
+        if since is not None:
+            first = max(first or 0, int(since) + 1)
+
+        if ldap_filter:
+            ldap_filter = pelix.ldapfilter.get_ldap_filter(ldap_filter)
+
+        for key in criteria:
+            if key not in INDEXED_KEYS:
+                raise ValueError("Unknown criterion: {0}".format(key))
+
+        with self._lock:
+            if not self._activities:
+                return []
+
+            # Bounds of the selection
+            first = self._first_order if first is None \
+                else max(first, self._first_order)
+            last = self._last_order if last is None \
+                else min(last, self._last_order)
+
+            if criteria:
+                # Use the smallest index entry, then check the others
+                entries = sorted((self._indexes[key].get(value, ())
+                                  for key, value in criteria.items()), key=len)
+                others = [set(orders) for orders in entries[1:]]
+                orders = (order for order in entries[0]
+                          if first <= order <= last
+                          and all(order in other for other in others))
+            else:
+                orders = range(first, last + 1)
+
+            activities = (self._activities[order] for order in orders)
+
+            if ldap_filter is not None:
+                activities = (activity for activity in activities
+                              if ldap_filter.matches(activity))
+
+            if limit is not None:
+                activities = itertools.islice(activities, int(limit))
+
+            return list(activities)
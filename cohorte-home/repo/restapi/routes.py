@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -- Content-Encoding: UTF-8 --
+"""
+COHORTE REST API routes.
+
+Maps an HTTP method and a request path to the servlet method handling it.
+Routes are stored in a trie of path segments: literal segments
+(``isolates``) are looked up in a dictionary, parameter segments
+(``{uuid}``) match any segment and their values are given to the handler.
+Looking up a route costs one dictionary access per segment, whatever the
+number of routes.
+
+Each route counts its calls, errors and durations. Calls streaming their
+response for as long as the client listens can be left out of the
+durations. The counters of all the routers of the isolate are returned by
+``get_metrics()``.
+
+Literal segments of case-insensitive routers (the web admin API) match
+whatever their case, as the former dispatch of the web admin did.
+
+:author: Bassem Debbabi
+:license: Apache Software License 2.0
+
+..
+
+    Copyright 2015 isandlaTech
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Documentation strings format
+__docformat__ = "restructuredtext en"
+
+# ------------------------------------------------------------------------------
+
+# Python standard library
+import threading
+import time
+import weakref
+
+try:
+    import Cookie
+except ImportError:
+    import http.cookies as Cookie
+
+# ------------------------------------------------------------------------------
+
+COOKIE_SESSION = "session"
+""" Name of the session cookie """
+
+COOKIES_CACHE_SIZE = 256
+""" Maximum number of Cookie headers kept in the parser cache """
+
+_ROUTERS = weakref.WeakValueDictionary()
+""" Name -> Router, for metrics """
+
+_COOKIES_CACHE = {}
+""" Cookie header -> {name -> value} """
+
+# ------------------------------------------------------------------------------
+
+
+def parse_cookies(header):
+    """
+    Parses a Cookie header. The last parsed headers are kept in cache, as
+    clients send the same cookies with each request.
+
+    :param header: Content of the Cookie header
+    :return: A name -> value dictionary (must not be modified)
+    """
+    try:
+        return _COOKIES_CACHE[header]
+    except KeyError:
+        pass
+
+    cookie = Cookie.SimpleCookie()
+    try:
+        cookie.load(header)
+    except Cookie.CookieError:
+        pass
+    cookies = dict((name, morsel.value) for name, morsel in cookie.items())
+
+    if len(_COOKIES_CACHE) >= COOKIES_CACHE_SIZE:
+        _COOKIES_CACHE.clear()
+    _COOKIES_CACHE[header] = cookies
+    return cookies
+
+
+def get_session_id(request, name=COOKIE_SESSION):
+    """
+    Returns the value of the session cookie of the request, or None
+    """
+    header = request.get_header("Cookie")
+    if not header:
+        return None
+    return parse_cookies(header).get(name) or None
+
+
+def get_metrics():
+    """
+    Returns the counters of the routes of all the routers
+
+    :return: A router name -> list of routes counters dictionary
+    """
+    return dict((name, router.get_metrics())
+                for name, router in list(_ROUTERS.items()))
+
+# ------------------------------------------------------------------------------
+
+
+class Route(object):
+    """
+    A route: the handler of a method and path pattern, with its counters
+    """
+    def __init__(self, method, pattern, handler, name):
+        """
+        Sets up members
+
+        :param method: HTTP method (GET, POST, ...)
+        :param pattern: Path pattern
+        :param handler: Method handling the requests
+        :param name: Name of the route (API method)
+        """
+        self.method = method
+        self.pattern = pattern
+        self.handler = handler
+        self.name = name
+
+        self._lock = threading.Lock()
+        self._count = 0
+        self._errors = 0
+        self._timed = 0
+        self._total_time = 0.0
+        self._max_time = 0.0
+
+    def __call__(self, *args, **kwargs):
+        """
+        Calls the handler with the given arguments, updating the counters
+
+        :param timed: If False, the duration of the call is not counted
+                      (e.g. a streamed response), keyword argument only
+        :return: The result of the handler
+        """
+        timed = kwargs.pop("timed", True)
+        start = time.time()
+        failed = True
+        try:
+            result = self.handler(*args)
+            failed = False
+            return result
+        finally:
+            duration = time.time() - start
+            with self._lock:
+                self._count += 1
+                if failed:
+                    self._errors += 1
+                if timed:
+                    self._timed += 1
+                    self._total_time += duration
+                    if duration > self._max_time:
+                        self._max_time = duration
+
+    def get_metrics(self):
+        """
+        Returns the counters of this route
+        """
+        with self._lock:
+            return {"method": self.method,
+                    "path": self.pattern,
+                    "name": self.name,
+                    "count": self._count,
+                    "errors": self._errors,
+                    "untimed": self._count - self._timed,
+                    "total": self._total_time,
+                    "mean": self._total_time / self._timed
+                    if self._timed else 0.0,
+                    "max": self._max_time}
+
+
+class _Node(object):
+    """
+    A node of the routes trie
+    """
+    __slots__ = ("children", "param", "routes")
+
+    def __init__(self):
+        # Literal segment -> _Node
+        self.children = {}
+        # Node of a parameter segment
+        self.param = None
+        # Method -> Route
+        self.routes = {}
+
+
+class Router(object):
+    """
+    Routes table of a servlet
+    """
+    def __init__(self, name, prefix="", case_sensitive=True):
+        """
+        Sets up members
+
+        :param name: Name of the router, used in metrics
+        :param prefix: Path prefix of all the routes (e.g. "debug/api/v2")
+        :param case_sensitive: If False, literal segments match whatever
+                               their case. Parameters values are kept as is.
+        """
+        self._name = name
+        self._prefix = prefix.strip("/")
+        self._case_sensitive = case_sensitive
+        self._root = _Node()
+        self._routes = []
+        _ROUTERS[name] = self
+
+    @staticmethod
+    def _split(path):
+        """
+        Splits a path into segments
+        """
+        path = path.strip("/")
+        if not path:
+            return []
+        return path.split("/")
+
+    def add(self, method, pattern, handler, name=None):
+        """
+        Adds a route
+
+        :param method: HTTP method
+        :param pattern: Path pattern, relative to the prefix of the router.
+                        Segments in braces are parameters: "isolates/{uuid}"
+        :param handler: Method handling the requests. It will be called with
+                        the arguments given to the route and the values of
+                        the parameters, in order.
+        :param name: Name of the route (default: name of the handler)
+        :return: The new route
+        :raise ValueError: A route already exists for this method and pattern
+        """
+        full_pattern = "/".join(part for part in (self._prefix,
+                                                  pattern.strip("/")) if part)
+        node = self._root
+        for segment in self._split(full_pattern):
+            if segment.startswith("{") and segment.endswith("}"):
+                if node.param is None:
+                    node.param = _Node()
+                node = node.param
+            else:
+                if not self._case_sensitive:
+                    segment = segment.lower()
+                node = node.children.setdefault(segment, _Node())
+
+        method = method.upper()
+        if method in node.routes:
+            raise ValueError("Route already defined: {0} {1}"
+                             .format(method, full_pattern))
+
+        route = Route(method, full_pattern, handler,
+                      name or handler.__name__)
+        node.routes[method] = route
+        self._routes.append(route)
+        return route
+
+    def match(self, method, path):
+        """
+        Looks for the route of the given request
+
+        :param method: HTTP method
+        :param path: Request path (without query)
+        :return: A (route, parameters values) tuple, or (None, None)
+        """
+        values = []
+        route = self._match(self._root, method.upper(), self._split(path),
+                            0, values)
+        if route is None:
+            return None, None
+        return route, values
+
+    def _match(self, node, method, segments, index, values):
+        """
+        Recursively looks for the route matching the given segments. Literal
+        segments have priority over parameters.
+        """
+        if index == len(segments):
+            return node.routes.get(method)
+
+        segment = segments[index]
+        child = node.children.get(segment if self._case_sensitive
+                                  else segment.lower())
+        if child is not None:
+            found = self._match(child, method, segments, index + 1,
+                                    values)
+            if found is not None:
+                return found
+
+        if node.param is not None:
+            values.append(segment)
+            found = self._match(node.param, method, segments,
+                                    index + 1, values)
+            if found is not None:
+                return found
+            values.pop()
+
+        return None
+
+    def get_metrics(self):
+        """
+        Returns the counters of all the routes of this router
+        """
+        return [route.get_metrics() for route in self._routes]
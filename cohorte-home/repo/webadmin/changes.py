@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+# -- Content-Encoding: UTF-8 --
+"""
+COHORTE Web Admin change feed.
+
+Keeps a bounded list of the last topology changes (isolates registered,
+updated or lost), each one tagged with a sequence number. Web clients keep
+the last sequence number they have seen and wait (long-polling) for the
+changes that happened after it, instead of polling the whole lists.
+
+:author: Bassem Debbabi
+:license: Apache Software License 2.0
+
+..
+
+    Copyright 2015 isandlaTech
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Documentation strings format
+__docformat__ = "restructuredtext en"
+
+# ------------------------------------------------------------------------------
+
+# Python standard library
+import collections
+import itertools
+import threading
+import time
+
+# ------------------------------------------------------------------------------
+
+CHANGE_ISOLATE_REGISTERED = "isolate-registered"
+""" A new isolate (peer) has been registered """
+
+CHANGE_ISOLATE_UPDATED = "isolate-updated"
+""" An access of an isolate has been updated """
+
+CHANGE_ISOLATE_UNREGISTERED = "isolate-unregistered"
+""" An isolate (peer) has been lost """
+
+DEFAULT_MAX_CHANGES = 1000
+""" Default number of changes kept in the feed """
+
+# ------------------------------------------------------------------------------
+
+
+class ChangeFeed(object):
+    """
+    Bounded feed of changes, read with a sequence cursor
+    """
+    def __init__(self, max_changes=DEFAULT_MAX_CHANGES):
+        """
+        Sets up members
+
+        :param max_changes: Maximum number of changes kept in memory
+        """
+        self._changes = collections.deque(maxlen=max_changes)
+        self._sequence = 0
+        self._closed = False
+        self._condition = threading.Condition()
+
+    @property
+    def sequence(self):
+        """
+        The sequence number of the last published change
+        """
+        return self._sequence
+
+    def publish(self, kind, data):
+        """
+        Stores a new change and wakes up the waiting readers
+
+        :param kind: Kind of change (CHANGE_* constants)
+        :param data: Change details (must be JSON serializable)
+        :return: The sequence number of the new change
+        """
+        with self._condition:
+            self._sequence += 1
+            self._changes.append({"seq": self._sequence,
+                                  "kind": kind,
+                                  "timestamp": time.time(),
+                                  "data": data})
+            self._condition.notify_all()
+            return self._sequence
+
+    def get_changes(self, since, timeout=0):
+        """
+        Returns the changes published after the given sequence number. If
+        there is none, waits for at most ``timeout`` seconds for a new one.
+
+        The ``reset`` flag of the result is set if the reader missed some
+        changes (the cursor is older than the oldest change kept, or comes
+        from a previous feed): the reader must then reload the whole lists.
+
+        :param since: Sequence number of the last change seen by the reader
+        :param timeout: Maximum time to wait for a change, in seconds
+        :return: A (sequence, changes, reset) tuple
+        """
+        deadline = time.time() + timeout
+        with self._condition:
+            if since > self._sequence:
+                # Unknown cursor (the feed has been restarted)
+                return self._sequence, [], True
+
+            while since == self._sequence and not self._closed:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            # Sequence numbers are contiguous: compute the position directly
+            missed = self._sequence - since
+            if missed > len(self._changes):
+                return self._sequence, [], True
+
+            start = len(self._changes) - missed
+            changes = list(itertools.islice(self._changes, start, None))
+            return self._sequence, changes, False
+
+    def close(self):
+        """
+        Releases the waiting readers
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+# -- Content-Encoding: UTF-8 --
+"""
+COHORTE Web Admin topology model.
+
+Keeps the list of nodes and isolates up to date from the Herald directory
+events, indexed by node UID and isolate UID, and caches the components of
+each isolate, as returned by its isolate composer. The components of an
+isolate are fetched again only when its composer or its peer changed, or
+when its cache entry is too old.
+
+:author: Bassem Debbabi
+:license: Apache Software License 2.0
+
+..
+
+    Copyright 2015 isandlaTech
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Documentation strings format
+__docformat__ = "restructuredtext en"
+
+# ------------------------------------------------------------------------------
+
+# Python standard library
+import collections
+import logging
+import threading
+import time
+
+# ------------------------------------------------------------------------------
+
+_logger = logging.getLogger(__name__)
+
+# ------------------------------------------------------------------------------
+
+FORKER_NAME = "cohorte.internals.forker"
+""" Name of the forker isolates """
+
+DEFAULT_COMPONENTS_MAX_AGE = 10
+""" Default time the components of an isolate are kept in cache, in seconds """
+
+# ------------------------------------------------------------------------------
+
+
+def isolate_type(name):
+    """
+    Returns the type of an isolate according to its name
+    """
+    if name == FORKER_NAME:
+        return "cohorte-isolate"
+    return "app-dynamic-isolate"
+
+
+class Topology(object):
+    """
+    Incremental model of the nodes, isolates and components of the platform
+    """
+    def __init__(self, components_max_age=DEFAULT_COMPONENTS_MAX_AGE):
+        """
+        Sets up members
+
+        :param components_max_age: Time the components of an isolate are
+                                   kept in cache, in seconds
+        """
+        self._components_max_age = components_max_age
+
+        # Node UID -> {uid, name, isolates: Isolate UID -> isolate}
+        self._nodes = collections.OrderedDict()
+        # Isolate UID -> {uid, name, type, node_uid, node_name}
+        self._isolates = collections.OrderedDict()
+
+        # Isolate UID -> isolate composer service
+        self._composers = {}
+        # Isolate UID -> (fetch time, list of components)
+        self._components = {}
+        # Isolate UID -> version, incremented on each invalidation
+        self._versions = {}
+
+        # UID of the local node (never removed)
+        self._local_node_uid = None
+
+        self._lock = threading.RLock()
+
+    @property
+    def components_max_age(self):
+        """
+        Time the components of an isolate are kept in cache, in seconds
+        """
+        return self._components_max_age
+
+    @components_max_age.setter
+    def components_max_age(self, value):
+        """
+        Sets the time the components of an isolate are kept in cache
+        """
+        self._components_max_age = float(value)
+
+    def clear(self):
+        """
+        Forgets the nodes and isolates. Composers are kept, as they are
+        handled by the service bindings.
+        """
+        with self._lock:
+            self._nodes.clear()
+            self._isolates.clear()
+            self._components.clear()
+            self._local_node_uid = None
+
+    def load(self, local_peer, peers):
+        """
+        Seeds the model with the current content of the directory
+
+        :param local_peer: The local peer
+        :param peers: The other known peers
+        """
+        with self._lock:
+            self._local_node_uid = local_peer.node_uid
+            self.add_isolate(local_peer)
+            for peer in peers:
+                self.add_isolate(peer)
+
+    # --------------------------------------------------------------------------
+
+    def add_isolate(self, peer):
+        """
+        Adds (or updates) an isolate
+
+        :param peer: The Herald peer of the isolate
+        """
+        isolate = {"uid": peer.uid, "name": peer.name,
+                   "type": isolate_type(peer.name),
+                   "node_uid": peer.node_uid, "node_name": peer.node_name}
+        with self._lock:
+            previous = self._isolates.get(peer.uid)
+            if previous is not None \
+                    and previous["node_uid"] != peer.node_uid:
+                # moved to another node (shouldn't happen)
+                self.remove_isolate(peer.uid)
+
+            node = self._nodes.get(peer.node_uid)
+            if node is None:
+                node = {"uid": peer.node_uid, "name": peer.node_name,
+                        "isolates": collections.OrderedDict()}
+                self._nodes[peer.node_uid] = node
+            node["name"] = peer.node_name
+            node["isolates"][peer.uid] = isolate
+            self._isolates[peer.uid] = isolate
+            self.invalidate_components(peer.uid)
+            return isolate
+
+    def remove_isolate(self, isolate_uid):
+        """
+        Removes an isolate. Its node is removed if it has no more isolate.
+
+        :param isolate_uid: UID of the isolate
+        :return: The removed isolate, or None
+        """
+        with self._lock:
+            isolate = self._isolates.pop(isolate_uid, None)
+            if isolate is None:
+                return None
+
+            self._components.pop(isolate_uid, None)
+            node = self._nodes.get(isolate["node_uid"])
+            if node is not None:
+                node["isolates"].pop(isolate_uid, None)
+                if not node["isolates"] \
+                        and node["uid"] != self._local_node_uid:
+                    del self._nodes[node["uid"]]
+            return isolate
+
+    # --------------------------------------------------------------------------
+
+    def set_composer(self, isolate_uid, composer):
+        """
+        Sets (or removes, if None) the isolate composer of an isolate
+
+        :param isolate_uid: UID of the isolate
+        :param composer: The isolate composer service, or None
+        """
+        with self._lock:
+            if composer is None:
+                self._composers.pop(isolate_uid, None)
+            else:
+                self._composers[isolate_uid] = composer
+            self.invalidate_components(isolate_uid)
+
+    def invalidate_components(self, isolate_uid):
+        """
+        Drops the cached components of an isolate
+        """
+        with self._lock:
+            self._versions[isolate_uid] = self._versions.get(isolate_uid, 0) + 1
+            self._components.pop(isolate_uid, None)
+
+    def get_components(self, isolate_uid):
+        """
+        Returns the components of an isolate, fetching them from its isolate
+        composer only if they are not in cache
+
+        :param isolate_uid: UID of the isolate
+        :return: The list of the components of the isolate (can be empty)
+        """
+        with self._lock:
+            cached = self._components.get(isolate_uid)
+            if cached is not None \
+                    and time.time() - cached[0] < self._components_max_age:
+                return cached[1]
+
+            composer = self._composers.get(isolate_uid)
+            if composer is None:
+                return []
+            version = self._versions.get(isolate_uid, 0)
+
+        # Remote call: don't keep the lock
+        try:
+            info = composer.get_isolate_info()
+            components = [{"name": com.name,
+                           "factory": com.factory,
+                           "language": com.language,
+                           "bundle_name": com.bundle_name,
+                           "bundle_version": com.bundle_version,
+                           "properties": com.properties,
+                           "isolate_uid": isolate_uid,
+                           "isolate_name": info.name}
+                          for com in info.components]
+        except Exception as ex:
+            _logger.debug("Error getting the components of %s: %s",
+                          isolate_uid, ex)
+            return []
+
+        with self._lock:
+            if self._versions.get(isolate_uid, 0) == version:
+                # not invalidated in the meantime
+                self._components[isolate_uid] = (time.time(), components)
+        return components
+
+    def get_all_components(self):
+        """
+        Returns the components of all the isolates having a composer
+        """
+        with self._lock:
+            uids = list(self._composers)
+
+        result = []
+        for uid in uids:
+            result.extend(self.get_components(uid))
+        return result
+
+    # --------------------------------------------------------------------------
+
+    def get_nodes(self):
+        """
+        Returns the list of nodes: [{uid, name}]
+        """
+        with self._lock:
+            return [{"uid": node["uid"], "name": node["name"]}
+                    for node in self._nodes.values()]
+
+    def get_node(self, node_uid):
+        """
+        Returns the description of a node ({uid, name, nbr_isolates}), or
+        None
+        """
+        with self._lock:
+            node = self._nodes.get(node_uid)
+            if node is None:
+                return None
+            return {"uid": node["uid"], "name": node["name"],
+                    "nbr_isolates": len(node["isolates"])}
+
+    def get_node_isolates(self, node_uid):
+        """
+        Returns the isolates of a node (can be empty)
+        """
+        with self._lock:
+            node = self._nodes.get(node_uid)
+            if node is None:
+                return []
+            return [dict(isolate) for isolate in node["isolates"].values()]
+
+    def get_isolates(self):
+        """
+        Returns the list of all isolates
+        """
+        with self._lock:
+            return [dict(isolate) for isolate in self._isolates.values()]
+
+    def get_isolate(self, isolate_uid):
+        """
+        Returns the description of an isolate, or None
+        """
+        with self._lock:
+            isolate = self._isolates.get(isolate_uid)
+            if isolate is None:
+                return None
+            return dict(isolate)
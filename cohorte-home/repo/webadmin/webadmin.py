@@ -21,14 +21,23 @@ import threading
 import herald
 import herald.beans as beans
 
+# Activity journal
+from restapi.journal import ActivityJournal, DEFAULT_MAX_ACTIVITIES
+
+# Web admin change feed
+from .changes import ChangeFeed, CHANGE_ISOLATE_REGISTERED, \
+    CHANGE_ISOLATE_UPDATED, CHANGE_ISOLATE_UNREGISTERED
+
+# REST API responses encoder and routes
+import restapi.encoder
+import restapi.routes
+
+# Web admin topology model
+from .topology import Topology, DEFAULT_COMPONENTS_MAX_AGE, isolate_type
+
 
 # Herald
 # Cohorte 
-try:
-    import Cookie
-except ImportError:
-    import http.cookies as Cookie
-    
 try:
     # Python 3
     import urllib.parse as urlparse
@@ -45,6 +54,15 @@ _logger = logging.getLogger("webadmin.webadmin")
 COOKIE = "Cookie"
 COOKIE_SESSION = "session"
 
+WEBADMIN_API_PATH = "webadmin/api/v1"
+""" Path of the web admin REST API """
+
+CHANGES_DEFAULT_TIMEOUT = 25
+""" Default time a client waits for a change (long-polling), in seconds """
+
+CHANGES_MAX_TIMEOUT = 60
+""" Maximum time a client can wait for a change, in seconds """
+
 SUBJECT_GET_HTTP = "cohorte/shell/agent/get_http"
 """ Signal to request the ports to access HTTP services """
 
@@ -60,6 +78,9 @@ SUBJECT_GET_HTTP = "cohorte/shell/agent/get_http"
 @ComponentFactory("cohorte-webadmin-factory")
 @Provides(['pelix.http.servlet', herald.SERVICE_DIRECTORY_LISTENER])
 @Property('_path', 'pelix.http.path', "/webadmin")
+@Property('_max_activities', 'activities.max', DEFAULT_MAX_ACTIVITIES)
+@Property('_spill_activities', 'activities.spill', False)
+@Property('_components_max_age', 'components.max_age', DEFAULT_COMPONENTS_MAX_AGE)
 # Consume a single Herald Directory service
 @Requires("_directory", herald.SERVICE_DIRECTORY)
 @Requires('_herald', herald.SERVICE_HERALD)
@@ -105,12 +126,23 @@ class WebAdmin(object):
         # Gui options
         self._show_internal_isolates = False
 
-        # List of platform activities
-        self._platform_activities = []
-        self._platform_activities_index = 0
+        # Journal of platform activities
+        self._max_activities = DEFAULT_MAX_ACTIVITIES
+        self._spill_activities = False
+        self._platform_activities = ActivityJournal()
+
+        # Feed of topology changes, read by long-polling clients
+        self._changes = ChangeFeed()
+
+        # Nodes, isolates and components, updated on directory events
+        self._components_max_age = DEFAULT_COMPONENTS_MAX_AGE
+        self._topology = Topology()
 
         self._lock = threading.Lock()
 
+        # method + path -> API method
+        self._routes = self._setup_routes()
+
     """
     API ----------------------------------------------------------------------------------------------------------------
     """
@@ -136,14 +168,21 @@ class WebAdmin(object):
         platform["platform"]["cohorte-version"] = "1.2.0"
         return platform
 
-    def get_platform_activities(self):
+    def get_platform_activities(self, params=None):
         """
-        Gets the list of platform activities (events)
+        Gets the list of platform activities (events).
+        Query parameters (all optional):
+            since=<order>: only activities after the given order number
+            rang=<first>..<last>: range of order numbers ('*' for open bounds)
+            filter=<ldap filter>: e.g. (node=led-raspberry)
+            node=, uuid=, event=: exact values (indexed)
+            limit=<count>: maximum number of activities
         Return example:
          {
             "meta" : {                
                 "code": 200,
                 "count": 1,
+                "last-order": 1,
                 "lastupdate" : "1411979225.65"                
             },
             "activities": [
@@ -161,30 +200,26 @@ class WebAdmin(object):
         """
         activities = {"meta": {}, "activities": []}
         activities["meta"]["code"] = 200
-        activities["meta"]["count"] = 1
         if self._platform_activities_list_lastupdate is None:
             self._platform_activities_list_lastupdate = time.time()
         activities["meta"]["lastupdate"] = self._platform_activities_list_lastupdate
+        activities["meta"]["seq"] = self._changes.sequence
 
-        for activity in self._platform_activities:
-            activities["activities"].append(activity)
-        """                        
-        activities["activities"].append({
-                    "order": "1",
-                    "node" : "led-gateway",
-                    "timestamp": "20150421-145700",
-                    "kind" : "Node Discovered",
-                    "info" : "Node UUID 1234-5678-9010-3546"
-                })
-
-        activities["activities"].append({
-                    "order": "2",
-                    "node" : "led-gateway",
-                    "timestamp": "20150421-145713",
-                    "kind" : "Isolate Created",
-                    "info" : "Isolate UUID 4734-9878-7410-3577"
-                })
-        """
+        params = params or {}
+        criteria = dict((key, params[key][0]) for key in ("node", "uuid", "event")
+                        if key in params)
+        try:
+            activities["activities"] = self._platform_activities.query(
+                since=params.get("since", [None])[0],
+                rang=params.get("rang", [None])[0],
+                ldap_filter=params.get("filter", [None])[0],
+                limit=params.get("limit", [None])[0],
+                **criteria)
+        except ValueError as ex:
+            activities["meta"]["code"] = 400
+            activities["meta"]["error"] = str(ex)
+        activities["meta"]["count"] = len(activities["activities"])
+        activities["meta"]["last-order"] = self._platform_activities.last_order
         return activities
 
     def get_nodes(self):
@@ -209,18 +244,10 @@ class WebAdmin(object):
             ]
         }"""
         nodes = {"meta": {}, "nodes": []}
-        lp = self._directory.get_local_peer()
-        nodes["nodes"].append({"uid": lp.node_uid, "name": lp.node_name})
-        count = 1
-        for p in self._directory.get_peers():
-            # if nodes["nodes"]["uid"] is None:
-            found = False
-            for i in nodes["nodes"]:
-                if i["uid"] == p.node_uid:
-                    found = True
-            if found == False:
-                nodes["nodes"].append({"uid": p.node_uid, "name": p.node_name})
-                count += 1
+        # read the cursor first: clients may get a change twice, never miss one
+        nodes["meta"]["seq"] = self._changes.sequence
+        nodes["nodes"] = self._topology.get_nodes()
+        count = len(nodes["nodes"])
         if self._nodes_list_lastupdate is None:
             self._nodes_list_lastupdate = time.time()
         nodes["meta"]["code"] = 200
@@ -253,16 +280,11 @@ class WebAdmin(object):
             ]
         }"""
         isolates = {"meta": {}, "isolates": []}
-        lp = self._directory.get_local_peer()
-        isolates["isolates"].append({"uid": lp.uid, "name": lp.name,
-                                     "node_uid": lp.node_uid, "node_name": lp.node_name})
-        count = 1
-        for p in self._directory.get_peers():
-            isolates["isolates"].append({"uid": p.uid, "name": p.name,
-                                         "node_uid": p.node_uid, "node_name": p.node_name})
-            count += 1
+        for i in self._topology.get_isolates():
+            isolates["isolates"].append({"uid": i["uid"], "name": i["name"],
+                                         "node_uid": i["node_uid"], "node_name": i["node_name"]})
         isolates["meta"]["code"] = 200
-        isolates["meta"]["count"] = count
+        isolates["meta"]["count"] = len(isolates["isolates"])
         return isolates
 
     def get_components(self):
@@ -297,29 +319,16 @@ class WebAdmin(object):
         }
         """
         components = {"meta": {}, "components": []}
-        count = 0
-        for rcomposer in self._icomposers.values():
-            uid = rcomposer.get_isolate_uid()
-            info = rcomposer.get_isolate_info()
-            # _logger.critical('Getting info: %s -- %s', info, info.components)
-            for com in info.components:
-                components["components"].append({"name": com.name,
-                                                 "factory": com.factory,
-                                                 "language": com.language,
-                                                 "isolate_uid": uid,
-                                                 "isolate_name": info.name})
-                count += 1
-        if self._icomposerlocal is not None:
-            for c in self._icomposerlocal.get_isolate_info().components:
-                components["components"].append({"name": c.name,
-                                                 "factory": c.factory,
-                                                 "language": c.language,
-                                                 "isolate_uid": self._icomposerlocal.get_isolate_uid(),
-                                                 "isolate_name": self._icomposerlocal.get_isolate_info().name})
-                count += 1
+        # components of the isolates are fetched once, then kept in cache
+        for com in self._topology.get_all_components():
+            components["components"].append({"name": com["name"],
+                                             "factory": com["factory"],
+                                             "language": com["language"],
+                                             "isolate_uid": com["isolate_uid"],
+                                             "isolate_name": com["isolate_name"]})
 
         components["meta"]["code"] = 200
-        components["meta"]["count"] = count
+        components["meta"]["count"] = len(components["components"])
         return components
 
     def get_node_detail(self, node_uid):
@@ -337,16 +346,12 @@ class WebAdmin(object):
             }
         }"""
         node = {"meta": {}, "node": {}}
-        lp = self._directory.get_local_peer()
-        count = 0
-        if lp.node_uid == node_uid:
-            node["node"]["name"] = lp.node_name
-            count = 1
-        for p in self._directory.get_peers():
-            if p.node_uid == node_uid:
-                node["node"]["name"] = p.node_name
-                count += 1
-        node["node"]["nbr_isolates"] = count
+        detail = self._topology.get_node(node_uid)
+        if detail is not None:
+            node["node"]["name"] = detail["name"]
+            node["node"]["nbr_isolates"] = detail["nbr_isolates"]
+        else:
+            node["node"]["nbr_isolates"] = 0
         node["meta"]["node"] = node_uid
         node["meta"]["code"] = 200
         return node
@@ -388,59 +393,33 @@ class WebAdmin(object):
         }"""
         isolate = {"meta": {}, "isolate": {}}
         isolate["isolate"]["type"] = "app-dynamic-isolate"
-        lp = self._directory.get_local_peer()
-        if lp.uid == isolate_uid:
-            isolate["isolate"]["name"] = lp.name
-            isolate["isolate"]["node_uid"] = lp.node_uid
-            isolate["isolate"]["node_name"] = lp.node_name
+        detail = self._topology.get_isolate(isolate_uid)
+        if detail is not None:
+            isolate["isolate"]["name"] = detail["name"]
+            isolate["isolate"]["type"] = detail["type"]
+            isolate["isolate"]["node_uid"] = detail["node_uid"]
+            isolate["isolate"]["node_name"] = detail["node_name"]
             isolate["isolate"]["http_port"] = self.get_isolate_http_port(isolate_uid)
-            try:                
-                http_access = self._directory.get_local_peer().get_access("http").host
+            lp = self._directory.get_local_peer()
+            http_access = "" if lp.uid == isolate_uid else None
+            try:
+                if lp.uid == isolate_uid:
+                    peer = lp
+                else:
+                    peer = self._directory.get_peer(isolate_uid)
+                http_access = peer.get_access("http").host
                 if http_access.startswith("::ffff:"):
                     http_access = http_access[7:]
             except KeyError:
-                http_access = ""
+                pass
             isolate["isolate"]["http_access"] = http_access
-
             isolate["isolate"]["shell_port"] = 0
-            if lp.name == "cohorte.internals.forker":
-                isolate["isolate"]["type"] = "cohorte-isolate"
-        else:
-            for p in self._directory.get_peers():
-                if p.uid == isolate_uid:
-                    isolate["isolate"]["name"] = p.name
-                    isolate["isolate"]["node_uid"] = p.node_uid
-                    isolate["isolate"]["node_name"] = p.node_name
-                    isolate["isolate"]["http_port"] = self.get_isolate_http_port(isolate_uid)
-                    try:
-                        http_access = p.get_access("http").host
-                        if http_access.startswith("::ffff:"):
-                            http_access = http_access[7:]
-                    except KeyError:
-                        http_access = None
-                    isolate["isolate"]["http_access"] = http_access
-                    isolate["isolate"]["shell_port"] = 0
-                    if p.name == "cohorte.internals.forker":
-                        isolate["isolate"]["type"] = "cohorte-isolate"
-                    break
 
         if isolate["isolate"]["type"] == "cohorte-isolate":
             isolate["isolate"]["nbr_components"] = -1
         else:
-            count = 0
-            try:
-                for c in self._icomposers.keys():
-                    if self._icomposers.get(c).get_isolate_uid() == isolate_uid:
-                        comps = self._icomposers.get(c).get_isolate_info().components
-                        for com in comps:
-                            count += 1
-                if self._icomposerlocal is not None:            
-                    if self._icomposerlocal.get_isolate_uid() == isolate_uid:
-                        for c in self._icomposerlocal.get_isolate_info().components:
-                            count += 1
-            except:
-                pass
-            isolate["isolate"]["nbr_components"] = count
+            isolate["isolate"]["nbr_components"] = \
+                len(self._topology.get_components(isolate_uid))
 
         isolate["meta"]["isolate"] = isolate_uid
         isolate["meta"]["code"] = 200
@@ -469,32 +448,11 @@ class WebAdmin(object):
             }
         }"""
         component = {"meta": {}, "component": {}}
-        if self._icomposerlocal is not None:
-            for c in self._icomposerlocal.get_isolate_info().components:
-                if c.name == component_name:
-                    component["component"]["factory"] = c.factory
-                    component["component"]["language"] = c.language
-                    component["component"]["isolate_uid"] = self._icomposerlocal.get_isolate_uid()
-                    component["component"]["isolate_name"] = self._icomposerlocal.get_isolate_info().name
-                    component["component"]["bundle_name"] = c.bundle_name
-                    component["component"]["bundle_version"] = c.bundle_version
-                    component["component"]["properties"] = {}
-                    component["component"]["properties"] = c.properties
-                    break
-
-        for c in self._icomposers.keys():
-            comps = self._icomposers.get(c).get_isolate_info().components
-            for com in comps:
-                if com.name == component_name:
-                    component["component"]["factory"] = com.factory
-                    component["component"]["language"] = com.language
-                    component["component"]["isolate_uid"] = self._icomposers.get(c).get_isolate_uid()
-                    component["component"]["isolate_name"] = self._icomposers.get(c).get_isolate_info().name
-                    component["component"]["bundle_name"] = com.bundle_name
-                    component["component"]["bundle_version"] = com.bundle_version
-                    component["component"]["properties"] = {}
-                    component["component"]["properties"] = com.properties
-                    break
+        for com in self._topology.get_all_components():
+            if com["name"] == component_name:
+                component["component"] = dict(com)
+                del component["component"]["name"]
+                break
 
         component["meta"]["code"] = 200
         component["meta"]["component"] = component_name
@@ -525,27 +483,11 @@ class WebAdmin(object):
             ]
         }"""
         isolates = {"meta": {}, "isolates": []}
-        lp = self._directory.get_local_peer()
-        count = 0
-
-        if lp.node_uid == node_uid:
-            if lp.name == "cohorte.internals.forker":
-                itype = "cohorte-isolate"
-            else:
-                itype = "app-dynamic-isolate"
-            isolates["isolates"].append({"uid": lp.uid, "name": lp.name, "type": itype})
-            count = 1
-        for p in self._directory.get_peers():
-            if p.node_uid == node_uid:
-                if p.name == "cohorte.internals.forker":
-                    itype = "cohorte-isolate"
-                else:
-                    itype = "app-dynamic-isolate"
-                isolates["isolates"].append({"uid": p.uid, "name": p.name, "type": itype})
-                count += 1
+        for i in self._topology.get_node_isolates(node_uid):
+            isolates["isolates"].append({"uid": i["uid"], "name": i["name"], "type": i["type"]})
         isolates["meta"]["node"] = node_uid
         isolates["meta"]["code"] = 200
-        isolates["meta"]["count"] = count
+        isolates["meta"]["count"] = len(isolates["isolates"])
         return isolates
 
 
@@ -579,25 +521,11 @@ class WebAdmin(object):
         """
 
         components = {"meta": {}, "components": []}
-        count = 0
-        try:
-            for c in self._icomposers.keys():
-                if self._icomposers.get(c) is not None:
-                    if self._icomposers.get(c).get_isolate_uid() == isolate_uid:
-                        comps = self._icomposers.get(c).get_isolate_info().components
-                        for com in comps:
-                            components["components"].append(dict(name=com.name, factory=com.factory, language=com.language))
-                            count += 1
-            if self._icomposerlocal is not None:
-                if self._icomposerlocal.get_isolate_uid() == isolate_uid:
-                    for c in self._icomposerlocal.get_isolate_info().components:
-                        components["components"].append(dict(name=c.name, factory=c.factory, language=c.language))
-                        count += 1
-        except:
-            pass
+        for com in self._topology.get_components(isolate_uid):
+            components["components"].append(dict(name=com["name"], factory=com["factory"], language=com["language"]))
         components["meta"]["isolate"] = isolate_uid
         components["meta"]["code"] = 200
-        components["meta"]["count"] = count
+        components["meta"]["count"] = len(components["components"])
         return components
 
     """
@@ -727,44 +655,97 @@ class WebAdmin(object):
         nodes["meta"]["lastupdate"] = self._nodes_list_lastupdate
         return nodes
 
+    def get_changes(self, since, timeout):
+        """
+        Gets the topology changes published after the given sequence number,
+        waiting at most timeout seconds if there is none yet (long-polling).
+        If reset is true, the client missed some changes and must reload
+        the whole lists.
+        Return example:
+        {
+            "meta" : {
+                "code": 200,
+                "seq": 12,
+                "count": 1,
+                "reset": false
+            },
+            "changes": [
+                {
+                    "seq": 12,
+                    "kind": "isolate-unregistered",
+                    "timestamp": 1411979225.65,
+                    "data": {
+                        "uid": "03ff839a-df24-4bdf-b734-9fac1c886c65",
+                        "name": "spellcheck-isolate",
+                        "type": "app-dynamic-isolate",
+                        "node_uid": "41110b1d-b510-4e51-9945-a752da04a16d",
+                        "node_name": "central",
+                        "node_isolates": 2,
+                        "activity": {...}
+                    }
+                }
+            ]
+        }
+        """
+        seq, changes, reset = self._changes.get_changes(since, timeout)
+        result = {"meta": {}, "changes": changes}
+        result["meta"]["code"] = 200
+        result["meta"]["seq"] = seq
+        result["meta"]["count"] = len(changes)
+        result["meta"]["reset"] = reset
+        return result
+
+    def _count_node_isolates(self, node_uid):
+        """
+        Returns the number of known isolates on the given node
+        """
+        node = self._topology.get_node(node_uid)
+        if node is None:
+            return 0
+        return node["nbr_isolates"]
+
+    def _peer_change(self, peer, activity=None):
+        """
+        Prepares the content of a change about the given peer
+        """
+        return {"uid": peer.uid, "name": peer.name, "type": isolate_type(peer.name),
+                "node_uid": peer.node_uid, "node_name": peer.node_name,
+                "node_isolates": self._count_node_isolates(peer.node_uid),
+                "activity": activity}
+
+    def _add_activity(self, event, peer):
+        """
+        Appends a platform activity about the given peer.
+        """
+        activity = self._platform_activities.add(event, "Isolate", peer.name,
+                                                 peer.uid, peer.node_name)
+        self._platform_activities_list_lastupdate = time.time()
+        return activity
+
     def peer_registered(self, peer):
         self._nodes_list_lastupdate = time.time()     
+        self._topology.add_isolate(peer)
         with self._lock:
-            inow = time.time()
-            now = time.strftime("%Y-%m-%d %H:%M:%S")
-            self._platform_activities_index += 1
-            self._platform_activities.append({                
-                    "order": self._platform_activities_index,
-                    "timestamp": str(now),
-                    "event" : "Isolate Created",
-                    "object": "Isolate",
-                    "name" : peer.name,
-                    "uuid" : peer.uid,
-                    "node" : peer.node_name,
-                    "info" : ""
-                })
-            self._platform_activities_list_lastupdate = inow
+            activity = self._add_activity("Isolate Created", peer)
+            self._changes.publish(CHANGE_ISOLATE_REGISTERED,
+                                  self._peer_change(peer, activity))
 
     def peer_updated(self, peer, access_id, data, previous):
         self._nodes_list_lastupdate = time.time()
+        # accesses changed: components will be fetched again
+        self._topology.add_isolate(peer)
+        with self._lock:
+            change = self._peer_change(peer)
+            change["access"] = access_id
+            self._changes.publish(CHANGE_ISOLATE_UPDATED, change)
 
     def peer_unregistered(self, peer):        
         self._nodes_list_lastupdate = time.time()
-        with self._lock:         
-            inow = time.time()
-            now = time.strftime("%Y-%m-%d %H:%M:%S")
-            self._platform_activities_index += 1
-            self._platform_activities.append({
-                    "order": self._platform_activities_index,
-                    "timestamp": str(now),
-                    "event" : "Isolate Lost",
-                    "object": "Isolate",
-                    "name" : peer.name,
-                    "uuid" : peer.uid,
-                    "node" : peer.node_name,
-                    "info" : ""                    
-                })
-            self._platform_activities_list_lastupdate = inow
+        self._topology.remove_isolate(peer.uid)
+        with self._lock:
+            activity = self._add_activity("Isolate Lost", peer)
+            self._changes.publish(CHANGE_ISOLATE_UNREGISTERED,
+                                  self._peer_change(peer, activity))
 
 
     """
@@ -886,16 +867,13 @@ class WebAdmin(object):
         }
         """
         gv = {"name":"COHORTE", "children": []}
-        nodes = self.get_nodes()
-        for n in nodes["nodes"]:
+        for n in self._topology.get_nodes():
             node = {"name": n["name"], "size":100, "children": []}
-            isolates = self.get_node_isolates(n["uid"])
-            for i in isolates["isolates"]:
+            for i in self._topology.get_node_isolates(n["uid"]):
                 # if i["name"] == "cohorte.internals.forker":
                 #    continue                
                 isolate = {"name": i["name"], "size":10, "children": []}
-                components = self.get_isolate_components(i["uid"])
-                for c in components["components"]:
+                for c in self._topology.get_components(i["uid"]):
                     component = {"name": c["name"], "size":1}
                     isolate["children"].append(component)
                 node["children"].append(isolate)
@@ -940,13 +918,7 @@ class WebAdmin(object):
         """
             return the session cookie 
         """
-        cookies = request.get_header(COOKIE)
-        if cookies:
-            cookie = Cookie.SimpleCookie()
-            cookie.load(cookies)
-            session_id = cookie[COOKIE_SESSION].value if COOKIE_SESSION in cookie else None
-            return session_id
-        return None
+        return restapi.routes.get_session_id(request, COOKIE_SESSION)
         
     """
     SERVLET ------------------------------------------------------------------------------------------------------------
@@ -957,10 +929,10 @@ class WebAdmin(object):
         if len(parts) == 3:
             if str(parts[2]).lower() == "tabs":
                 tabs = self.get_tabs()
-                self.sendJson(tabs, response)
+                self.sendJson(tabs, request, response)
             elif str(parts[2]).lower().startswith("options"):
                 result = self.change_gui_options(request, parts[2][8:])
-                self.sendJson(result, response)
+                self.sendJson(result, request, response)
             else:
                 self.show_error_page(request, response)
         elif len(parts) == 4:
@@ -969,92 +941,96 @@ class WebAdmin(object):
                     globalview = self.get_globalview()
                     if globalview is None:
                         self.show_error_page(request, response)
-                    result = json.dumps(globalview, sort_keys=False,
-                                        indent=4, separators=(',', ': '))
-                    response.send_content(200, result, "application/json")
+                    else:
+                        restapi.encoder.send_json(request, response, globalview)
         else:
             self.show_error_page(request, response)
 
+    def _setup_routes(self):
+        """
+        Prepares the routes table of the API. Handlers return the data to
+        send, or None if they already sent the response.
+        """
+        # the API paths are case-insensitive
+        routes = restapi.routes.Router("webadmin", WEBADMIN_API_PATH,
+                                       case_sensitive=False)
+        routes.add("GET", "", self._api_welcome)
+        routes.add("GET", "platform", lambda request, response: self.get_platform(),
+                   "get_platform")
+        routes.add("GET", "platform/activities", self._api_platform_activities,
+                   "get_platform_activities")
+        routes.add("GET", "platform/activities/lastupdate", self._api_platform_activities_lastupdate,
+                   "get_platform_activities_lastupdate")
+        routes.add("GET", "changes", self._api_changes, "get_changes")
+        routes.add("GET", "nodes", lambda request, response: self.get_nodes(),
+                   "get_nodes")
+        routes.add("GET", "nodes/killall", lambda request, response: self.killall_nodes(),
+                   "killall_nodes")
+        routes.add("GET", "nodes/lastupdate", lambda request, response: self.get_nodes_lastupdate(),
+                   "get_nodes_lastupdate")
+        routes.add("GET", "nodes/{uid}", lambda request, response, uid: self.get_node_detail(uid),
+                   "get_node_detail")
+        routes.add("GET", "nodes/{uid}/isolates", lambda request, response, uid: self.get_node_isolates(uid),
+                   "get_node_isolates")
+        routes.add("GET", "nodes/{uid}/kill", lambda request, response, uid: self.kill_node(uid),
+                   "kill_node")
+        routes.add("GET", "isolates", lambda request, response: self.get_isolates(),
+                   "get_isolates")
+        routes.add("GET", "isolates/{uid}", lambda request, response, uid: self.get_isolate_detail(uid),
+                   "get_isolate_detail")
+        routes.add("GET", "isolates/{uid}/components", lambda request, response, uid: self.get_isolate_components(uid),
+                   "get_isolate_components")
+        routes.add("GET", "isolates/{uid}/kill", lambda request, response, uid: self.kill_isolate(uid),
+                   "kill_isolate")
+        routes.add("GET", "components", lambda request, response: self.get_components(),
+                   "get_components")
+        routes.add("GET", "components/{name}", lambda request, response, name: self.get_component_detail(name),
+                   "get_component_detail")
+        return routes
+
+    def _api_welcome(self, request, response):
+        self.show_api_welcome_page(request, response)
+
+    def _api_platform_activities(self, request, response):
+        params = urlparse.parse_qs(urlparse.urlparse(request.get_path()).query)
+        return self.get_platform_activities(params)
+
+    def _api_platform_activities_lastupdate(self, request, response):
+        session_id = self.get_session_cookie(request)
+        if session_id and self._admin.check_session_timeout(
+                request, response, None, None, session_id, False) == False:
+            return self.get_platform_activities_lastupdate()
+        # no session or session timeout
+        response.set_header("Location", "login.html")
+        response.send_content(302, "Redirection...")
+
+    def _api_changes(self, request, response):
+        session_id = self.get_session_cookie(request)
+        if session_id and self._admin.check_session_timeout(
+                request, response, None, None, session_id, False) == False:
+            params = urlparse.parse_qs(urlparse.urlparse(request.get_path()).query)
+            try:
+                since = int(params.get("since", [0])[0])
+                timeout = float(params.get("timeout", [CHANGES_DEFAULT_TIMEOUT])[0])
+            except ValueError:
+                since = 0
+                timeout = CHANGES_DEFAULT_TIMEOUT
+            timeout = max(0, min(timeout, CHANGES_MAX_TIMEOUT))
+            return self.get_changes(since, timeout)
+        response.set_header("Location", "login.html")
+        response.send_content(302, "Redirection...")
+
     def do_api(self, parts, request, response):
-        if len(parts) == 3:
-            self.show_api_welcome_page(request, response)
-        if len(parts) == 4:
-            if str(parts[3]).lower() == "platform":
-                platform = self.get_platform()
-                self.sendJson(platform, response)
-
-            if str(parts[3]).lower() == "nodes":
-                nodes = self.get_nodes()
-                self.sendJson(nodes, response)
-
-            elif str(parts[3]).lower() == "isolates":
-                isolates = self.get_isolates()
-                self.sendJson(isolates, response)
-
-            elif str(parts[3]).lower() == "components":
-                components = self.get_components()
-                self.sendJson(components, response)
-
-        if len(parts) == 5:
-            if str(parts[3]).lower() == "platform":
-                if str(parts[4]).lower() == "activities":
-                    activities = self.get_platform_activities()
-                    self.sendJson(activities, response)
-            if str(parts[3]).lower() == "nodes":
-                if str(parts[4]).lower() == "killall":
-                    result = self.killall_nodes()
-                    self.sendJson(result, response)
-                elif str(parts[4]) == "lastupdate":
-                    node = self.get_nodes_lastupdate()
-                    self.sendJson(node, response)
-                else:
-                    node = self.get_node_detail(str(parts[4]))
-                    self.sendJson(node, response)
-
-            elif str(parts[3]).lower() == "isolates":
-                isolate = self.get_isolate_detail(str(parts[4]))
-                self.sendJson(isolate, response)
-
-            elif str(parts[3]).lower() == "components":
-                isolate = self.get_component_detail(str(parts[4]))
-                self.sendJson(isolate, response)
-
-        if len(parts) == 6:
-            if str(parts[3]).lower() == "platform":
-                if str(parts[4]).lower() == "activities":
-                    if str(parts[5]).lower() == "lastupdate":
-                        session_id = self.get_session_cookie(request)
-                        if session_id:
-                            if self._admin.check_session_timeout(request, response, None, None, session_id, False) == False:                                                  
-                                lastupdate = self.get_platform_activities_lastupdate()
-                                self.sendJson(lastupdate, response)
-                            else:
-                                # session timeout
-                                response.set_header("Location", "login.html")
-                                response.send_content(302, "Redirection...")
-                                # pass
-                      
-                        else:
-                            response.set_header("Location", "login.html")
-                            response.send_content(302, "Redirection...")  
-                    
-            if str(parts[3]).lower() == "nodes":
-                if str(parts[5]).lower() == "isolates":
-                    isolates = self.get_node_isolates(str(parts[4]))
-                    self.sendJson(isolates, response)
-                elif str(parts[5]).lower() == "kill":
-                    result = self.kill_node(str(parts[4]))
-                    self.sendJson(result, response)
-
-            if str(parts[3]).lower() == "isolates":
-                if str(parts[5]).lower() == "components":
-                    components = self.get_isolate_components(str(parts[4]))
-                    self.sendJson(components, response)
-                elif str(parts[5]).lower() == "kill":
-                    result = self.kill_isolate(str(parts[4]))
-                    self.sendJson(result, response)
-                    
-        
+        path = urlparse.urlparse(request.get_path()).path
+        route, args = self._routes.match("GET", path)
+        if route is None:
+            self.show_error_page(request, response)
+            return
+
+        result = route(request, response, *args)
+        if result is not None:
+            self.sendJson(result, request, response)
+
     def do_static(self, parts, request, response):
         if len(parts) > 2:
             res_path = '/'.join(parts[2:])                        
@@ -1107,16 +1083,45 @@ class WebAdmin(object):
         else:
             self.show_error_page(request, response)  
             
-    def sendJson(self, data, response):
-        result = json.dumps(data, sort_keys=False,
-                            indent=4, separators=(',', ': '))
-        response.send_content(data["meta"]["code"], result, "application/json")
+    def sendJson(self, data, request, response):
+        restapi.encoder.send_json(request, response, data, data["meta"]["code"])
 
 
     """
     OTHER STUFF --------------------------------------------------------------------------------------------------------
     """
 
+    @BindField('_icomposers')
+    def bind_composer(self, field, svc, svc_ref):
+        """
+        A remote isolate composer has been bound: its components will be
+        fetched on the next request
+        """
+        self._topology.set_composer(
+            svc_ref.get_property('endpoint.framework.uuid'), svc)
+
+    @UnbindField('_icomposers')
+    def unbind_composer(self, field, svc, svc_ref):
+        """
+        A remote isolate composer is gone
+        """
+        self._topology.set_composer(
+            svc_ref.get_property('endpoint.framework.uuid'), None)
+
+    @BindField('_icomposerlocal')
+    def bind_local_composer(self, field, svc, svc_ref):
+        """
+        The local isolate composer has been bound
+        """
+        self._topology.set_composer(svc.get_isolate_uid(), svc)
+
+    @UnbindField('_icomposerlocal')
+    def unbind_local_composer(self, field, svc, svc_ref):
+        """
+        The local isolate composer is gone
+        """
+        self._topology.set_composer(svc.get_isolate_uid(), None)
+
     @Validate
     def validate(self, context):
         """
@@ -1126,6 +1131,18 @@ class WebAdmin(object):
         """
         _logger.info("Webadmin validated")
         self._context = context
+        self._changes = ChangeFeed()
+
+        spill_file = None
+        if self._spill_activities:
+            spill_file = os.path.join(context.get_property("cohorte.base"),
+                                      "var", "activities-webadmin.log")
+        self._platform_activities = ActivityJournal(self._max_activities, spill_file)
+
+        # seed the topology with the peers already known
+        self._topology.components_max_age = self._components_max_age
+        self._topology.load(self._directory.get_local_peer(),
+                            self._directory.get_peers())
 
 
     @Invalidate
@@ -1134,7 +1151,11 @@ class WebAdmin(object):
         Component invalidated, just print a trace to visualize the event
         """
         _logger.info("Webadmin invalidated")
-        
+        # release the long-polling clients
+        self._changes.close()
+        self._platform_activities.close()
+        self._topology.clear()
+
 
     def bound_to(self, path, params):
         """
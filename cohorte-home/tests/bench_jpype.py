@@ -0,0 +1,268 @@
+#!/usr/bin/env python
+# -- Content-Encoding: UTF-8 --
+"""
+Micro-benchmarks of the JPype bridge used by the Python components talking
+to Java.
+
+Starts a JVM with the JPype installed in COHORTE_HOME/repo (see setup.sh) and
+prints the cost of each measured operation, in nanoseconds::
+
+    python bench_jpype.py [--jvm LIBJVM] [--number N] [suite...]
+
+Suites:
+
+* attributes: access to Java members through object wrappers, with the
+  per-class resolution cache and with the former lookup (each attribute
+  access searched the instance, then the metaclass with dir())
+* arrays: transfers of primitive arrays between Java and Python, in bulk
+  and with the former item per item iteration
+* callbacks: calls of Python methods by Java through a proxy, with the
+  dispatch table of the proxy and with the former lookup of the method on
+  each call
+* packages: resolution of packages and classes through JPackage, with the
+  packages index and with a class search on each lookup
+
+:author: Bassem Debbabi
+:license: Apache Software License 2.0
+
+..
+
+    Copyright 2015 isandlaTech
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Standard Library
+import argparse
+import os
+import sys
+import timeit
+
+# Documentation strings format
+__docformat__ = "restructuredtext en"
+
+# module version
+__version__ = "1.0.0"
+
+REPEAT = 5
+""" Number of measures of each operation (the best one is kept) """
+
+
+def measure(statement, number):
+    """
+    Returns the best time of an operation, in nanoseconds
+    """
+    return min(timeit.repeat(statement, number=number,
+                             repeat=REPEAT)) * 1e9 / number
+
+
+def show(label, before, after=None):
+    """
+    Prints the result of a measure
+    """
+    if after is None:
+        print("    {0:<32} {1:>10.1f} ns".format(label, before))
+    else:
+        print("    {0:<32} {1:>10.1f} ns -> {2:>8.1f} ns  (x{3:.1f})"
+              .format(label, before, after, before / after))
+
+
+def make_legacy_getattr(_jpype):
+    """
+    Returns the attribute lookup of the Java object wrappers before the
+    per-class resolution cache
+    """
+    def legacy_getattr(self, name):
+        try:
+            r = object.__getattribute__(self, name)
+        except AttributeError as ex:
+            if name in dir(self.__class__.__metaclass__):
+                r = object.__getattribute__(self.__class__, name)
+            else:
+                raise ex
+
+        if isinstance(r, _jpype._JavaMethod):
+            return _jpype._JavaBoundMethod(r, self)
+        return r
+
+    return legacy_getattr
+
+
+def bench_attributes(jpype, number):
+    """
+    Access to members of Java objects
+    """
+    import _jpype
+    from jpype import _jclass
+    legacy_getattr = make_legacy_getattr(_jpype)
+
+    array_list = jpype.java.util.ArrayList()
+    integer = jpype.java.lang.Integer(42)
+    point = jpype.java.awt.Point(1, 2)
+
+    cases = (("method (no call)", lambda: array_list.size),
+             ("method call", lambda: array_list.size()),
+             ("static field", lambda: integer.MAX_VALUE),
+             ("instance field", lambda: point.x))
+
+    results = []
+    for label, statement in cases:
+        # first access: members loaded, resolution stored
+        statement()
+        results.append(measure(statement, number))
+
+    # Measure again with the former lookup
+    classes = [type(obj) for obj in (array_list, integer, point)]
+    for cls in classes:
+        type.__setattr__(cls, "__getattribute__", legacy_getattr)
+    try:
+        for (label, statement), after in zip(cases, results):
+            show(label, measure(statement, number), after)
+    finally:
+        for cls in classes:
+            type.__setattr__(cls, "__getattribute__", _jclass._javaGetAttr)
+
+
+def bench_arrays(jpype, number):
+    """
+    Transfers of a double[] array of 10^6 items
+    """
+    import array
+    from jpype import _jarray
+    size = 1000000
+    number = max(1, number // size)
+    values = array.array("d", range(size))
+    java_array = jpype.JArray(jpype.JDouble).from_buffer(values)
+
+    # Former iteration: one JNI call per item
+    show("iterate (item per item)",
+         measure(lambda: list(_jarray._JavaArrayIter(java_array)), number))
+    show("iterate (bulk)", measure(lambda: list(java_array), number))
+    show("toarray (Java -> Python)",
+         measure(lambda: java_array.toarray(), number))
+    show("tobytes (Java -> Python)",
+         measure(lambda: java_array.tobytes(), number))
+    show("JArray(list) (Python -> Java)",
+         measure(lambda: jpype.JArray(jpype.JDouble)(list(values)), number))
+    show("from_buffer (Python -> Java)",
+         measure(lambda: jpype.JArray(jpype.JDouble).from_buffer(values),
+                 number))
+
+    try:
+        import numpy
+    except ImportError:
+        print("    (NumPy not installed)")
+    else:
+        show("numpy.asarray (Java -> NumPy)",
+             measure(lambda: numpy.asarray(java_array), number))
+        numpy_array = numpy.arange(size, dtype=numpy.float64)
+        show("from_buffer (NumPy -> Java)",
+             measure(lambda: jpype.JArray(jpype.JDouble).from_buffer(
+                 numpy_array), number))
+
+
+def bench_callbacks(jpype, number):
+    """
+    Calls of a Python Runnable by Java
+    """
+    class Task(object):
+        def run(self):
+            pass
+
+    proxy = jpype.JProxy("java.lang.Runnable", inst=Task())
+    thread = jpype.java.lang.Thread(proxy)
+    cases = (("getCallable", lambda: proxy.getCallable("run")),
+             ("Thread(proxy).run()", lambda: thread.run()))
+
+    results = [measure(statement, number) for _, statement in cases]
+
+    # Measure again with the former lookup
+    dispatch = proxy._dispatch
+    proxy._dispatch = {}
+    try:
+        for (label, statement), after in zip(cases, results):
+            show(label, measure(statement, number), after)
+    finally:
+        proxy._dispatch = dispatch
+
+    from jpype import _jthread
+    show("attached thread check", measure(_jthread.attach, number))
+
+
+def bench_packages(jpype, number):
+    """
+    Lookups of new JPackage objects
+    """
+    from jpype import _jpackage
+    number = max(1, number // 100)
+    cases = (("deep package", lambda: jpype.JPackage("org").apache.felix
+              .framework.util),
+             ("class", lambda: jpype.JPackage("java").util.ArrayList),
+             ("mistyped class", lambda: jpype.JPackage("java").util.ArrayLis))
+
+    # first lookup: index built
+    for _, statement in cases:
+        statement()
+    results = [measure(statement, number) for _, statement in cases]
+
+    # Measure again with a class search on each lookup
+    os.environ[_jpackage.INDEX_ENV] = "0"
+    try:
+        for (label, statement), after in zip(cases, results):
+            show(label, measure(statement, number), after)
+    finally:
+        del os.environ[_jpackage.INDEX_ENV]
+
+
+SUITES = {"attributes": bench_attributes,
+          "arrays": bench_arrays,
+          "callbacks": bench_callbacks,
+          "packages": bench_packages}
+""" Benchmark suites """
+
+
+def main(args=None):
+    """
+    Runs the benchmarks
+    """
+    parser = argparse.ArgumentParser(description="JPype micro-benchmarks")
+    parser.add_argument("--jvm", help="path to the JVM library")
+    parser.add_argument("--number", type=int, default=100000,
+                        help="number of runs of each operation")
+    parser.add_argument("suites", nargs="*", metavar="suite",
+                        help="suites to run: {0} (default: all)"
+                        .format(", ".join(sorted(SUITES))))
+    args = parser.parse_args(args)
+    for name in args.suites:
+        if name not in SUITES:
+            parser.error("unknown suite: {0}".format(name))
+
+    home = os.environ.get("COHORTE_HOME")
+    if not home:
+        print("[ERROR] environment variable COHORTE_HOME not set")
+        return 1
+    sys.path.insert(0, os.path.join(home, "repo"))
+
+    import jpype
+    jpype.startJVM(args.jvm or jpype.getDefaultJVMPath(),
+                   "-Djava.awt.headless=true")
+    try:
+        for name in args.suites or sorted(SUITES):
+            print("{0}: {1}".format(name, SUITES[name].__doc__.strip()))
+            SUITES[name](jpype, args.number)
+    finally:
+        jpype.shutdownJVM()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
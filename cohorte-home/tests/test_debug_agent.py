@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+# -- Content-Encoding: UTF-8 --
+"""
+Tests of the snapshots and of the log readers of the COHORTE debug agent.
+
+Requires the Pelix/iPOPO, Herald and COHORTE Python packages::
+
+    python -m pytest tests/test_debug_agent.py
+
+:author: Bassem Debbabi
+:license: Apache Software License 2.0
+
+..
+
+    Copyright 2015 isandlaTech
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Standard Library
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "repo"))
+
+try:
+    # Pelix framework
+    from pelix.ipopo.constants import use_ipopo
+    import pelix.ipopo.constants
+    from pelix.ipopo.decorators import ComponentFactory
+    import pelix.framework
+    import pelix.remote
+
+    # Cohorte
+    import cohorte
+    import debug.agent
+    import debug.logs
+except ImportError as ex:
+    raise unittest.SkipTest("Missing dependency: {0}".format(ex))
+
+# Documentation strings format
+__docformat__ = "restructuredtext en"
+
+# module version
+__version__ = "1.0.0"
+
+# ------------------------------------------------------------------------------
+
+FACTORY = "debug-agent-test-factory"
+
+
+@ComponentFactory(FACTORY)
+class Dummy(object):
+    """
+    Component instantiated during the tests
+    """
+    pass
+
+
+class DebugAgentSnapshotsTest(unittest.TestCase):
+    """
+    Invalidation of the cached snapshots of the debug agent
+    """
+    def setUp(self):
+        """
+        Starts a framework with iPOPO and a validated agent
+        """
+        self.framework = pelix.framework.create_framework(
+            ["pelix.ipopo.core"], {cohorte.PROP_UID: "test-isolate"})
+        self.framework.start()
+        context = self.framework.get_bundle_context()
+        context.install_bundle(__name__).start()
+
+        self.agent = debug.agent.DebugAgent()
+        svc_ref = context.get_service_reference(
+            pelix.ipopo.constants.SERVICE_IPOPO)
+        self.agent._ipopo = context.get_service(svc_ref)
+        self.agent.validate(context)
+
+    def tearDown(self):
+        """
+        Stops the framework
+        """
+        self.agent.invalidate(self.framework.get_bundle_context())
+        pelix.framework.FrameworkFactory.delete_framework()
+
+    def test_ipopo_event(self):
+        """
+        Instantiating a component invalidates the instances snapshot
+        """
+        etag, content = self.agent._get_snapshot(
+            debug.agent.SNAPSHOT_INSTANCES)
+        self.assertEqual(self.agent._get_snapshot(
+            debug.agent.SNAPSHOT_INSTANCES)[0], etag)
+
+        with use_ipopo(self.framework.get_bundle_context()) as ipopo:
+            ipopo.instantiate(FACTORY, "dummy", {})
+
+        new_etag, new_content = self.agent._get_snapshot(
+            debug.agent.SNAPSHOT_INSTANCES)
+        self.assertNotEqual(new_etag, etag)
+        self.assertIn("dummy",
+                      [instance["name"] for instance in json.loads(new_content)])
+        self.assertNotIn("dummy",
+                         [instance["name"] for instance in json.loads(content)])
+
+        # The reply to the former etag is not a "not modified" one
+        reply = json.loads(self.agent.get_snapshot(
+            debug.agent.SNAPSHOT_INSTANCES, etag))
+        self.assertNotIn(debug.agent.SNAPSHOT_NOT_MODIFIED, reply)
+
+
+class DebugAgentLogsTest(unittest.TestCase):
+    """
+    Reading of indexed logs while their segments are compressed
+    """
+    def setUp(self):
+        """
+        Prepares an index with a segment, compressed after the index has
+        been loaded by the agent
+        """
+        self.directory = tempfile.mkdtemp()
+        self.index_path = os.path.join(self.directory, "logs-index.json")
+        with open(os.path.join(self.directory, "forker.log"), "wb") as live:
+            live.write(b"live\n")
+        with open(os.path.join(self.directory, "forker.log.1"), "wb") as segment:
+            segment.write(b"segment\n")
+
+        index = debug.logs.LogIndex(self.index_path)
+        index.add_run("000", "forker.log")
+        index.add_segment("000", "forker.log.1", len(b"segment\n"))
+        index.save()
+        self.stale = debug.logs.LogIndex.load(self.index_path)
+
+        # compression of the segment, as done by the rotation thread
+        with gzip.open(os.path.join(self.directory, "forker.log.1.gz"),
+                       "wb") as compressed:
+            compressed.write(b"segment\n")
+        index.set_compressed("000", "forker.log.1", "forker.log.1.gz")
+        index.save()
+        os.remove(os.path.join(self.directory, "forker.log.1"))
+
+        self.agent = debug.agent.DebugAgent()
+        self.loads = [self.stale]
+        self.agent._get_log_run = self.get_log_run
+
+    def tearDown(self):
+        """
+        Removes the logs directory
+        """
+        shutil.rmtree(self.directory)
+
+    def get_log_run(self, log_id):
+        """
+        Returns the stale index first, then the current one
+        """
+        if self.loads:
+            return self.loads.pop(0)
+        return debug.logs.LogIndex.load(self.index_path)
+
+    def test_read_stale_index(self):
+        """
+        A part of a compressed segment is read from the current index
+        """
+        part = json.loads(self.agent.read_isolate_log("000", 0))
+        self.assertEqual(part["content"], "segment\n")
+        self.assertEqual(part["next"], len(b"segment\n"))
+
+    def test_get_stale_index(self):
+        """
+        The whole log is read from the current index
+        """
+        log = json.loads(self.agent.get_isolate_log("000"))
+        self.assertEqual(log["content"], "segment\nlive\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+# -- Content-Encoding: UTF-8 --
+"""
+Tests of the side-by-side installations of COHORTE distributions::
+
+    python -m pytest tests/test_versions.py
+
+:author: Bassem Debbabi
+:license: Apache Software License 2.0
+
+..
+
+    Copyright 2015 isandlaTech
+
+    Licensed under the Apache License, Version 2.0 (the "License");
+    you may not use this file except in compliance with the License.
+    You may obtain a copy of the License at
+
+        http://www.apache.org/licenses/LICENSE-2.0
+
+    Unless required by applicable law or agreed to in writing, software
+    distributed under the License is distributed on an "AS IS" BASIS,
+    WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+    See the License for the specific language governing permissions and
+    limitations under the License.
+"""
+
+# Standard Library
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "bin", "scripts"))
+
+# cohorte scripts
+import versions
+
+# Documentation strings format
+__docformat__ = "restructuredtext en"
+
+# module version
+__version__ = "1.0.0"
+
+# ------------------------------------------------------------------------------
+
+
+def write_file(path, content, mode=None):
+    """
+    Writes a file, creating its parent directories
+    """
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, "w") as target:
+        target.write(content)
+    if mode is not None:
+        os.chmod(path, mode)
+
+
+def read_file(path):
+    """
+    Returns the content of a file
+    """
+    with open(path) as source:
+        return source.read()
+
+
+@unittest.skipUnless(versions.is_supported(),
+                     "Versioned installations not supported")
+class DeltaVersionTest(unittest.TestCase):
+    """
+    Installation of a delta update as a new version
+    """
+    def setUp(self):
+        """
+        Prepares a versioned home with a script and a configuration file
+        """
+        self.home = tempfile.mkdtemp()
+        self.staging = tempfile.mkdtemp()
+        write_file(os.path.join(self.home, "bin", "cohorte-start-node"),
+                   "#!/bin/sh\necho 1.0\n", 0o755)
+        write_file(os.path.join(self.home, "bin", "README.txt"), "bin\n")
+        write_file(os.path.join(self.home, "conf", "run.js"), "{}\n")
+        versions.snapshot_home(self.home, "1.0", ["bin", "conf"])
+
+    def tearDown(self):
+        """
+        Removes the home and staging directories
+        """
+        shutil.rmtree(self.home)
+        shutil.rmtree(self.staging)
+
+    def install(self, version, changed, manifest):
+        """
+        Installs the staged changed files as a new version
+        """
+        versions.create_version(self.home, version,
+                                versions.get_current(self.home),
+                                staging=self.staging, changed=changed,
+                                manifest=manifest)
+        versions.switch(self.home, version)
+
+    def test_changed_file_mode(self):
+        """
+        A changed executable keeps the mode given by the manifest
+        """
+        # downloaded files have the default permissions
+        write_file(os.path.join(self.staging, "bin", "cohorte-start-node"),
+                   "#!/bin/sh\necho 1.1\n", 0o644)
+        manifest = {"files": {"bin/cohorte-start-node": {
+            "sha256": "", "size": 0, "mode": 0o755}}}
+        self.install("1.1", ["bin/cohorte-start-node"], manifest)
+
+        path = os.path.join(self.home, "bin", "cohorte-start-node")
+        self.assertEqual(read_file(path), "#!/bin/sh\necho 1.1\n")
+        self.assertTrue(os.stat(path).st_mode & stat.S_IXUSR)
+        self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), 0o755)
+
+        # the unchanged files are shared with the previous version
+        previous = versions.get_version_dir(self.home, "1.0")
+        self.assertTrue(os.path.samefile(
+            os.path.join(self.home, "bin", "README.txt"),
+            os.path.join(previous, "bin", "README.txt")))
+
+    def test_configuration_not_shared(self):
+        """
+        Editing a configuration file doesn't change the previous version
+        """
+        write_file(os.path.join(self.staging, "bin", "README.txt"), "1.1\n")
+        self.install("1.1", ["bin/README.txt"], None)
+        write_file(os.path.join(self.home, "conf", "run.js"),
+                   '{"edited": true}\n')
+
+        self.assertEqual(versions.roll_back(self.home), "1.0")
+        self.assertEqual(read_file(os.path.join(self.home, "conf", "run.js")),
+                         "{}\n")
+
+
+if __name__ == "__main__":
+    unittest.main()